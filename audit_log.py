@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from multiprocessing import util
+
+from certificate_registry import DEFAULT_REGISTRY_PATH
+
+# Audit database lives next to the registry database
+DEFAULT_AUDIT_PATH = os.environ.get(
+    "CERTIFICATE_AUDIT_LOG",
+    os.path.join(os.path.dirname(DEFAULT_REGISTRY_PATH), "verification_audit.db"),
+)
+
+# Verdicts are written in batches of up to this many rows, at least once per interval
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 1.0
+# Verdicts waiting for the writer beyond this are dropped rather than blocking a request
+MAX_PENDING = 100000
+
+ROLLUPS = {
+    "audit_daily": "%Y-%m-%d",
+    "audit_monthly": "%Y-%m",
+}
+# Verdicts of a report (see report["verdict"]), each counted in its own rollup column
+VERDICTS = ("genuine", "fraudulent", "unverifiable")
+# Verdicts per day and triage tier
+TIER_ROLLUP = "audit_tiers"
+# (session, content hash) pairs remembered so a session's resubmission of a file is recorded once
+MAX_RECORDED_SUBMISSIONS = 65536
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+# Function to name the triage tier that settled a report, None when triage was off
+def resolving_tier(report):
+    return (report.get("triage") or {}).get("tier")
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS audit (id INTEGER PRIMARY KEY, created REAL NOT NULL, digest TEXT, "
+        "verdict TEXT NOT NULL, is_real INTEGER NOT NULL, confidence REAL, check_scores TEXT, timings TEXT, "
+        "cached INTEGER NOT NULL, tier TEXT)"
+    )
+    # Verdict counts per day and month, updated with every batch so reads never scan the audit table
+    for table in ROLLUPS:
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            f"(period TEXT PRIMARY KEY, {', '.join(f'{verdict} INTEGER NOT NULL' for verdict in VERDICTS)})"
+        )
+    connection.execute(
+        f"CREATE TABLE IF NOT EXISTS {TIER_ROLLUP} "
+        "(period TEXT NOT NULL, tier TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (period, tier))"
+    )
+    connection.commit()
+    return connection
+
+
+# Append-only audit trail of verdicts. record() only queues the row; a background thread writes
+# the queue in batches and folds each batch into the daily and monthly rollups in the same transaction.
+class AuditLog:
+    def __init__(self, path=None):
+        self.path = os.path.abspath(path or DEFAULT_AUDIT_PATH)
+        self.pid = os.getpid()
+        self.pending = queue.Queue(MAX_PENDING)
+        self.dropped = 0
+        self.submissions = OrderedDict()
+        self.submissions_lock = threading.Lock()
+        self.connection = _connect(self.path)
+        self.lock = threading.Lock()
+        self.writer = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self.writer.start()
+        # Runs at interpreter exit and when a worker process of the batch pool shuts down
+        util.Finalize(self, self.close, exitpriority=10)
+
+    # Function to queue one verdict for writing; never waits on the database.
+    # With a session (e.g. a Streamlit session id), a file already recorded for that session is skipped.
+    def record(self, report, digest=None, session=None):
+        if session is not None and digest is not None:
+            with self.submissions_lock:
+                if (session, digest) in self.submissions:
+                    self.submissions.move_to_end((session, digest))
+                    return
+                self.submissions[(session, digest)] = True
+                if len(self.submissions) > MAX_RECORDED_SUBMISSIONS:
+                    self.submissions.popitem(last=False)
+        row = (time.time(), digest, report["verdict"], int(bool(report["is_real"])), report.get("confidence"),
+               json.dumps(report.get("check_scores") or {}), json.dumps(report.get("timings") or {}),
+               int(bool(report.get("cached"))), resolving_tier(report))
+        try:
+            self.pending.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            rows = [self.pending.get()]
+            deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+            while rows[-1] is not None and len(rows) < AUDIT_BATCH_SIZE:
+                try:
+                    rows.append(self.pending.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = rows[-1] is None
+            rows = [row for row in rows if row is not None]
+            if rows:
+                self._write(rows)
+            if stop:
+                return
+
+    def _write(self, rows):
+        counts = {table: Counter() for table in ROLLUPS}
+        tiers = Counter()
+        for created, _, verdict, *_, tier in rows:
+            moment = time.localtime(created)
+            for table, period_format in ROLLUPS.items():
+                counts[table][(time.strftime(period_format, moment), verdict)] += 1
+            if tier is not None:
+                tiers[(time.strftime(ROLLUPS["audit_daily"], moment), tier)] += 1
+        with self.lock:
+            self.connection.executemany(
+                "INSERT INTO audit (created, digest, verdict, is_real, confidence, check_scores, timings, cached, tier) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows,
+            )
+            for table, period_counts in counts.items():
+                self.connection.executemany(
+                    f"INSERT INTO {table} (period, {', '.join(VERDICTS)}) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (period) DO UPDATE SET "
+                    + ", ".join(f"{verdict} = {verdict} + excluded.{verdict}" for verdict in VERDICTS),
+                    [(period, *(count if verdict == counted else 0 for counted in VERDICTS))
+                     for (period, verdict), count in period_counts.items()],
+                )
+            self.connection.executemany(
+                f"INSERT INTO {TIER_ROLLUP} (period, tier, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (period, tier) DO UPDATE SET count = count + excluded.count",
+                [(period, tier, count) for (period, tier), count in tiers.items()],
+            )
+            self.connection.commit()
+
+    # Function to read the most recent periods of a rollup, oldest first:
+    # [(period, genuine, fraudulent, unverifiable), ...]
+    def totals(self, by="month", limit=6):
+        table = {"day": "audit_daily", "month": "audit_monthly"}[by]
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT period, {', '.join(VERDICTS)} FROM {table} ORDER BY period DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return rows[::-1]
+
+    # Function to count the verdicts each triage tier settled over the last days: {tier: count}
+    def tier_counts(self, days=30):
+        since = time.strftime(ROLLUPS["audit_daily"], time.localtime(time.time() - (days - 1) * 86400))
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT tier, SUM(count) FROM {TIER_ROLLUP} WHERE period >= ? GROUP BY tier", (since,)
+            ).fetchall()
+        return dict(rows)
+
+    # Function to write every queued verdict and stop the writer
+    def close(self):
+        if self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
+
+
+# Function to return this process's audit log, reopening it after a fork
+def get_audit_log(path=None):
+    path = os.path.abspath(path or DEFAULT_AUDIT_PATH)
+    with _logs_lock:
+        log = _logs.get(path)
+        if log is None or log.pid != os.getpid():
+            log = AuditLog(path)
+            _logs[path] = log
+        return log
+
+
+# Function to recompute the rollups from the audit table, e.g. after rows were deleted by hand
+def rebuild_rollups(path=None):
+    connection = _connect(os.path.abspath(path or DEFAULT_AUDIT_PATH))
+    for table, period_format in ROLLUPS.items():
+        connection.execute(f"DELETE FROM {table}")
+        connection.execute(
+            f"INSERT INTO {table} (period, {', '.join(VERDICTS)}) "
+            f"SELECT strftime('{period_format}', created, 'unixepoch', 'localtime') AS period, "
+            + ", ".join(f"SUM(verdict = '{verdict}')" for verdict in VERDICTS) + " FROM audit GROUP BY period"
+        )
+    connection.execute(f"DELETE FROM {TIER_ROLLUP}")
+    connection.execute(
+        f"INSERT INTO {TIER_ROLLUP} (period, tier, count) "
+        f"SELECT strftime('{ROLLUPS['audit_daily']}', created, 'unixepoch', 'localtime') AS period, tier, COUNT(*) "
+        "FROM audit WHERE tier IS NOT NULL GROUP BY period, tier"
+    )
+    connection.commit()
+    connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the verification audit log.")
+    parser.add_argument("--audit-log", default=DEFAULT_AUDIT_PATH, help="Audit database")
+    parser.add_argument("--by", choices=("day", "month"), default="month")
+    parser.add_argument("--limit", type=int, default=12)
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the rollups from the audit rows first")
+    parser.add_argument("--tiers", action="store_true",
+                        help="Print the share of verdicts each triage tier settled over the last --limit days")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        rebuild_rollups(args.audit_log)
+    log = AuditLog(args.audit_log)
+    if args.tiers:
+        counts = log.tier_counts(args.limit)
+        for tier, count in sorted(counts.items()):
+            sys.stdout.write(f"{tier}\t{count}\t{count / sum(counts.values()):.1%}\n")
+        return
+    sys.stdout.write("\t".join(("period",) + VERDICTS) + "\n")
+    for row in log.totals(args.by, args.limit):
+        sys.stdout.write("\t".join(map(str, row)) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1184 @@
+import argparse
+import functools
+import json
+import mimetypes
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from PIL import Image
+
+from audit_log import get_audit_log
+from certificate_model import VISUAL_CHECKS, get_model
+from certificate_registry import get_registry, lookup_certificate, lookup_issuer, normalize_serial, registry_generation
+from certificate_signatures import record_message, verify_cached
+from image_features import (
+    MIN_RESOLUTION,
+    combine_page_features,
+    extract_image_features,
+    feature_vector,
+    integrity_flags,
+    required_factors,
+)
+from image_pyramid import ImagePyramid
+from pdf_pages import PdfDocument
+from pipeline_trace import PROFILERS, annotate, request_trace, span, traced
+from qr_code import read_qr
+from submission_history import get_submission_history
+from template_index import TEMPLATE_FACTOR, get_template_index, perceptual_hash
+from result_cache import cache_key, content_digest, get_result_cache
+
+# Verification options, mirroring the sidebar toggles of the Streamlit app
+DEFAULT_CHECKS = {
+    "id_verification": True,
+    "qr_verification": True,
+    "security_features": True,
+    "integrity_check": True,
+}
+
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.pdf')
+
+# Archive members larger than this are skipped rather than read into memory
+MAX_ARCHIVE_MEMBER_BYTES = 50 * 2**20
+
+FILE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'%PDF-', 'application/pdf'),
+)
+
+# Image metadata keys (PNG text chunks, etc.) that carry the certificate serial
+SERIAL_METADATA_KEYS = ('serial', 'certificate_id', 'certificate id')
+# Metadata keys naming the software that last wrote the file: PNG text chunks and the PDF document info
+SOFTWARE_METADATA_KEYS = ('software', 'producer', 'creator', 'creatortool')
+EXIF_SOFTWARE_TAG = 0x0131
+XMP_CREATOR_TOOL = re.compile(r'CreatorTool(?:>|=")([^<"]+)')
+# Image and PDF editors; issuers export certificates straight from their own systems
+EDITING_SOFTWARE = ('photoshop', 'gimp', 'paint.net', 'pixelmator', 'affinity photo', 'canva', 'ilovepdf',
+                    'smallpdf', 'sejda', 'pdfescape')
+
+
+# Function to guess the MIME type of a nameless buffer from its magic bytes
+def sniff_type(data):
+    for magic, mime_type in FILE_SIGNATURES:
+        if data.startswith(magic):
+            return mime_type
+    return "application/octet-stream"
+
+
+# In-memory certificate with the same attributes the app reads from Streamlit's UploadedFile
+class CertificateFile:
+    def __init__(self, data, name="", type=None):
+        self.data = bytes(data)
+        self.name = name
+        self.type = type or mimetypes.guess_type(name)[0] or sniff_type(self.data)
+        self.size = len(self.data)
+
+    def getvalue(self):
+        return self.data
+
+
+# Function to turn a path, raw bytes or a file-like object into a CertificateFile
+def load_certificate(source):
+    if isinstance(source, CertificateFile):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            data = f.read()
+        return CertificateFile(data, name=os.path.basename(os.fspath(source)))
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return CertificateFile(source)
+    if hasattr(source, 'getvalue'):
+        data = source.getvalue()
+    elif hasattr(source, 'read'):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        data = source.read()
+    else:
+        raise TypeError(f"Unsupported certificate source: {type(source).__name__}")
+    name = os.path.basename(getattr(source, 'name', '') or '')
+    return CertificateFile(data, name=name, type=getattr(source, 'type', None))
+
+
+# Function to merge user-supplied options over the defaults
+def resolve_checks(checks=None):
+    resolved = dict(DEFAULT_CHECKS)
+    if checks is None:
+        return resolved
+    if not hasattr(checks, 'items'):
+        # An iterable of enabled check names
+        checks = {name: True for name in checks}
+        resolved = {name: False for name in DEFAULT_CHECKS}
+    for name, enabled in checks.items():
+        if name not in DEFAULT_CHECKS:
+            raise ValueError(f"Unknown verification check: {name!r}")
+        resolved[name] = bool(enabled)
+    return resolved
+
+
+# Function to merge triage cutoffs over the defaults: a {tier: (reject, accept)} dict, a string like
+# "coarse=0.05:0.97", True for the defaults, or False / "off" to disable the cascade (returns None)
+def resolve_triage(triage=None):
+    triage = DEFAULT_TRIAGE if triage is None else triage
+    if triage is True:
+        triage = {}
+    if triage is False or (isinstance(triage, str) and triage.strip().lower() in ('off', 'false', 'no', '0')):
+        return None
+    if isinstance(triage, str):
+        items = [item.partition('=') for item in triage.replace(' ', '').split(',') if item]
+        triage = {tier: tuple(bounds.split(':')) for tier, _, bounds in items}
+    resolved = dict(DEFAULT_TRIAGE_CUTOFFS)
+    for tier, bounds in triage.items():
+        if tier not in resolved or len(bounds) != 2:
+            raise ValueError(f"Invalid triage cutoffs for {tier!r}: expected header or coarse = reject:accept")
+        resolved[tier] = (float(bounds[0]), float(bounds[1]))
+    return resolved
+
+
+# Pipeline stages in execution order, with the labels shown in the UI progress bar
+PIPELINE_STAGES = [
+    ("cache", "Result cache lookup"),
+    ("decode", "Decoding file"),
+    ("triage", "Header and metadata triage"),
+    ("features", "Extracting features"),
+    ("forensics", "Full-resolution forensics"),
+    ("id_verification", "ID verification"),
+    ("qr_verification", "QR code validation"),
+    ("security_features", "Security features check"),
+    ("integrity_check", "Document integrity check"),
+    ("decision", "Final decision"),
+]
+STAGE_LABELS = dict(PIPELINE_STAGES)
+
+# Part of every result cache key; bump whenever the analysis changes so stale verdicts are not served
+ANALYSIS_VERSION = 16
+
+# Triage cascade in front of the full analysis. The header tier reads only the file header and metadata,
+# the coarse tier the downscaled page and the QR code, and the full tier runs the full-resolution forensics.
+# After each of the first two tiers a certificate whose score is at or below the first cutoff is rejected, one
+# at or above the second is accepted, and the rest move on. The coarse cutoffs are the ones benchmark.py
+# calibrates on a labeled holdout (seed 7), where they change no verdict of the full analysis; the header
+# accepts a registered serial only when the ID check is all there is to verify (see _header_answers).
+# Override with CERTIFICATE_TRIAGE, e.g. "header=0.1:0.99,coarse=0.2:0.9", or "off".
+TRIAGE_TIERS = ("header", "coarse", "full")
+DEFAULT_TRIAGE_CUTOFFS = {"header": (0.1, 0.99), "coarse": (0.26, 0.86)}
+DEFAULT_TRIAGE = os.environ.get("CERTIFICATE_TRIAGE", "")
+# Checks each tier runs; the header tier reads no pixels and runs none of them
+TIER_CHECKS = {
+    "coarse": ("id_verification", "security_features", "qr_verification"),
+    "full": ("integrity_check",),
+}
+# Stage order of the cascade: the checks of a tier run before the next tier analyzes anything
+TRIAGE_STAGE_ORDER = ("cache", "decode", "triage", "features", "id_verification", "security_features",
+                      "qr_verification", "forensics", "integrity_check", "decision")
+# Score of the header tier for a file last saved by an image or PDF editor
+EDITED_METADATA_SCORE = 0.3
+
+# The QR code is read from the full-resolution page, or the finest level that fits in the pixel memory cap
+QR_FACTOR = 1
+
+# Scores of registry lookups: a serial the registry knows, and one it has never issued
+REGISTRY_MATCH_SCORE = 0.99
+REGISTRY_MISS_SCORE = 0.05
+# Scores of the template check: layout matches an official template, or matches none of them
+TEMPLATE_MATCH_SCORE = 0.9
+TEMPLATE_MISS_SCORE = 0.2
+# Integrity score multiplier for a page that looks like prior submissions of other certificates
+SIMILAR_SUBMISSION_FACTOR = 0.8
+# Demo samples carry their label and are scored as clear-cut
+SAMPLE_SCORES = {True: 0.95, False: 0.05}
+# Pass mark of the per-check scores when no trained model is installed
+HEURISTIC_CUTOFF = 0.5
+# Status of a check whose score alone is below the pass mark. Only checks that report an issue
+# (Failed, Compromised, Tampered) are hard failures that decide the verdict; a low score only weighs in it.
+SOFT_FAILURE = "Suspicious"
+LOW_SCORE_ISSUE = "Overall document score is below the pass mark"
+# Score and reasons of an upload with no pixels to score and no registry record to match
+UNVERIFIABLE_SCORE = 0.0
+UNDECODABLE_REASON = "File could not be decoded as a certificate image or PDF"
+NO_EVIDENCE_REASON = "No pixel evidence or registry record to verify the certificate against"
+UNDECODABLE_PAGES_REASON = "No page image of the PDF could be decoded"
+VECTOR_PAGES_REASON = "The PDF has no embedded page image to analyze (vector-only pages)"
+# Listed under the issues of any verdict: PDF pages left out of the analysis for lack of an embedded image
+VECTOR_PAGES_ISSUE = "PDF pages without an embedded image (vector-only) were not analyzed: {pages}"
+UNTRAINED_FORMAT_REASON = "The model was not trained on {format} uploads and the registry has no record to match"
+# Upload formats as the model metadata names them, by the decoded format (Pillow's, or PDF)
+MODEL_FORMATS = {"PNG": "png", "JPEG": "jpeg", "MPO": "jpeg", "PDF": "pdf"}
+
+
+# Measures the wall time of each pipeline stage and reports it as soon as the stage ends.
+# Progress is counted over the stages this run will actually execute.
+class StageTimer:
+    def __init__(self, on_stage=None, stages=None):
+        self.on_stage = on_stage
+        self.stages = list(stages or STAGE_LABELS)
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            if self.on_stage is not None:
+                self.on_stage(name, self.stages.index(name) + 1, len(self.stages), self.timings[name])
+
+
+# Function to list the enabled checks that are scored from pixels, optionally only those among names
+def _visual_checks(checks, names=VISUAL_CHECKS):
+    return [name for name in VISUAL_CHECKS if checks[name] and name in names]
+
+
+# Function to list the pyramid levels the enabled checks read, finest first
+def _required_levels(checks):
+    factors = set(required_factors(_visual_checks(checks)))
+    if checks["qr_verification"]:
+        factors.add(QR_FACTOR)
+    # The template match and the near-duplicate search both hash the page at the template level
+    if (checks["id_verification"] and get_template_index() is not None) or checks["integrity_check"]:
+        factors.add(TEMPLATE_FACTOR)
+    return sorted(factors)
+
+
+# Stage 1: read the upload, parse the image header and decode each pyramid level the enabled checks need, once.
+# With prefetch=False only the header is read; the triage cascade decodes levels tier by tier.
+def _decode(uploaded_file, data, checks, prefetch=True):
+    decoded = {"data": data or b"", "format": None, "dimensions": None, "metadata": {}, "pyramid": None, "pdf": None,
+               "first_page": None}
+    file_type = getattr(uploaded_file, 'type', '')
+    if decoded["data"] and file_type == 'application/pdf':
+        # Only the document structure is parsed here; page images are extracted lazily in stage 2
+        try:
+            document = PdfDocument(decoded["data"])
+        except Exception:
+            # pypdf raises a variety of errors on malformed files (and ImportError when not installed)
+            return decoded
+        decoded["format"] = "PDF"
+        decoded["metadata"] = document.metadata
+        decoded["pdf"] = document
+    elif decoded["data"] and file_type.startswith('image'):
+        try:
+            pyramid = ImagePyramid(decoded["data"])
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return decoded
+        decoded["format"] = pyramid.format
+        decoded["dimensions"] = pyramid.size
+        decoded["metadata"] = {key: value for key, value in pyramid.info.items() if isinstance(value, str)}
+        decoded["pyramid"] = pyramid
+        if prefetch:
+            _prefetch(decoded, _required_levels(checks))
+    return decoded
+
+
+# Function to decode pyramid levels of an image upload, finest first so coarser ones are reduced from it
+# instead of decoded again. An image whose pixels fail to decode is treated like an unreadable file.
+def _prefetch(decoded, factors):
+    if decoded["pyramid"] is None:
+        return
+    try:
+        for factor in sorted(set(factors)):
+            decoded["pyramid"].level(factor)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        decoded.update(format=None, dimensions=None, metadata={}, pyramid=None)
+
+
+# Function to find the certificate serial embedded in the file metadata, if any
+def _extract_serial(uploaded_file, decoded):
+    serial = getattr(uploaded_file, 'serial', None)
+    if serial:
+        return normalize_serial(serial)
+    for key, value in decoded["metadata"].items():
+        if key.lower() in SERIAL_METADATA_KEYS and value.strip():
+            return normalize_serial(value)
+    return None
+
+
+# Function to list the software the file metadata says wrote it: PNG text chunks, EXIF, XMP and the PDF
+# document info, all read from the header without decoding pixels
+def _metadata_software(decoded):
+    names = [value for key, value in decoded["metadata"].items() if key.lower() in SOFTWARE_METADATA_KEYS]
+    pyramid = decoded["pyramid"]
+    if pyramid is not None:
+        if pyramid.info.get("exif"):
+            try:
+                exif = Image.Exif()
+                exif.load(pyramid.info["exif"])
+                names.append(exif.get(EXIF_SOFTWARE_TAG))
+            except Exception:
+                # Malformed EXIF blocks raise a variety of errors; they carry no usable name either way
+                pass
+        xmp = pyramid.info.get("xmp") or pyramid.info.get("XML:com.adobe.xmp") or ""
+        if isinstance(xmp, bytes):
+            xmp = xmp.decode('utf-8', 'replace')
+        names.extend(XMP_CREATOR_TOOL.findall(xmp))
+    return [str(name).strip() for name in names if name and str(name).strip()]
+
+
+# Function to analyze PDF pages one at a time as they are extracted.
+# The walk stops as soon as the verdict is settled: an unknown serial means no page needs
+# to be rasterized at all, and a page with a clear integrity failure ends it early.
+# With no visual check enabled the pages are not rasterized either. Otherwise every page is walked,
+# one at a time, and pages without an embedded image are listed under vector_pages.
+@traced()
+def _analyze_pdf_pages(document, serial, visual_checks, levels=()):
+    summary = {"page_count": document.page_count, "pages_analyzed": 0, "stopped_early": False,
+               "decode_ms": 0.0, "peak_pixel_bytes": 0, "spilled_levels": [], "spill_bytes": 0, "failed_pages": [],
+               "vector_pages": []}
+    if serial is not None and lookup_certificate(serial) is None:
+        summary["stopped_early"] = True
+        return None, [], summary
+    if not visual_checks:
+        return None, [], summary
+
+    page_features = []
+    flags = []
+    for page_number, pyramid in document.iter_page_images():
+        try:
+            # The levels of every enabled check are decoded finest first, tier or no tier: a coarse level decoded
+            # straight at reduced size (JPEG draft) drifts from the one reduced from the full page
+            for factor in levels:
+                pyramid.level(factor)
+            features = extract_image_features(pyramid, visual_checks)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # Truncated or corrupt pixel data fails only its own page
+            document.failed_pages.add(page_number)
+            continue
+        stats = pyramid.stats()
+        summary["decode_ms"] += stats["decode_ms"]
+        summary["peak_pixel_bytes"] = max(summary["peak_pixel_bytes"], stats["peak_pixel_bytes"])
+        summary["spilled_levels"] = sorted(set(summary["spilled_levels"]) | set(stats["spilled_levels"]))
+        summary["spill_bytes"] = max(summary["spill_bytes"], stats["spill_bytes"])
+        summary["pages_analyzed"] += 1
+        page_features.append(features)
+        if "integrity_check" in visual_checks:
+            flags = [f"{flag} (page {page_number})" for flag in integrity_flags(features)]
+        if flags:
+            summary["stopped_early"] = page_number < document.page_count
+            break
+
+    summary["failed_pages"] = sorted(document.failed_pages)
+    summary["vector_pages"] = sorted(document.vector_pages)
+    image = combine_page_features(page_features) if page_features else None
+    return image, flags, summary
+
+
+# Function to start the evidence of one upload: the serial from the metadata and no pixel features yet
+def _evidence(uploaded_file, decoded):
+    return {"serial": _extract_serial(uploaded_file, decoded), "image": None, "image_flags": [], "image_stats": None,
+            "visual": [], "vector": None, "check_scores": {}, "page_gray": functools.partial(_page_gray, decoded)}
+
+
+# Stage 2: derive the authenticity signals from the pixels of images or PDF pages and the registry.
+# Only the features of enabled checks are extracted, and every enabled visual check is scored from the
+# same feature vector in one model pass. The triage cascade calls it once per tier: visual lists the checks
+# whose features the tier adds to the earlier evidence, and the model rescores everything extracted so far.
+def _extract_features(uploaded_file, decoded, checks, visual=None, evidence=None):
+    visual = _visual_checks(checks) if visual is None else visual
+    evidence = dict(evidence or _evidence(uploaded_file, decoded))
+    evidence.pop("unverifiable", None)
+    image = None
+    if decoded["pyramid"] is not None:
+        if visual:
+            image = extract_image_features(decoded["pyramid"], visual)
+            if "integrity_check" in visual:
+                evidence["image_flags"] = evidence["image_flags"] + integrity_flags(image)
+        evidence["image_stats"] = decoded["pyramid"].stats()
+    elif decoded["pdf"] is not None and (visual or evidence["image_stats"] is None):
+        image, image_flags, evidence["image_stats"] = _analyze_pdf_pages(decoded["pdf"], evidence["serial"], visual,
+                                                                         required_factors(_visual_checks(checks)))
+        evidence["image_flags"] = evidence["image_flags"] + image_flags
+    if image is not None:
+        evidence["image"] = dict(evidence["image"] or {}, **image)
+        evidence["visual"] = evidence["visual"] + list(visual)
+        evidence["vector"] = feature_vector(evidence["image"])
+    serial, vector, scored = evidence["serial"], evidence["vector"], evidence["visual"]
+
+    # Demo samples carry their label
+    if hasattr(uploaded_file, 'is_real_sample'):
+        is_real = bool(uploaded_file.is_real_sample)
+        return dict(evidence, is_real=is_real, authenticity_score=SAMPLE_SCORES[is_real])
+
+    # Trained per-check heads on the image features, combined by the calibrator for the enabled checks.
+    # An upload format the model was not trained and calibrated on is not scored by it.
+    model = get_model()
+    file_format = MODEL_FORMATS.get(decoded["format"])
+    trained = model is not None and file_format in model.formats()
+    if trained and vector is not None and scored:
+        with span("model.score"):
+            per_check, combined = model.score(vector, scored, file_format)
+        authenticity_score = float(combined[0])
+        return dict(evidence, is_real=authenticity_score >= model.threshold, authenticity_score=authenticity_score,
+                    check_scores={check: float(score[0]) for check, score in per_check.items()})
+
+    # Without pixel evidence, a serial the registry confirms settles the verdict
+    if serial is not None and (checks["id_verification"] or checks["qr_verification"]) \
+            and lookup_certificate(serial) is not None:
+        return dict(evidence, is_real=True, authenticity_score=REGISTRY_MATCH_SCORE)
+
+    # Nothing left to verify the certificate against: never a genuine verdict
+    if decoded["pyramid"] is None and decoded["pdf"] is None:
+        reason = UNDECODABLE_REASON
+    elif (evidence["image_stats"] or {}).get("failed_pages"):
+        reason = UNDECODABLE_PAGES_REASON
+    elif (evidence["image_stats"] or {}).get("vector_pages") and not evidence["image_stats"]["pages_analyzed"]:
+        reason = VECTOR_PAGES_REASON
+    elif model is not None and not trained and vector is not None:
+        reason = UNTRAINED_FORMAT_REASON.format(format=decoded["format"])
+    else:
+        reason = NO_EVIDENCE_REASON
+    return dict(evidence, is_real=False, authenticity_score=UNVERIFIABLE_SCORE, unverifiable=reason)
+
+
+# Function to get the luminance of the page a check reads at the given pyramid level: the image itself,
+# or the first PDF page (extracted once and kept for the other checks). These checks read the whole page at once,
+# so on a page too large for the pixel memory cap they get the finest coarser level that fits.
+def _page_gray(decoded, factor):
+    if decoded["pdf"] is not None and decoded["pyramid"] is None and decoded["first_page"] is None:
+        for _, pyramid in decoded["pdf"].iter_page_images(1):
+            decoded["first_page"] = pyramid
+    pyramid = decoded["pyramid"] if decoded["pyramid"] is not None else decoded["first_page"]
+    if pyramid is None:
+        return None
+    try:
+        return pyramid.gray(pyramid.page_factor(factor))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # A page whose pixels fail to decode has nothing to read
+        return None
+
+
+# Function to find the official template nearest to the page layout; None without an index or pixels
+@traced()
+def _match_template(features):
+    index = get_template_index()
+    if index is None:
+        return None
+    gray = features["page_gray"](TEMPLATE_FACTOR)
+    if gray is None:
+        return None
+    start = time.perf_counter()
+    match = index.search(gray)
+    if match is not None:
+        match["search_ms"] = (time.perf_counter() - start) * 1000
+    features["template_match"] = match
+    return match
+
+
+# Function to get a check's own score, or the document score when the check had nothing to score
+def _check_score(features, name):
+    score = features["check_scores"].get(name)
+    if score is None:
+        return features["authenticity_score"], False
+    return score, True
+
+
+def _passes(score):
+    model = get_model()
+    return score >= (model.threshold if model is not None else HEURISTIC_CUTOFF)
+
+
+# Registry lookup of the serial, then the page layout against the index of official templates
+def _check_id(features):
+    serial = features["serial"]
+    record = None
+    if serial is not None:
+        record = lookup_certificate(serial)
+        if record is None:
+            return "ID Verification", {
+                "status": "Failed",
+                "details": f"Serial {serial} was never issued",
+                "confidence": REGISTRY_MISS_SCORE
+            }, ["Serial number not found in the certificate registry"]
+
+    template = _match_template(features)
+    if template is not None and not template["matched"]:
+        return "ID Verification", {
+            "status": "Failed",
+            "details": f"Layout matches no official template (nearest: {template['name']}, "
+                       f"{template['distance']} bits apart)",
+            "confidence": TEMPLATE_MISS_SCORE
+        }, ["Layout doesn't match any official template"]
+    matched = (f"layout matches template {template['name']} ({template['distance']} bits apart)"
+               if template is not None else None)
+
+    if record is not None:
+        issued = f"Serial {serial} issued to {record['name']} ({record['course']}, {record['date']})"
+        return "ID Verification", {
+            "status": "Passed",
+            "details": f"{issued}; {matched}" if matched else issued,
+            "confidence": REGISTRY_MATCH_SCORE
+        }, []
+    if matched:
+        return "ID Verification", {
+            "status": "Passed",
+            "details": matched[0].upper() + matched[1:],
+            "confidence": TEMPLATE_MATCH_SCORE
+        }, []
+
+    score = features["authenticity_score"]
+    if features.get("unverifiable"):
+        return "ID Verification", {
+            "status": "Unverifiable",
+            "details": features["unverifiable"],
+            "confidence": score
+        }, []
+    return "ID Verification", {
+        "status": "Passed" if _passes(score) else SOFT_FAILURE,
+        "details": "No serial in the file metadata; judged on the overall document score",
+        "confidence": score
+    }, []
+
+
+def _qr_failure(details, issue):
+    return "QR Code Validation", {
+        "status": "Tampered",
+        "details": details,
+        "confidence": REGISTRY_MISS_SCORE
+    }, [issue]
+
+
+# Locate and decode the printed QR code, then check its signed payload against the registry record and
+# the issuer's public key. The read and the signature check are timed separately in features["qr_stats"].
+def _check_qr(features):
+    start = time.perf_counter()
+    gray = features["page_gray"](QR_FACTOR)
+    with span("qr.read"):
+        payload, found = read_qr(gray) if gray is not None else (None, False)
+    stats = {"found": found, "decoded": payload is not None, "read_ms": (time.perf_counter() - start) * 1000,
+             "signature_ms": 0.0, "signature_cached": False}
+    features["qr_stats"] = stats
+
+    if not found:
+        score = features["authenticity_score"]
+        return "QR Code Validation", {
+            "status": "Not found",
+            "details": "No QR code issued by this tool found on the page (standard QR codes are not read); "
+                       "judged on the overall document score",
+            "confidence": score
+        }, []
+    if payload is None:
+        return _qr_failure("QR code found but its payload is damaged or altered", "QR code payload is corrupted")
+
+    serial = features["serial"]
+    if serial is not None and normalize_serial(payload.serial) != serial:
+        return _qr_failure(f"QR code carries serial {payload.serial}, the document says {serial}",
+                           "QR code doesn't match database records")
+    record = lookup_certificate(payload.serial)
+    if record is None:
+        return _qr_failure(f"No registry record for serial {payload.serial}", "QR code doesn't match database records")
+    if not record["signature"]:
+        return "QR Code Validation", {
+            "status": "Unsigned",
+            "details": f"Serial {payload.serial} is registered without a signature to check",
+            "confidence": features["authenticity_score"]
+        }, []
+    if payload.signature.hex() != record["signature"].lower():
+        return _qr_failure("QR signature differs from the registry record", "Signature verification failed")
+    issuer = lookup_issuer(payload.key_id.hex())
+    if issuer is None:
+        return _qr_failure(f"Signed with unknown issuer key {payload.key_id.hex()}",
+                           "Digital signature validation failed")
+
+    start = time.perf_counter()
+    with span("qr.signature"):
+        valid, stats["signature_cached"] = verify_cached(bytes.fromhex(issuer["public_key"]), record_message(record),
+                                                         payload.signature)
+    stats["signature_ms"] = (time.perf_counter() - start) * 1000
+    if not valid:
+        return _qr_failure(f"Signature does not verify with the key of {issuer['name']}",
+                           "Digital signature validation failed")
+    return "QR Code Validation", {
+        "status": "Authentic",
+        "details": f"Serial {payload.serial} signed by {issuer['name']}, signature verified",
+        "confidence": REGISTRY_MATCH_SCORE
+    }, []
+
+
+def _check_security(features):
+    score, from_pixels = _check_score(features, "security_features")
+    passed = _passes(score)
+    if from_pixels:
+        tint = features["image"]["blue_tint_fraction"]
+        details = (f"Watermark tint on {tint:.2%} of the page" if passed
+                   else f"Missing hologram pattern (watermark tint on {tint:.2%} of the page)")
+    elif features.get("unverifiable"):
+        return "Security Features", {"status": "Unverifiable", "details": features["unverifiable"],
+                                     "confidence": score}, []
+    else:
+        details = "No decodable pixels; judged on the overall document score"
+    return "Security Features", {
+        "status": "Detected" if passed else SOFT_FAILURE,
+        "details": details,
+        "confidence": score
+    }, []
+
+
+# Function to look up earlier submissions of the same base image, then record this one in the history.
+# Returns {"count": files reusing it, "similar": look-alikes of other certificates, ...}; None without pixels.
+@traced()
+def _find_duplicates(features):
+    if features["vector"] is None or features["digest"] is None:
+        return None
+    gray = features["page_gray"](TEMPLATE_FACTOR)
+    if gray is None:
+        return None
+    start = time.perf_counter()
+    history = get_submission_history()
+    image_hash = perceptual_hash(gray)
+    count, similar, last_seen = history.find_duplicates(image_hash, features["vector"], features["digest"],
+                                                        features["serial"])
+    history.append(image_hash, features["vector"], features["digest"], features["serial"])
+    features["duplicates"] = {"count": count, "similar": similar, "last_seen": last_seen,
+                              "search_ms": (time.perf_counter() - start) * 1000}
+    return features["duplicates"]
+
+
+def _check_integrity(features):
+    duplicates = _find_duplicates(features) or {"count": 0, "similar": 0}
+    if duplicates["count"]:
+        count = duplicates["count"]
+        issue = f"Same base image as {count} prior submission{'s' if count > 1 else ''}"
+        return "Document Integrity", {
+            "status": "Compromised",
+            "details": "; ".join([issue] + features["image_flags"]),
+            "confidence": 0.1
+        }, [issue] + list(features["image_flags"])
+
+    if features["image_flags"]:
+        return "Document Integrity", {
+            "status": "Compromised",
+            "details": "; ".join(features["image_flags"]),
+            "confidence": 0.1
+        }, list(features["image_flags"])
+
+    score, from_pixels = _check_score(features, "integrity_check")
+    passed = _passes(score)
+    if from_pixels:
+        image = features["image"]
+        measured = f"error level {image['ela_mean']:.2f}, blockiness {image['blockiness']:.2f}"
+        details = (f"No signs of tampering detected ({measured})" if passed
+                   else f"Signs of digital alteration detected ({measured})")
+    elif features.get("unverifiable"):
+        return "Document Integrity", {"status": "Unverifiable", "details": features["unverifiable"],
+                                      "confidence": score}, []
+    else:
+        details = "No decodable pixels; judged on the overall document score"
+    if duplicates["similar"]:
+        # Certificates printed from one template look alike: lowers the score, never decides the verdict
+        similar = duplicates["similar"]
+        score *= SIMILAR_SUBMISSION_FACTOR
+        details += f"; looks like {similar} prior submission{'s' if similar > 1 else ''} of other certificates"
+    return "Document Integrity", {
+        "status": "Intact" if passed else SOFT_FAILURE,
+        "details": details,
+        "confidence": score
+    }, []
+
+
+CHECK_FUNCTIONS = {
+    "id_verification": _check_id,
+    "qr_verification": _check_qr,
+    "security_features": _check_security,
+    "integrity_check": _check_integrity,
+}
+
+
+# Results of the checks that ran, in the order they ran
+class CheckResults:
+    def __init__(self):
+        self.details = {}
+        self.issues = []
+        self.failed_scores = []
+
+    def add(self, label, result, issues):
+        self.details[label] = result
+        self.issues.extend(issues)
+        if issues:
+            self.failed_scores.append(result['confidence'])
+
+
+# Function to run the enabled checks among names, each as its own stage
+def _run_checks(names, checks, features, timer, results):
+    for name in names:
+        if not checks[name]:
+            continue
+        with timer.stage(name):
+            results.add(*CHECK_FUNCTIONS[name](features))
+
+
+# Tier 0 of the triage cascade: what the header and metadata settle without decoding pixels. An unissued
+# serial and a page too small for an official document are hard failures; a file last saved by an editing
+# tool lowers the score. Returns the tier's score (None when the header says nothing either way) and its
+# findings as (label, result, issues), like the checks return.
+def _triage_header(features, decoded, checks):
+    score = None
+    findings = []
+    serial = features["serial"]
+    if serial is not None and (checks["id_verification"] or checks["qr_verification"]):
+        if lookup_certificate(serial) is None:
+            findings.append(("ID Verification", {
+                "status": "Failed",
+                "details": f"Serial {serial} was never issued",
+                "confidence": REGISTRY_MISS_SCORE
+            }, ["Serial number not found in the certificate registry"]))
+        else:
+            score = REGISTRY_MATCH_SCORE
+    if checks["integrity_check"]:
+        dimensions = decoded["dimensions"]
+        if dimensions is not None and min(dimensions) < MIN_RESOLUTION:
+            findings.append(("Document Integrity", {
+                "status": "Compromised",
+                "details": f"Page is only {dimensions[0]}x{dimensions[1]} pixels",
+                "confidence": 0.1
+            }, ["Low image resolution for an official document"]))
+        editors = [name for name in _metadata_software(decoded)
+                   if any(tool in name.lower() for tool in EDITING_SOFTWARE)]
+        if editors:
+            score = min(score if score is not None else 1.0, EDITED_METADATA_SCORE)
+            findings.append(("File Metadata", {
+                "status": "Edited",
+                "details": f"Last saved with {editors[0]}",
+                "confidence": EDITED_METADATA_SCORE
+            }, []))
+    return score, findings
+
+
+# Function to decide after a triage tier: False to reject, True to accept, None to move on to the next tier.
+# A check that found a hard failure rejects outright, since no later tier can clear it.
+def _settle(score, issues, cutoffs):
+    if issues:
+        return False
+    if score is None:
+        return None
+    reject, accept = cutoffs
+    if score <= reject:
+        return False
+    return True if score >= accept else None
+
+
+# Function to tell whether the header tier answers every enabled check: only the ID check's registry lookup is
+# enabled, with no official template index to match the layout against
+def _header_answers(checks):
+    return not any(checks[name] for name in CHECK_FUNCTIONS if name != "id_verification") \
+        and get_template_index() is None
+
+
+def _triage_summary(tier, scores, checks):
+    reached = {name for earlier in TRIAGE_TIERS[:TRIAGE_TIERS.index(tier) + 1] for name in TIER_CHECKS.get(earlier, ())}
+    return {"tier": tier, "scores": scores,
+            "skipped_checks": [name for name in CHECK_FUNCTIONS if checks[name] and name not in reached]}
+
+
+# Function to run the triage cascade. Each tier adds evidence and runs its checks, and the certificate leaves
+# after the first tier whose score crosses a cutoff. Returns the features, the verdict of the tier that settled
+# it (None when the last tier ran and the usual decision applies) and the triage summary for the report.
+def _run_cascade(uploaded_file, decoded, checks, cutoffs, timer, results, digest):
+    features = _evidence(uploaded_file, decoded)
+    features["digest"] = digest
+    scores = {}
+    last = "full" if any(checks[name] for name in TIER_CHECKS["full"]) else "coarse"
+
+    with timer.stage("triage"):
+        scores["header"], findings = _triage_header(features, decoded, checks)
+        for finding in findings:
+            results.add(*finding)
+    settled = _settle(scores["header"], results.issues, cutoffs["header"])
+    # A registered serial says nothing about the pixels: the header accepts only when it answers every enabled check
+    if settled and not _header_answers(checks):
+        settled = None
+    if settled is not None:
+        return features, settled, _triage_summary("header", scores, checks)
+
+    with timer.stage("features"):
+        # The levels are decoded as without the cascade: coarse levels reduced from the full image match what
+        # the model was trained on, where levels decoded straight at reduced size (JPEG draft) drift from it.
+        # The coarse tier saves the full-resolution analysis, not the decode.
+        _prefetch(decoded, _required_levels(checks))
+        features = _extract_features(uploaded_file, decoded, checks, _visual_checks(checks, TIER_CHECKS["coarse"]),
+                                     features)
+    _run_checks(TIER_CHECKS["coarse"], checks, features, timer, results)
+    scores["coarse"] = features["authenticity_score"] if features["check_scores"] else None
+    if last == "coarse":
+        return features, None, _triage_summary("coarse", scores, checks)
+    settled = _settle(scores["coarse"], results.issues, cutoffs["coarse"])
+    if settled is not None:
+        return features, settled, _triage_summary("coarse", scores, checks)
+
+    with timer.stage("forensics"):
+        features = _extract_features(uploaded_file, decoded, checks, _visual_checks(checks, TIER_CHECKS["full"]),
+                                     features)
+    _run_checks(TIER_CHECKS["full"], checks, features, timer, results)
+    scores["full"] = features["authenticity_score"]
+    return features, None, _triage_summary("full", scores, checks)
+
+
+# Function to tag cached reports with the code version and the model artifact that produced them
+def _analysis_version():
+    model = get_model()
+    return f"{ANALYSIS_VERSION}-{model.fingerprint}" if model is not None else ANALYSIS_VERSION
+
+
+# Function to run the verification pipeline stage by stage.
+# on_stage(stage, completed, total, seconds) is called after every stage so callers can drive a progress bar.
+# Reports are cached by content hash, enabled checks and registry generation; a cache hit is marked with
+# "cached": True.
+# Every fresh verdict is queued for the audit log; a cache hit replays a verdict that was already recorded.
+# session names the submitter (e.g. a Streamlit session): the audit log records a file once per session.
+# With persist=False nothing is written beyond the result cache: no audit log entry, and the submission
+# history is neither searched nor appended to.
+# triage sets the cutoffs of the triage cascade (see resolve_triage); the tier that settled the verdict is
+# reported under "triage". With triage=False every certificate gets the full analysis.
+# With debug=True the request bypasses the cache and runs under cProfile and tracemalloc; whenever a request
+# is traced (debug, CERTIFICATE_TRACE or CERTIFICATE_PROFILE), its spans are returned under "trace".
+def run_pipeline(uploaded_file, checks=None, on_stage=None, use_cache=True, debug=False, triage=None, persist=True,
+                 session=None):
+    with request_trace("run_pipeline", profile=PROFILERS if debug else None, capture=debug,
+                       **{"file.name": getattr(uploaded_file, 'name', '') or '',
+                          "file.size": getattr(uploaded_file, 'size', 0) or 0}) as trace:
+        report = _run_pipeline(uploaded_file, checks, on_stage, use_cache and not debug, resolve_triage(triage),
+                               persist, session)
+        annotate(**{"verdict.is_real": bool(report["is_real"]), "verdict.confidence": float(report["confidence"]),
+                    "cache.hit": bool(report["cached"]),
+                    "triage.tier": (report["triage"] or {}).get("tier", "off")})
+    if trace is not None:
+        report = dict(report, trace=trace.summary())
+    return report
+
+
+def _run_pipeline(uploaded_file, checks, on_stage, use_cache, cutoffs, persist=True, session=None):
+    checks = resolve_checks(checks)
+    data = uploaded_file.getvalue() if hasattr(uploaded_file, 'getvalue') else None
+    digest = content_digest(data) if data else None
+    use_cache = use_cache and digest is not None and not hasattr(uploaded_file, 'is_real_sample')
+    # Disabled checks are skipped entirely, so they are not part of the progress either
+    order = TRIAGE_STAGE_ORDER if cutoffs is not None else [name for name, _ in PIPELINE_STAGES
+                                                            if name not in ("triage", "forensics")]
+    stages = [name for name in order if checks.get(name, True) and (name != "cache" or use_cache)
+              and (name != "forensics" or any(checks[check] for check in TIER_CHECKS["full"]))]
+    timer = StageTimer(on_stage, stages)
+
+    cache = key = None
+    if use_cache:
+        cache = get_result_cache()
+        triage_tag = ",".join(f"{tier}={reject}:{accept}" for tier, (reject, accept) in cutoffs.items()) \
+            if cutoffs is not None else "off"
+        # Verdicts read the registry (serials, signatures, issuer keys): any write to it moves the generation,
+        # so reports made before an import or revocation are not served after it. Reports made without the
+        # submission history carry no duplicate search and are kept apart.
+        key = cache_key(digest, checks, f"{_analysis_version()}-registry{registry_generation()}-{triage_tag}"
+                        + ("" if persist else "-no-history"))
+        with timer.stage("cache"):
+            cached = cache.get(key)
+        if cached is not None:
+            cached["timings"] = dict(timer.timings)
+            cached["cached"] = True
+            return cached
+
+    # Demo samples are not real submissions and stay out of the history
+    history_digest = None if hasattr(uploaded_file, 'is_real_sample') or not persist else digest
+
+    # Generate detailed analysis results for the enabled checks only
+    results = CheckResults()
+    with timer.stage("decode"):
+        decoded = _decode(uploaded_file, data, checks, prefetch=cutoffs is None)
+    if cutoffs is None:
+        with timer.stage("features"):
+            features = _extract_features(uploaded_file, decoded, checks)
+            features["digest"] = history_digest
+        _run_checks(CHECK_FUNCTIONS, checks, features, timer, results)
+        settled, triage = None, None
+    else:
+        features, settled, triage = _run_cascade(uploaded_file, decoded, checks, cutoffs, timer, results,
+                                                 history_digest)
+
+    with timer.stage("decision"):
+        if settled is None:
+            verdict, score = features["is_real"], features["authenticity_score"]
+        else:
+            # An early exit rests on the score of the tier that settled it
+            verdict, score = settled, triage["scores"][triage["tier"]]
+
+        # Issues found by a check (e.g. a serial missing from the registry) always mean fraud
+        is_real = verdict and not results.issues
+        # Nothing to verify against and nothing found wrong: neither genuine nor proven fraudulent
+        unverifiable = features.get("unverifiable") if settled is None and not results.issues else None
+
+        # Only what the checks actually found: hard failures, else the checks that scored below the pass mark
+        issues = list(results.issues) + ([unverifiable] if unverifiable else [])
+        if not is_real and not issues:
+            issues = [f"{label}: {result['details']}" for label, result in results.details.items()
+                      if result["status"] == SOFT_FAILURE] or [LOW_SCORE_ISSUE]
+        vector_pages = (features["image_stats"] or {}).get("vector_pages")
+        if vector_pages and unverifiable != VECTOR_PAGES_REASON:
+            issues.append(VECTOR_PAGES_ISSUE.format(pages=", ".join(map(str, vector_pages))))
+
+        # Calibrated P(genuine) of the enabled checks, capped by any check that found a hard failure
+        confidence = min(([score] if score is not None else []) + results.failed_scores)
+
+    report = {
+        "is_real": bool(is_real),
+        "verdict": "unverifiable" if unverifiable else "genuine" if is_real else "fraudulent",
+        "confidence": confidence,
+        "analysis_details": results.details,
+        "issues": issues,
+        "check_scores": features["check_scores"],
+        "qr_stats": features.get("qr_stats"),
+        "template_match": features.get("template_match"),
+        "duplicates": features.get("duplicates"),
+        "image_features": features["image"],
+        "image_stats": features["image_stats"],
+        "triage": triage,
+        "timings": timer.timings,
+        "cached": False,
+    }
+    if cache is not None:
+        cache.put(key, report)
+    if persist:
+        get_audit_log().record(report, digest, session)
+    return report
+
+
+# Function to verify one certificate with the checks switched on individually; runs the full pipeline and
+# returns (is_real, confidence, analysis details, issues) of its report
+def analyze_certificate(uploaded_file, id_check, qr_check, security_check, integrity_check, on_stage=None,
+                        persist=True):
+    checks = {
+        "id_verification": id_check,
+        "qr_verification": qr_check,
+        "security_features": security_check,
+        "integrity_check": integrity_check,
+    }
+    result = run_pipeline(uploaded_file, checks, on_stage=on_stage, persist=persist)
+    return result["is_real"], result["confidence"], result["analysis_details"], result["issues"]
+
+
+# Function to verify a single certificate and return a JSON-serialisable report
+def verify_certificate(source, checks=None, use_cache=True, triage=None, persist=True):
+    certificate = load_certificate(source)
+    report = {
+        "name": certificate.name,
+        "size": certificate.size,
+        "type": certificate.type,
+    }
+    report.update(run_pipeline(certificate, checks, use_cache=use_cache, triage=triage, persist=persist))
+    return report
+
+
+def _verify_indexed(index, source, checks, use_cache, triage=None):
+    try:
+        report = verify_certificate(source, checks, use_cache, triage)
+    except Exception as exc:
+        return _batch_error(index, source, exc)
+    report["index"] = index
+    if isinstance(source, (str, os.PathLike)):
+        report["path"] = os.fspath(source)
+    return report
+
+
+# Function to report a batch certificate that could not be verified, in place of its report
+def _batch_error(index, source, exc):
+    report = {"name": os.path.basename(os.fspath(source)) if isinstance(source, (str, os.PathLike))
+              else getattr(source, "name", ""), "error": f"{type(exc).__name__}: {exc}", "index": index}
+    if isinstance(source, (str, os.PathLike)):
+        report["path"] = os.fspath(source)
+    return report
+
+
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+# Function to return a process pool shared by every caller in this process, created on first use.
+# forkserver workers are not forked from a threaded parent (Streamlit, the HTTP service).
+# The fork server imports the engine once, so each worker starts with numpy, PIL and the engine loaded.
+def get_worker_pool(workers=None):
+    workers = workers or os.cpu_count() or 1
+    with _worker_pools_lock:
+        pool = _worker_pools.get(workers)
+        if pool is None:
+            context = None
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _worker_pools[workers] = pool
+        return pool
+
+
+# Function to drop a shared pool that a dying worker broke (BrokenProcessPool), so the next get_worker_pool
+# starts fresh workers. Returns its worker count, or None when the pool is not one of the shared pools.
+def discard_worker_pool(pool):
+    with _worker_pools_lock:
+        workers = next((workers for workers, shared in _worker_pools.items() if shared is pool), None)
+        if workers is None:
+            return None
+        del _worker_pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+    return workers
+
+
+# Function to replace a broken shared pool with a fresh one of the same size; another executor is the
+# caller's to replace, so the error is raised again
+def _replace_broken_pool(pool, exc):
+    workers = discard_worker_pool(pool)
+    if workers is None:
+        raise exc
+    return get_worker_pool(workers)
+
+
+# Function to load what the first verification would otherwise pay for: the model, the registry connection,
+# the result cache, audit log, history and template index, the MIME type table and the sample certificate fonts.
+# With workers > 1 the shared worker pool is started and each worker warms up the same way.
+# Returns the seconds each step took.
+def warm_up(workers=None):
+    from sample_certificates import load_font
+
+    steps = {
+        "model": get_model,
+        "registry": get_registry,
+        "stores": lambda: (get_result_cache(), get_audit_log(), get_submission_history(), get_template_index()),
+        "mimetypes": mimetypes.init,
+        "fonts": lambda: (load_font(30), load_font(40)),
+    }
+    timings = {}
+    for name, step in steps.items():
+        start = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - start
+    if workers and workers > 1:
+        start = time.perf_counter()
+        pool = get_worker_pool(workers)
+        for future in [pool.submit(warm_up) for _ in range(workers)]:
+            future.result()
+        timings["workers"] = time.perf_counter() - start
+    return timings
+
+
+# Function to verify many certificates, yielding reports as they complete.
+# Paths are read inside the worker processes; buffers are loaded here so they can be pickled.
+# Pass a long-lived executor (see get_worker_pool) to reuse warm workers across batches.
+def verify_batch(paths_or_buffers, checks=None, workers=None, max_pending=None, use_cache=True, executor=None,
+                 triage=None):
+    checks = resolve_checks(checks)
+    # Resolved here so workers apply the caller's cutoffs, not their own environment's
+    triage = resolve_triage(triage)
+    triage = False if triage is None else triage
+    workers = workers or os.cpu_count() or 1
+
+    def prepared():
+        for index, source in enumerate(paths_or_buffers):
+            if not isinstance(source, (str, os.PathLike, CertificateFile)):
+                source = load_certificate(source)
+            yield index, source
+
+    if workers == 1 and executor is None:
+        for index, source in prepared():
+            yield _verify_indexed(index, source, checks, use_cache, triage)
+        return
+
+    if executor is not None:
+        yield from _verify_on(executor, prepared(), checks, use_cache, max_pending or workers * 4, triage)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from _verify_on(executor, prepared(), checks, use_cache, max_pending or workers * 4, triage)
+
+
+# Keep a bounded number of tasks in flight so huge backlogs stream instead of queueing up front.
+# A worker that dies (killed, out of memory) breaks its pool: the certificates in flight get error reports,
+# and a shared pool is replaced so the rest of the batch, and later batches, run on fresh workers.
+def _verify_on(executor, prepared, checks, use_cache, max_pending, triage=None):
+    pending = {}
+
+    def collect(futures):
+        nonlocal executor
+        for future in futures:
+            index, source, pool = pending.pop(future)
+            try:
+                yield future.result()
+            except BrokenProcessPool as exc:
+                if pool is executor:
+                    executor = _replace_broken_pool(executor, exc)
+                yield _batch_error(index, source, exc)
+
+    for index, source in prepared:
+        try:
+            future = executor.submit(_verify_indexed, index, source, checks, use_cache, triage)
+        except BrokenProcessPool as exc:
+            executor = _replace_broken_pool(executor, exc)
+            future = executor.submit(_verify_indexed, index, source, checks, use_cache, triage)
+        pending[future] = (index, source, executor)
+        if len(pending) >= max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+    yield from collect(as_completed(list(pending)))
+
+
+# Function to list the certificate members of a ZIP archive without reading their contents
+def list_zip_members(archive, max_member_bytes=MAX_ARCHIVE_MEMBER_BYTES):
+    members = []
+    for info in archive.infolist():
+        name = os.path.basename(info.filename)
+        if info.is_dir() or not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        if name.lower().endswith(SUPPORTED_EXTENSIONS) and info.file_size <= max_member_bytes:
+            members.append(info)
+    return members
+
+
+# Function to yield the certificates inside a ZIP archive, read member by member without extracting to disk
+def iter_zip_certificates(archive_file, max_member_bytes=MAX_ARCHIVE_MEMBER_BYTES):
+    with zipfile.ZipFile(archive_file) as archive:
+        for info in list_zip_members(archive, max_member_bytes):
+            yield CertificateFile(archive.read(info), name=info.filename)
+
+
+# Function to expand CLI arguments (files, directories or "-" for stdin) into certificate paths
+def iter_certificate_paths(arguments):
+    for argument in arguments:
+        if argument == '-':
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    yield line
+        elif os.path.isdir(argument):
+            for root, _, files in os.walk(argument):
+                for file_name in sorted(files):
+                    if file_name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        yield os.path.join(root, file_name)
+        else:
+            yield argument
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Verify certificates without the Streamlit UI and stream results as JSON lines."
+    )
+    parser.add_argument("paths", nargs="+", help="Certificate files, directories, or '-' to read paths from stdin")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    for name in DEFAULT_CHECKS:
+        parser.add_argument(f"--no-{name.replace('_', '-')}", dest=name, action="store_false",
+                            help=f"Disable the {name.replace('_', ' ')} check")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false",
+                        help="Always re-analyze instead of reusing cached results")
+    parser.add_argument("--triage", default=None,
+                        help="Triage cutoffs, e.g. 'coarse=0.05:0.97', or 'off' for the full analysis of every file "
+                             "(default: CERTIFICATE_TRIAGE)")
+    args = parser.parse_args(argv)
+
+    checks = {name: getattr(args, name) for name in DEFAULT_CHECKS}
+    for report in verify_batch(iter_certificate_paths(args.paths), checks=checks, workers=args.workers,
+                               use_cache=args.use_cache, triage=args.triage):
+        sys.stdout.write(json.dumps(report) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+import argparse
+import functools
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import tarfile
+import time
+import zipfile
+from collections import defaultdict
+
+import numpy as np
+
+from PIL import Image
+
+from image_features import CHECK_FEATURES, FEATURE_NAMES, extract_image_features, feature_vector
+from image_pyramid import ImagePyramid
+from pdf_pages import PdfDocument
+
+# Artifact format version; load_model refuses artifacts written by another format
+MODEL_FORMAT_VERSION = 3
+
+DEFAULT_MODEL_PATH = os.environ.get(
+    "CERTIFICATE_MODEL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "certificate_model.npz"),
+)
+
+DEFAULT_L2 = 1e-3
+DEFAULT_HOLDOUT = 0.2
+# Share of the samples kept out of head training to fit the calibrators on
+DEFAULT_CALIBRATION = 0.2
+# Forgeries the registry and QR checks settle; their pixels look like a genuine certificate's
+NON_VISUAL_FORGERIES = ("pasted_serial", "tampered_qr")
+# Upload formats every corpus sample is trained and calibrated in: the PNG as rendered, a JPEG re-encode,
+# and the page image extracted from a PDF. The engine does not score other formats with the model.
+TRAINING_FORMATS = ("png", "jpeg", "pdf")
+# Format scored when the caller names none: the corpus renders PNG
+DEFAULT_FORMAT = "png"
+# JPEG quality of the re-encoded samples, drawn per sample: typical of scanners and PDF exporters
+JPEG_QUALITY_RANGE = (70, 95)
+
+# Checks the model scores from pixels, and the columns of the feature vector each one reads
+VISUAL_CHECKS = tuple(sorted(CHECK_FEATURES))
+CHECK_COLUMNS = {check: [FEATURE_NAMES.index(name) for name in CHECK_FEATURES[check]] for check in VISUAL_CHECKS}
+# Reliability bins used for the expected calibration error
+CALIBRATION_BINS = 10
+# Calibrated probabilities are kept this far from 0 and 1: a few hundred held-out samples cannot justify certainty
+PROBABILITY_MARGIN = 0.01
+
+
+# Logistic regression over standardized inputs: P(genuine) = sigmoid(((x - mean) / scale) . w + b)
+class LogisticModel:
+    def __init__(self, weights, bias, mean, scale):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    def decision_function(self, inputs):
+        inputs = np.atleast_2d(np.asarray(inputs, dtype=np.float64))
+        return ((inputs - self.mean) / self.scale) @ self.weights + self.bias
+
+    def predict_proba(self, inputs):
+        return _sigmoid(self.decision_function(inputs))
+
+    def arrays(self, prefix):
+        return {f"{prefix}.weights": self.weights, f"{prefix}.bias": np.float64(self.bias),
+                f"{prefix}.mean": self.mean, f"{prefix}.scale": self.scale}
+
+    @classmethod
+    def from_arrays(cls, artifact, prefix):
+        return cls(*(artifact[f"{prefix}.{name}"] for name in ("weights", "bias", "mean", "scale")))
+
+
+# Monotone map from a stacked logit to a calibrated P(genuine): isotonic regression, evaluated by
+# linear interpolation between the fitted steps
+class IsotonicCalibrator:
+    def __init__(self, stacker, thresholds, values):
+        self.stacker = stacker
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)
+
+    def predict_proba(self, logits):
+        return np.interp(self.stacker.decision_function(logits), self.thresholds, self.values)
+
+    def arrays(self, prefix):
+        return {**self.stacker.arrays(prefix), f"{prefix}.thresholds": self.thresholds, f"{prefix}.values": self.values}
+
+    @classmethod
+    def from_arrays(cls, artifact, prefix):
+        return cls(LogisticModel.from_arrays(artifact, prefix), artifact[f"{prefix}.thresholds"],
+                   artifact[f"{prefix}.values"])
+
+
+# Function to name a set of visual checks, e.g. "integrity_check+security_features"
+def subset_key(checks):
+    return "+".join(sorted(checks))
+
+
+# Function to list every non-empty set of visual checks the sidebar can leave enabled
+def check_subsets():
+    return [subset for size in range(1, len(VISUAL_CHECKS) + 1)
+            for subset in itertools.combinations(VISUAL_CHECKS, size)]
+
+
+# Per-check heads plus one calibrator per set of enabled visual checks, for each upload format.
+# Each head is a logistic regression over its check's own features. A calibrator stacks the logits of
+# the enabled heads (Platt scaling) and maps the result through an isotonic fit, both on samples the
+# heads never saw, so the aggregate stays calibrated whichever checks are switched off.
+# JPEG compression shifts the integrity features, so every format gets heads and calibrators of its own.
+class CertificateModel:
+    def __init__(self, heads, calibrators, threshold=0.5, metadata=None):
+        self.heads = {file_format: dict(format_heads) for file_format, format_heads in heads.items()}
+        self.calibrators = {file_format: dict(format_calibrators)
+                            for file_format, format_calibrators in calibrators.items()}
+        self.threshold = float(threshold)
+        self.metadata = dict(metadata or {})
+        self.fingerprint = ""
+
+    # Function to list the upload formats ("png", "jpeg", "pdf") the model was trained and calibrated on
+    def formats(self):
+        return tuple(sorted(self.heads))
+
+    # Function to get the raw head logits for vectors of shape (n, len(FEATURE_NAMES)), one column per check
+    def check_logits(self, vectors, checks=VISUAL_CHECKS, file_format=DEFAULT_FORMAT):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float64))
+        heads = self._lookup(self.heads, file_format)
+        return np.column_stack([heads[check].decision_function(vectors[:, CHECK_COLUMNS[check]])
+                                for check in checks])
+
+    # Batched scoring of the enabled visual checks from one set of logits.
+    # Returns ({check: calibrated P(genuine) of that check alone}, calibrated P(genuine) of them combined).
+    def score(self, vectors, checks=None, file_format=DEFAULT_FORMAT):
+        heads = self._lookup(self.heads, file_format)
+        checks = sorted(VISUAL_CHECKS if checks is None else (c for c in checks if c in heads))
+        if not checks:
+            raise ValueError("No visual check enabled to score")
+        logits = self.check_logits(vectors, checks, file_format)
+        calibrators = self.calibrators[file_format]
+        per_check = {check: calibrators[check].predict_proba(logits[:, [column]])
+                     for column, check in enumerate(checks)}
+        return per_check, calibrators[subset_key(checks)].predict_proba(logits)
+
+    def predict_proba(self, vectors, checks=None, file_format=DEFAULT_FORMAT):
+        return self.score(vectors, checks, file_format)[1]
+
+    def predict(self, vectors, checks=None, file_format=DEFAULT_FORMAT):
+        return self.predict_proba(vectors, checks, file_format) >= self.threshold
+
+    @staticmethod
+    def _lookup(by_format, file_format):
+        if file_format not in by_format:
+            raise ValueError(f"Model was not trained on {file_format} uploads (trained on {', '.join(sorted(by_format))})")
+        return by_format[file_format]
+
+    def save(self, path):
+        arrays = {}
+        for file_format, heads in self.heads.items():
+            for check, head in heads.items():
+                arrays.update(head.arrays(f"head.{file_format}.{check}"))
+                arrays[f"head.{file_format}.{check}.features"] = np.array(CHECK_FEATURES[check])
+        for file_format, calibrators in self.calibrators.items():
+            for key, calibrator in calibrators.items():
+                arrays.update(calibrator.arrays(f"calibrator.{file_format}.{key}"))
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                format_version=np.int64(MODEL_FORMAT_VERSION),
+                feature_names=np.array(FEATURE_NAMES),
+                formats=np.array(self.formats()),
+                checks=np.array(VISUAL_CHECKS),
+                subsets=np.array([subset_key(subset) for subset in check_subsets()]),
+                threshold=np.float64(self.threshold),
+                metadata=np.array(json.dumps(self.metadata)),
+                **arrays,
+            )
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -50, 50)))
+
+
+# Function to fit an L2-regularised logistic regression with Newton's method (IRLS).
+# With a dozen features each step is one small linear solve, so training converges in a few passes.
+def fit_logistic(inputs, labels, l2=DEFAULT_L2, iterations=50, tolerance=1e-8):
+    inputs = np.asarray(inputs, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.float64)
+    mean = inputs.mean(axis=0)
+    scale = inputs.std(axis=0)
+    # Constant features (e.g. a corpus rendered at one size) are left centred but unscaled
+    scale[scale < 1e-9] = 1.0
+    design = np.hstack([(inputs - mean) / scale, np.ones((len(inputs), 1))])
+    penalty = np.full(design.shape[1], l2 * len(inputs))
+    penalty[-1] = 0.0
+
+    theta = np.zeros(design.shape[1])
+    for _ in range(iterations):
+        p = _sigmoid(design @ theta)
+        gradient = design.T @ (p - labels) + penalty * theta
+        hessian = (design * (p * (1 - p))[:, None]).T @ design + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        theta -= step
+        if np.abs(step).max() < tolerance:
+            break
+    return LogisticModel(theta[:-1], theta[-1], mean, scale)
+
+
+# Function to train the per-check heads on one split and fit their calibrators on another
+# Vectors have shape (samples, formats, features): every sample in each of the formats, whose heads and
+# calibrators are fitted on that format's column alone.
+def train_model(vectors, labels, calibration_vectors, calibration_labels, l2=DEFAULT_L2, formats=(DEFAULT_FORMAT,)):
+    vectors = np.asarray(vectors, dtype=np.float64)
+    heads = {file_format: {check: fit_logistic(vectors[:, column, CHECK_COLUMNS[check]], labels, l2=l2)
+                           for check in VISUAL_CHECKS}
+             for column, file_format in enumerate(formats)}
+    model = CertificateModel(heads, {file_format: {} for file_format in formats})
+    for column, file_format in enumerate(formats):
+        logits = model.check_logits(calibration_vectors[:, column], file_format=file_format)
+        for subset in check_subsets():
+            columns = [VISUAL_CHECKS.index(check) for check in subset]
+            model.calibrators[file_format][subset_key(subset)] = fit_calibrator(logits[:, columns], calibration_labels)
+    return model
+
+
+# Function to fit the pool-adjacent-violators isotonic regression of labels on scores.
+# Returns the (score, probability) steps of the non-decreasing fit.
+def fit_isotonic(scores, labels):
+    order = np.argsort(scores, kind="mergesort")
+    scores = np.asarray(scores, dtype=np.float64)[order]
+    labels = np.asarray(labels, dtype=np.float64)[order]
+    # Each block keeps its label sum, weight and mean score; adjacent blocks merge while they decrease
+    sums, weights, positions = [], [], []
+    for score, label in zip(scores, labels):
+        sums.append(label)
+        weights.append(1.0)
+        positions.append(score)
+        while len(sums) > 1 and sums[-2] / weights[-2] >= sums[-1] / weights[-1]:
+            total, weight = sums.pop(), weights.pop()
+            position = positions.pop()
+            positions[-1] = (positions[-1] * weights[-1] + position * weight) / (weights[-1] + weight)
+            sums[-1] += total
+            weights[-1] += weight
+    values = np.clip(np.array(sums) / np.array(weights), PROBABILITY_MARGIN, 1 - PROBABILITY_MARGIN)
+    return np.array(positions), values
+
+
+# Function to fit a calibrator on held-out head logits: Platt stacking, then an isotonic map of the stacked logit
+def fit_calibrator(logits, labels):
+    stacker = fit_logistic(logits, labels, l2=1e-6)
+    thresholds, values = fit_isotonic(stacker.decision_function(logits), labels)
+    return IsotonicCalibrator(stacker, thresholds, values)
+
+
+# Function to score probabilities against labels: accuracy, log loss, ROC AUC and expected calibration error
+def evaluate(probabilities, labels, threshold=0.5):
+    probabilities = np.clip(np.asarray(probabilities, dtype=np.float64), 1e-12, 1 - 1e-12)
+    labels = np.asarray(labels, dtype=np.float64)
+    accuracy = float(((probabilities >= threshold) == (labels == 1)).mean())
+    log_loss = float(-np.mean(labels * np.log(probabilities) + (1 - labels) * np.log(1 - probabilities)))
+    ranks = np.empty(len(probabilities))
+    ranks[np.argsort(probabilities, kind="mergesort")] = np.arange(1, len(probabilities) + 1)
+    positives = labels.sum()
+    negatives = len(labels) - positives
+    auc = float((ranks[labels == 1].sum() - positives * (positives + 1) / 2) / max(positives * negatives, 1))
+    # Gap between predicted and observed genuine rate, weighted over equal-width probability bins
+    bins = np.minimum((probabilities * CALIBRATION_BINS).astype(int), CALIBRATION_BINS - 1)
+    counts = np.bincount(bins, minlength=CALIBRATION_BINS)
+    gaps = np.abs(np.bincount(bins, probabilities - labels, minlength=CALIBRATION_BINS))
+    ece = float(gaps.sum() / max(counts.sum(), 1))
+    return {"accuracy": accuracy, "log_loss": log_loss, "auc": auc, "ece": ece}
+
+
+def load_model(path=None):
+    path = path or DEFAULT_MODEL_PATH
+    with np.load(path, allow_pickle=False) as artifact:
+        version = int(artifact["format_version"])
+        if version != MODEL_FORMAT_VERSION:
+            raise ValueError(f"{path}: model format {version}, expected {MODEL_FORMAT_VERSION}")
+        feature_names = tuple(str(name) for name in artifact["feature_names"])
+        if feature_names != FEATURE_NAMES:
+            raise ValueError(f"{path}: model was trained on different features: {feature_names}")
+        heads, calibrators = {}, {}
+        for file_format in (str(name) for name in artifact["formats"]):
+            heads[file_format] = {}
+            for check in (str(name) for name in artifact["checks"]):
+                prefix = f"head.{file_format}.{check}"
+                head_features = tuple(str(name) for name in artifact[f"{prefix}.features"])
+                if head_features != CHECK_FEATURES.get(check):
+                    raise ValueError(f"{path}: {check} head was trained on different features: {head_features}")
+                heads[file_format][check] = LogisticModel.from_arrays(artifact, prefix)
+            calibrators[file_format] = {
+                str(key): IsotonicCalibrator.from_arrays(artifact, f"calibrator.{file_format}.{key}")
+                for key in artifact["subsets"]
+            }
+        model = CertificateModel(heads, calibrators, float(artifact["threshold"]),
+                                 json.loads(str(artifact["metadata"])))
+    with open(path, "rb") as f:
+        model.fingerprint = hashlib.sha256(f.read()).hexdigest()[:12]
+    return model
+
+
+# Function to return this process's model, loaded from disk on first use; None when no artifact exists
+@functools.lru_cache(maxsize=None)
+def get_model(path=None):
+    path = path or DEFAULT_MODEL_PATH
+    if not os.path.exists(path):
+        return None
+    return load_model(path)
+
+
+# Function to re-encode a rendered sample the way it arrives in another upload format and return the
+# pyramid the engine would analyze: a JPEG, or the JPEG page image of a PDF (Pillow embeds pages as DCT)
+def format_pyramid(image, file_format, seed):
+    quality = random.Random(seed).randint(*JPEG_QUALITY_RANGE)
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG" if file_format == "jpeg" else "PDF", quality=quality)
+    if file_format == "jpeg":
+        return ImagePyramid(buffer.getvalue())
+    if file_format == "pdf":
+        for _, pyramid in PdfDocument(buffer.getvalue()).iter_page_images(1):
+            return pyramid
+    raise ValueError(f"Unsupported training format: {file_format!r}")
+
+
+# Worker task: feature vectors for every sample of one corpus shard in each format, in manifest order.
+# Returns an array of shape (samples, formats, features).
+def shard_features(path, members, formats=(DEFAULT_FORMAT,)):
+    vectors = np.empty((len(members), len(formats), len(FEATURE_NAMES)), dtype=np.float32)
+    if path.endswith(".npy"):
+        pixels = np.load(path, mmap_mode="r")
+        pyramids = (ImagePyramid.from_array(pixels[member]) for member in members)
+    else:
+        if path.endswith(".zip"):
+            with zipfile.ZipFile(path) as archive:
+                payloads = [archive.read(member) for member in members]
+        else:
+            with tarfile.open(path) as archive:
+                payloads = [archive.extractfile(member).read() for member in members]
+        pyramids = (ImagePyramid(data) for data in payloads)
+    for row, (member, rendered) in enumerate(zip(members, pyramids)):
+        image = None
+        for column, file_format in enumerate(formats):
+            pyramid = rendered
+            if file_format != "png":
+                if image is None:
+                    image = Image.fromarray(np.asarray(rendered.level(1)))
+                pyramid = format_pyramid(image, file_format, f"{os.path.basename(path)}:{member}:{file_format}")
+            vectors[row, column] = feature_vector(extract_image_features(pyramid))
+    return vectors
+
+
+def _shard_features_task(task):
+    return shard_features(*task)
+
+
+# Function to read a corpus written by corpus_generator.py into feature vectors of shape
+# (samples, formats, features) and genuine/forged labels, leaving out samples whose forgery type is in
+# skip_forgeries
+def load_corpus_features(corpus_dir, workers=None, skip_forgeries=(), formats=(DEFAULT_FORMAT,)):
+    # Imported here so inference does not pull in the process pool machinery
+    from certificate_engine import get_worker_pool
+
+    shards = defaultdict(list)
+    with open(os.path.join(corpus_dir, "manifest.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["forgery"] not in skip_forgeries:
+                shards[entry["shard"]].append(entry)
+    tasks = [(os.path.join(corpus_dir, shard), [entry["member"] for entry in entries], tuple(formats))
+             for shard, entries in sorted(shards.items())]
+    vectors = np.vstack(list(get_worker_pool(workers).map(_shard_features_task, tasks)))
+    labels = np.array([entry["label"] == "genuine" for _, entries in sorted(shards.items()) for entry in entries])
+    return vectors, labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the certificate classifier on a synthetic corpus.")
+    parser.add_argument("corpus_dir", help="Output directory of corpus_generator.py")
+    parser.add_argument("--out", default=DEFAULT_MODEL_PATH, help="Model artifact (default: certificate_model.npz)")
+    parser.add_argument("--holdout", type=float, default=DEFAULT_HOLDOUT, help="Share of samples kept for evaluation")
+    parser.add_argument("--calibration", type=float, default=DEFAULT_CALIBRATION,
+                        help="Share of samples kept out of head training to fit the calibrators")
+    parser.add_argument("--l2", type=float, default=DEFAULT_L2, help="L2 regularisation strength")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--formats", default=",".join(TRAINING_FORMATS),
+                        help=f"Upload formats to train and calibrate on (default: {','.join(TRAINING_FORMATS)})")
+    parser.add_argument("--skip-forgery", action="append", default=None,
+                        help=f"Forgery type left out of training (default: {', '.join(NON_VISUAL_FORGERIES)})")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    skip_forgeries = tuple(args.skip_forgery) if args.skip_forgery is not None else NON_VISUAL_FORGERIES
+    formats = tuple(name.strip().lower() for name in args.formats.split(",") if name.strip())
+    unknown = sorted(set(formats) - set(TRAINING_FORMATS))
+    if unknown or not formats:
+        parser.error(f"--formats takes a subset of {','.join(TRAINING_FORMATS)}")
+    vectors, labels = load_corpus_features(args.corpus_dir, args.workers, skip_forgeries, formats)
+    sys.stderr.write(f"Extracted features of {len(labels):,} samples in {len(formats)} format(s) "
+                     f"in {time.perf_counter() - start:.1f} s\n")
+
+    # Split by sample, so every format of a held-out certificate stays held out
+    order = np.random.default_rng(args.seed).permutation(len(labels))
+    held_out = order[:int(len(order) * args.holdout)]
+    calibration = order[len(held_out):len(held_out) + int(len(order) * args.calibration)]
+    train = order[len(held_out) + len(calibration):]
+
+    model = train_model(vectors[train], labels[train], vectors[calibration], labels[calibration], l2=args.l2,
+                        formats=formats)
+
+    # Each held-out certificate once per format, scored by that format's heads
+    def held_out_probabilities(subset=None):
+        return np.concatenate([model.predict_proba(vectors[held_out, column], subset, file_format)
+                               for column, file_format in enumerate(formats)])
+
+    held_out_labels = np.tile(labels[held_out], len(formats))
+    scores = {subset_key(subset): evaluate(held_out_probabilities(subset), held_out_labels, model.threshold)
+              for subset in check_subsets()}
+    overall = scores[subset_key(VISUAL_CHECKS)]
+    by_format = {file_format: evaluate(model.predict_proba(vectors[held_out, column], file_format=file_format),
+                                       labels[held_out], model.threshold)
+                 for column, file_format in enumerate(formats)}
+    start = time.perf_counter()
+    model.score(vectors[:, 0], file_format=formats[0])
+    per_sample_us = (time.perf_counter() - start) / len(vectors) * 1e6
+    model.metadata = {
+        "corpus": os.path.basename(os.path.normpath(args.corpus_dir)),
+        "train_samples": int(len(train)),
+        "calibration_samples": int(len(calibration)),
+        "holdout_samples": int(len(held_out)),
+        "l2": args.l2,
+        "skipped_forgeries": list(skip_forgeries),
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **{f"holdout_{name}": round(value, 4) for name, value in overall.items()},
+        "holdout_by_checks": {key: {name: round(value, 4) for name, value in subset_scores.items()}
+                              for key, subset_scores in scores.items()},
+        "holdout_by_format": {key: {name: round(value, 4) for name, value in format_scores.items()}
+                              for key, format_scores in by_format.items()},
+    }
+    model.save(args.out)
+    for key, subset_scores in scores.items():
+        print(f"{key}: holdout accuracy {subset_scores['accuracy']:.3f}, AUC {subset_scores['auc']:.3f}, "
+              f"log loss {subset_scores['log_loss']:.3f}, ECE {subset_scores['ece']:.3f}")
+    for key, format_scores in by_format.items():
+        print(f"{key} uploads: holdout accuracy {format_scores['accuracy']:.3f}, AUC {format_scores['auc']:.3f}, "
+              f"ECE {format_scores['ece']:.3f}")
+    print(f"Saved {args.out}; batched inference {per_sample_us:.2f} us/certificate")
+
+if __name__ == "__main__":
+    main()
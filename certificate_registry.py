@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from urllib.request import pathname2url
+
+# Registry of issued certificates shipped with the app
+DEFAULT_REGISTRY_PATH = os.environ.get(
+    "CERTIFICATE_REGISTRY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "certificates.db"),
+)
+
+RECORD_FIELDS = ("id", "name", "course", "date", "signature")
+ISSUER_FIELDS = ("key_id", "name", "public_key")
+# Counter of every write to the certificates and issuers tables, kept by triggers (see registry_import)
+GENERATION_TABLE = "registry_generation"
+
+# Cached lookups: recent hits are remembered; misses always go to the database, so a serial registered
+# after a failed lookup is found at once
+LOOKUP_CACHE_SIZE = 65536
+ISSUER_CACHE_SIZE = 1024
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+# One read-only registry connection per process, shared by every thread (Streamlit sessions, batch workers):
+# verifying never writes the registry file, only registry_import does. The connection keeps the cache of
+# found records, dropped whenever another connection commits to the registry.
+class RegistryConnection:
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True, check_same_thread=False)
+        self.connection.execute("PRAGMA temp_store=MEMORY")
+        self.connection.execute("PRAGMA mmap_size=268435456")
+        self.data_version = None
+        self.generation = 0
+        self.caches = {"certificates": OrderedDict(), "issuers": OrderedDict()}
+
+    def fetchone(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchone()
+
+    # Function to catch up with commits of other connections: data_version changes when one commits, which
+    # invalidates every cached record and may have moved the registry generation. Call with the lock held.
+    def _refresh(self):
+        version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.data_version:
+            return
+        self.clear()
+        self.data_version = version
+        row = self._fetch(f"SELECT generation FROM {GENERATION_TABLE}", ())
+        self.generation = row[0] if row is not None else 0
+
+    # Function to run a query; a table the registry does not have yet (e.g. no issuer registered) has no rows
+    def _fetch(self, sql, parameters):
+        try:
+            return self.connection.execute(sql, parameters).fetchone()
+        except sqlite3.OperationalError as exc:
+            if not str(exc).startswith("no such table"):
+                raise
+            return None
+
+    # Function to return the registry generation: it changes with every write to the records or issuers
+    def current_generation(self):
+        with self.lock:
+            self._refresh()
+            return self.generation
+
+    # Function to look up a record by key: cached if found before, otherwise fetched and, when found, cached
+    def lookup(self, table, key, sql, fields, max_size):
+        with self.lock:
+            self._refresh()
+            cache = self.caches[table]
+            record = cache.get(key)
+            if record is not None:
+                cache.move_to_end(key)
+                return record
+            row = self._fetch(sql, (key,))
+            if row is None:
+                return None
+            cache[key] = record = dict(zip(fields, row))
+            if len(cache) > max_size:
+                cache.popitem(last=False)
+            return record
+
+    def clear(self):
+        for cache in self.caches.values():
+            cache.clear()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+# Function to return this process's registry connection, reopening it after a fork
+def get_registry(path=None):
+    path = os.path.abspath(path or DEFAULT_REGISTRY_PATH)
+    with _connections_lock:
+        registry = _connections.get(path)
+        if registry is None or registry.pid != os.getpid():
+            registry = RegistryConnection(path)
+            _connections[path] = registry
+        return registry
+
+
+# Function to normalise a serial as printed on certificates ("Serial: 12345") to the registry id
+def normalize_serial(serial):
+    serial = str(serial).strip()
+    if ':' in serial:
+        serial = serial.split(':', 1)[1].strip()
+    return serial
+
+
+# Function to fetch the registry record for a serial, or None when it was never issued
+def lookup_certificate(serial, path=None):
+    return get_registry(path).lookup(
+        "certificates", normalize_serial(serial),
+        "SELECT id, name, course, date, signature FROM certificates WHERE id = ?", RECORD_FIELDS, LOOKUP_CACHE_SIZE,
+    )
+
+
+# Function to fetch an issuer by the hex key id printed in QR payloads, or None when unknown
+def lookup_issuer(key_id, path=None):
+    return get_registry(path).lookup(
+        "issuers", key_id, "SELECT key_id, name, public_key FROM issuers WHERE key_id = ?", ISSUER_FIELDS,
+        ISSUER_CACHE_SIZE,
+    )
+
+
+# Function to return the registry generation, which verdicts that read the registry are cached under
+def registry_generation(path=None):
+    return get_registry(path).current_generation()
+
+
+# Function to drop cached lookups, e.g. after new certificates were registered
+def clear_lookup_cache():
+    with _connections_lock:
+        registries = list(_connections.values())
+    for registry in registries:
+        with registry.lock:
+            registry.clear()
@@ -0,0 +1,87 @@
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+# Ed25519 (RFC 8032) from the cryptography package (OpenSSL): constant-time and audited. Parsed public keys
+# and signature verdicts are cached, so verifying the same certificate again skips the curve arithmetic.
+PUBLIC_KEY_BYTES = 32
+SIGNATURE_BYTES = 64
+
+# Cached public keys (parsed key objects) and signature verdicts
+PUBLIC_KEY_CACHE_SIZE = 1024
+SIGNATURE_CACHE_SIZE = 65536
+
+_verdicts = OrderedDict()
+_verdicts_lock = threading.Lock()
+
+
+# Function to derive the 32-byte public key of a 32-byte secret key
+def public_key(secret):
+    return Ed25519PrivateKey.from_private_bytes(secret).public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+
+
+# Function to sign a message with a 32-byte secret key; returns the 64-byte signature
+def sign(secret, message):
+    return Ed25519PrivateKey.from_private_bytes(secret).sign(message)
+
+
+# Function to parse an issuer's public key once; repeat verifications by the same issuer reuse it.
+# None for bytes that are not a valid key.
+@functools.lru_cache(maxsize=PUBLIC_KEY_CACHE_SIZE)
+def _public_key(public):
+    if len(public) != PUBLIC_KEY_BYTES:
+        return None
+    try:
+        return Ed25519PublicKey.from_public_bytes(public)
+    except ValueError:
+        return None
+
+
+# Function to check an Ed25519 signature
+def verify(public, message, signature):
+    key = _public_key(bytes(public))
+    if key is None or len(signature) != SIGNATURE_BYTES:
+        return False
+    try:
+        key.verify(bytes(signature), bytes(message))
+    except InvalidSignature:
+        return False
+    return True
+
+
+# Function to verify a signature through the verdict cache, keyed by (key, message, signature).
+# Returns (valid, whether the verdict was served from the cache).
+def verify_cached(public, message, signature):
+    key = (bytes(public), bytes(message), bytes(signature))
+    with _verdicts_lock:
+        valid = _verdicts.get(key)
+        if valid is not None:
+            _verdicts.move_to_end(key)
+            return valid, True
+    valid = verify(*key)
+    with _verdicts_lock:
+        _verdicts[key] = valid
+        if len(_verdicts) > SIGNATURE_CACHE_SIZE:
+            _verdicts.popitem(last=False)
+    return valid, False
+
+
+# Function to name an issuer key: the first 4 bytes of its SHA-256, as printed in the QR payload
+def key_id(public):
+    return hashlib.sha256(public).digest()[:4]
+
+
+# Function to build the bytes an issuer signs for a registry record
+def record_message(record):
+    return "|".join(str(record[field] or "") for field in ("id", "name", "course", "date")).encode("utf-8")
+
+
+def clear_signature_caches():
+    with _verdicts_lock:
+        _verdicts.clear()
+    _public_key.cache_clear()
@@ -0,0 +1,323 @@
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import sys
+import tarfile
+import time
+import zipfile
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from PIL.PngImagePlugin import PngInfo
+
+from certificate_engine import get_worker_pool
+from certificate_registry import DEFAULT_REGISTRY_PATH
+from certificate_signatures import key_id, public_key, record_message, sign
+from qr_code import QR_MODULE_PX, QR_MODULES, QrPayload, encode_modules
+from registry_import import import_rows, register_issuer
+
+FORGERY_TYPES = ("missing_watermark", "pasted_serial", "recompressed_region", "tampered_qr")
+SHARD_FORMATS = ("tar", "zip", "npy")
+DEFAULT_SHARD_SIZE = 1000
+DEFAULT_SERIAL_START = 10000000
+# Every sample shares one canvas size so NumPy shards stack into a single (n, height, width, 3) array
+CANVAS_SIZE = (600, 400)
+FONT_DIRS = ("/usr/share/fonts", "/usr/local/share/fonts", "/Library/Fonts", "C:\\Windows\\Fonts")
+
+FIRST_NAMES = ("Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Meera", "Arjun", "Isha", "Kabir", "Sneha")
+LAST_NAMES = ("Sharma", "Patel", "Iyer", "Reddy", "Gupta", "Nair", "Singh", "Joshi", "Das", "Menon")
+COURSES = ("Data Science", "Machine Learning", "Web Development", "Cloud Computing", "Cyber Security",
+           "Digital Marketing", "Embedded Systems", "Project Management")
+BORDER_COLORS = ("gold", "navy", "darkgreen", "maroon", "black")
+ISSUER_NAME = "Synthetic corpus issuer"
+# Ed25519 secret key size: every corpus is signed by a fresh random issuer key
+ISSUER_KEY_BYTES = 32
+# Issuer public key and key id of a corpus, written next to its manifest (the secret key is never stored)
+ISSUER_FILE = "issuer.json"
+
+
+# Function to list TrueType fonts installed on this machine; None stands for Pillow's built-in font
+@lru_cache(maxsize=1)
+def available_fonts():
+    paths = set()
+    for directory in FONT_DIRS:
+        paths.update(glob.glob(os.path.join(directory, "**", "*.tt[fc]"), recursive=True))
+    return (None,) + tuple(sorted(paths))
+
+
+# Fonts are loaded once per (file, size) in each worker process
+@lru_cache(maxsize=None)
+def load_font(path, size):
+    if path is None:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(path, size)
+
+
+# Function to draw a new corpus issuer key. It is random rather than derived from the seed: anyone could
+# recompute a derived key and sign QR payloads that verify against a registry trusting it.
+def new_issuer_key():
+    return os.urandom(ISSUER_KEY_BYTES)
+
+
+# Public keys are derived once per issuer key in each worker process
+@lru_cache(maxsize=16)
+def issuer_public_key(issuer_key):
+    return public_key(issuer_key)
+
+
+# Function to sign a registry record as the corpus issuer and build the module grid of its QR code
+def qr_modules(record, issuer_key):
+    signature = sign(issuer_key, record_message(record))
+    payload = QrPayload(record["id"], key_id(issuer_public_key(issuer_key)), signature)
+    return encode_modules(payload), signature.hex()
+
+
+def _draw_qr(draw, origin, grid):
+    x0, y0 = origin
+    quiet = 2 * QR_MODULE_PX
+    draw.rectangle([x0 - quiet, y0 - quiet, x0 + QR_MODULES * QR_MODULE_PX + quiet - 1,
+                    y0 + QR_MODULES * QR_MODULE_PX + quiet - 1], fill='white')
+    for row, col in zip(*np.nonzero(grid)):
+        x, y = x0 + col * QR_MODULE_PX, y0 + row * QR_MODULE_PX
+        draw.rectangle([x, y, x + QR_MODULE_PX - 1, y + QR_MODULE_PX - 1], fill='black')
+
+
+# Function to render one labeled sample. Everything is drawn from a per-index RNG, so a sample can be
+# regenerated from (seed, index) and the issuer key alone and workers never need to coordinate.
+def render_sample(index, seed=0, forged_fraction=0.5, serial_start=DEFAULT_SERIAL_START, issuer_key=None):
+    issuer_key = issuer_key or new_issuer_key()
+    rng = random.Random(f"{seed}:{index}")
+    serial = str(serial_start + index)
+    forgery = rng.choice(FORGERY_TYPES) if rng.random() < forged_fraction else None
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    course = rng.choice(COURSES)
+    issued = (date(2015, 1, 1) + timedelta(days=rng.randrange(3650))).isoformat()
+
+    font_path = rng.choice(available_fonts())
+    font_size = rng.randint(18, 28)
+    font = load_font(font_path, font_size)
+    small = load_font(font_path, max(12, font_size - 8))
+
+    width, height = CANVAS_SIZE
+    # Off-white paper: brightness varies, the tint only slightly
+    brightness = rng.randint(238, 252)
+    paper = tuple(brightness + rng.randint(-3, 3) for _ in range(3))
+    img = Image.new('RGB', CANVAS_SIZE, color=paper)
+    d = ImageDraw.Draw(img)
+
+    # Layout: border, jittered text block, serial and QR code in swappable bottom corners
+    margin = rng.randint(8, 20)
+    d.rectangle([margin, margin, width - margin, height - margin], outline=rng.choice(BORDER_COLORS),
+                width=rng.randint(2, 6))
+    dx, dy = rng.randint(-20, 20), rng.randint(-10, 10)
+    d.text((110 + dx, 45 + dy), "CERTIFICATE OF COMPLETION", fill='black', font=font)
+    d.text((120 + dx, 110 + dy), "This is to certify that", fill='black', font=small)
+    d.text((150 + dx, 145 + dy), name.upper(), fill='navy', font=font)
+    d.text((120 + dx, 190 + dy), "has successfully completed", fill='black', font=small)
+    d.text((150 + dx, 220 + dy), course, fill='black', font=font)
+    d.text((120 + dx, 265 + dy), f"Issued on {issued}", fill='black', font=small)
+
+    qr_size = QR_MODULES * QR_MODULE_PX
+    if rng.random() < 0.5:
+        serial_xy, qr_xy = (40, height - 60), (width - qr_size - 40, height - qr_size - 35)
+    else:
+        serial_xy, qr_xy = (width - 230, height - 60), (40, height - qr_size - 35)
+    serial_text = f"Serial: {serial}"
+    d.text(serial_xy, serial_text, fill='black', font=small)
+    record = {"id": serial, "name": name, "course": course, "date": issued}
+    grid, signature = qr_modules(record, issuer_key)
+    _draw_qr(d, qr_xy, grid)
+
+    watermark_alpha = rng.randint(25, 70)
+    if forgery != "missing_watermark":
+        watermark = Image.new('RGBA', img.size, (0, 0, 0, 0))
+        dw = ImageDraw.Draw(watermark)
+        w_font = load_font(font_path, font_size + 12)
+        dw.text((rng.randint(60, 140), rng.randint(130, 170)), "SECURE", fill=(0, 0, 255, watermark_alpha),
+                font=w_font)
+        dw.text((rng.randint(280, 360), rng.randint(230, 270)), "OFFICIAL", fill=(0, 0, 255, watermark_alpha),
+                font=w_font)
+        img = Image.alpha_composite(img.convert('RGBA'), watermark).convert('RGB')
+        d = ImageDraw.Draw(img)
+
+    if forgery == "pasted_serial":
+        # Serial patched over with another number (one digit changed) in a slightly different font and paper
+        # tone. The QR code still carries the issued serial, and the file metadata says the pasted one.
+        left, top, right, bottom = d.textbbox(serial_xy, serial_text, font=small)
+        d.rectangle([left - 3, top - 3, right + 3, bottom + 3], fill=tuple(max(0, c - rng.randint(3, 12)) for c in paper))
+        patch_font = load_font(rng.choice(available_fonts()), max(12, font_size - 8 + rng.choice((-2, -1, 1, 2))))
+        position = rng.randrange(len(serial))
+        digit = rng.choice([c for c in "0123456789" if c != serial[position] and (position or c != "0")])
+        serial = serial[:position] + digit + serial[position + 1:]
+        d.text((serial_xy[0] + rng.randint(-3, 3), serial_xy[1] + rng.randint(-3, 3)), f"Serial: {serial}",
+               fill='black', font=patch_font)
+    elif forgery == "recompressed_region":
+        box_w, box_h = rng.randint(120, 260), rng.randint(60, 160)
+        left, top = rng.randint(0, width - box_w), rng.randint(0, height - box_h)
+        region = img.crop((left, top, left + box_w, top + box_h))
+        buffer = io.BytesIO()
+        region.save(buffer, format='JPEG', quality=rng.randint(10, 40))
+        buffer.seek(0)
+        img.paste(Image.open(buffer), (left, top))
+    elif forgery == "tampered_qr":
+        row, col = rng.randint(8, QR_MODULES - 5), rng.randint(8, QR_MODULES - 5)
+        grid[row:row + 4, col:col + 4] = ~grid[row:row + 4, col:col + 4]
+        _draw_qr(d, qr_xy, grid)
+
+    info = {
+        # The serial the document shows; a pasted one differs from the issued serial in the record
+        "serial": serial,
+        "label": "forged" if forgery else "genuine",
+        "forgery": forgery,
+        # Every sample starts from an issued certificate, so its record is registered
+        "record": (record["id"], name, course, issued, signature),
+        "font": os.path.basename(font_path) if font_path else "default",
+        "font_size": font_size,
+        "watermark_alpha": None if forgery == "missing_watermark" else watermark_alpha,
+    }
+    return img, info
+
+
+def _png_bytes(img, serial):
+    metadata = PngInfo()
+    metadata.add_text("Serial", serial)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', pnginfo=metadata, compress_level=1)
+    return buffer.getvalue()
+
+
+# Worker task: render samples [start, stop) into one shard file and return their manifest entries.
+# The shard is written under a temporary name and renamed when complete.
+def write_shard(path, shard_format, start, stop, seed, forged_fraction, serial_start, issuer_key):
+    temporary = path + ".part"
+    entries = []
+    if shard_format == "npy":
+        width, height = CANVAS_SIZE
+        pixels = np.lib.format.open_memmap(temporary, mode='w+', dtype=np.uint8, shape=(stop - start, height, width, 3))
+        for row, index in enumerate(range(start, stop)):
+            img, info = render_sample(index, seed, forged_fraction, serial_start, issuer_key)
+            pixels[row] = np.asarray(img)
+            entries.append(dict(info, member=row))
+        pixels.flush()
+        del pixels
+    elif shard_format == "tar":
+        with tarfile.open(temporary, "w") as archive:
+            for index in range(start, stop):
+                img, info = render_sample(index, seed, forged_fraction, serial_start, issuer_key)
+                data = _png_bytes(img, info["serial"])
+                member = tarfile.TarInfo(f"{index:09d}.png")
+                member.size = len(data)
+                member.mtime = int(time.time())
+                archive.addfile(member, io.BytesIO(data))
+                entries.append(dict(info, member=member.name))
+    elif shard_format == "zip":
+        # PNG is already compressed, so members are stored as-is
+        with zipfile.ZipFile(temporary, "w", compression=zipfile.ZIP_STORED) as archive:
+            for index in range(start, stop):
+                img, info = render_sample(index, seed, forged_fraction, serial_start, issuer_key)
+                member = f"{index:09d}.png"
+                archive.writestr(member, _png_bytes(img, info["serial"]))
+                entries.append(dict(info, member=member))
+    else:
+        raise ValueError(f"Unsupported shard format: {shard_format!r}")
+    os.replace(temporary, path)
+    return os.path.basename(path), entries
+
+
+def _write_shard_task(task):
+    return write_shard(*task)
+
+
+# Function to tell whether a path is the registry the app verifies against (shipped or configured)
+def _is_trusted_registry(path):
+    shipped = os.path.join(os.path.dirname(os.path.abspath(__file__)), "certificates.db")
+    return any(os.path.abspath(path) == os.path.abspath(trusted) or
+               (os.path.exists(path) and os.path.exists(trusted) and os.path.samefile(path, trusted))
+               for trusted in (shipped, DEFAULT_REGISTRY_PATH))
+
+
+# Function to generate a corpus of `count` samples in shards on a process pool, signed by a fresh random issuer key.
+# The manifest (one JSON line per sample) is written as shards complete, and the issuer's public key to issuer.json.
+# With registry_path, the issuer and every sample's record are registered in that scratch registry in the same
+# pass; the registry the app verifies against is refused, so synthetic certificates never verify in production.
+def generate_corpus(out_dir, count, shard_format="tar", shard_size=DEFAULT_SHARD_SIZE, workers=None, seed=0,
+                    forged_fraction=0.5, serial_start=DEFAULT_SERIAL_START, registry_path=None, on_progress=None):
+    if registry_path is not None and _is_trusted_registry(registry_path):
+        raise ValueError(f"Refusing to register a synthetic corpus in the app's registry ({registry_path}); "
+                         "pass a scratch database")
+    os.makedirs(out_dir, exist_ok=True)
+    issuer_key = new_issuer_key()
+    with open(os.path.join(out_dir, ISSUER_FILE), "w", encoding="utf-8") as f:
+        json.dump({"name": ISSUER_NAME, "public_key": issuer_public_key(issuer_key).hex(),
+                   "key_id": key_id(issuer_public_key(issuer_key)).hex()}, f)
+    extension = "npy" if shard_format == "npy" else shard_format
+    tasks = [
+        (os.path.join(out_dir, f"shard-{start // shard_size:05d}.{extension}"), shard_format, start,
+         min(start + shard_size, count), seed, forged_fraction, serial_start, issuer_key)
+        for start in range(0, count, shard_size)
+    ]
+    pool = get_worker_pool(workers)
+    start_time = time.perf_counter()
+    labels = {"genuine": 0, "forged": 0}
+
+    with open(os.path.join(out_dir, "manifest.jsonl"), "w", encoding="utf-8") as manifest:
+        def registry_rows():
+            done = 0
+            for shard, entries in pool.map(_write_shard_task, tasks):
+                for entry in entries:
+                    record = entry.pop("record")
+                    manifest.write(json.dumps(dict(entry, shard=shard)) + "\n")
+                    labels[entry["label"]] += 1
+                    yield record
+                done += len(entries)
+                if on_progress is not None:
+                    on_progress(done, time.perf_counter() - start_time)
+
+        if registry_path is not None:
+            register_issuer(issuer_public_key(issuer_key), ISSUER_NAME, registry_path)
+            import_rows(registry_rows(), registry_path)
+        else:
+            for _ in registry_rows():
+                pass
+
+    return labels, time.perf_counter() - start_time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a labeled synthetic certificate corpus.")
+    parser.add_argument("out_dir", help="Directory for the shards and manifest.jsonl")
+    parser.add_argument("--count", type=int, default=10000, help="Number of samples")
+    parser.add_argument("--format", choices=SHARD_FORMATS, default="tar",
+                        help="Shard format: PNG members in tar/zip, or raw uint8 arrays in .npy (memory-mappable)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Samples per shard")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--forged-fraction", type=float, default=0.5)
+    parser.add_argument("--serial-start", type=int, default=DEFAULT_SERIAL_START, help="Serial of sample 0")
+    parser.add_argument("--db", default=None,
+                        help="Scratch registry to register the corpus issuer and serials in (default: none). "
+                             "The app's registry is refused.")
+    args = parser.parse_args(argv)
+    if args.db is not None and _is_trusted_registry(args.db):
+        parser.error(f"--db {args.db} is the app's registry; register synthetic corpora in a scratch database")
+
+    def report_progress(samples, seconds):
+        sys.stderr.write(f"\r{samples:,}/{args.count:,} samples ({samples / max(seconds, 1e-9):,.0f} samples/s)")
+        sys.stderr.flush()
+
+    labels, seconds = generate_corpus(
+        args.out_dir, args.count, args.format, args.shard_size, args.workers, args.seed, args.forged_fraction,
+        args.serial_start, args.db, on_progress=report_progress,
+    )
+    sys.stderr.write("\n")
+    print(f"Generated {labels['genuine']:,} genuine and {labels['forged']:,} forged samples in {seconds:.1f} s "
+          f"({args.count / max(seconds, 1e-9):,.0f} samples/s)")
+
+
+if __name__ == "__main__":
+    main()
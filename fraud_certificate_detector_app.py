@@ -1,15 +1,24 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import io
-import time
-import matplotlib.pyplot as plt
 import random
+import threading
+import uuid
 import zipfile
-import base64
+import os
 from datetime import datetime
 
+from audit_log import get_audit_log
+
+# certificate_engine and sample_certificates (numpy, PIL) are imported by the code paths that verify or
+# render a certificate, and pandas by those that build a table or chart, not on every session start
+def make_dataframe(*args, **kwargs):
+    import pandas as pd
+    return pd.DataFrame(*args, **kwargs)
+
+# Check statuses: passed, low score only (weighs in the verdict), nothing to check against; anything else failed
+STATUS_ICONS = {"Passed": "✅", "Authentic": "✅", "Detected": "✅", "Intact": "✅", "Suspicious": "⚠️",
+                "Unverifiable": "❔", "Not found": "❔", "Unsigned": "❔"}
+
 # Page configuration
 st.set_page_config(
     page_title="Auto Certificate Verifier",
@@ -99,7 +108,7 @@ st.markdown('<h1 class="main-header">🔍 Auto Certificate Verifier</h1>', unsaf
 st.markdown("""
 This tool *automatically detects* whether your certificate is genuine or fraudulent using advanced machine learning algorithms that analyze:
 - *ID verification* through pattern recognition
-- *QR code validation* for digital signatures
+- *QR code validation* for digital signatures on certificates issued with this tool
 - *Security feature detection* including watermarks and holograms
 - *Document integrity checks* for signs of tampering
 """)
@@ -114,6 +123,16 @@ with st.sidebar:
     qr_verification = st.checkbox("QR Code Analysis", value=True)
     security_features = st.checkbox("Security Features Check", value=True)
     integrity_check = st.checkbox("Document Integrity Check", value=True)
+    checks = {
+        "id_verification": id_verification,
+        "qr_verification": qr_verification,
+        "security_features": security_features,
+        "integrity_check": integrity_check,
+    }
+    
+    st.subheader("Debug")
+    debug_mode = st.checkbox("Profile each verification", value=False,
+                             help="Skip the result cache and capture a cProfile and tracemalloc report per upload")
     
     st.markdown("---")
     st.info("""
@@ -123,137 +142,32 @@ with st.sidebar:
     3. Review the detailed verification results
     """)
 
-# Function to generate a sample certificate (for demo purposes)
-def generate_sample_certificate(is_real=True):
-    img = Image.new('RGB', (600, 400), color='white')
-    d = ImageDraw.Draw(img)
-    
-    # Add border
-    d.rectangle([10, 10, 590, 390], outline='gold', width=3)
-    
-    # Add title
-    try:
-        font = ImageFont.truetype("arial.ttf", 30)
-    except:
-        font = ImageFont.load_default()
-    
-    d.text((150, 50), "CERTIFICATE OF AUTHENTICITY", fill='black', font=font)
-    
-    # Add content
-    d.text((150, 120), "This is to certify that", fill='black', font=font)
-    d.text((200, 160), "SAMPLE DOCUMENT", fill='blue', font=font)
-    d.text((150, 200), "has been verified as", fill='black', font=font)
-    
-    if is_real:
-        status = "GENUINE"
-        color = "green"
-    else:
-        status = "FRAUDULENT"
-        color = "red"
-    
-    d.text((230, 240), status, fill=color, font=font)
-    
-    # Add serial number
-    serial = f"Serial: {random.randint(10000, 99999)}"
-    d.text((350, 300), serial, fill='black', font=font)
-    
-    # Add a fake QR code area
-    d.rectangle([450, 300, 550, 350], outline='black', fill='lightgray')
-    d.text((460, 320), "QR CODE", fill='black', font=font)
-    
-    # Add security features for genuine certificates
-    if is_real:
-        # Add a simple watermark
-        watermark = Image.new('RGBA', img.size, (0, 0, 0, 0))
-        dw = ImageDraw.Draw(watermark)
-        try:
-            w_font = ImageFont.truetype("arial.ttf", 40)
-        except:
-            w_font = ImageFont.load_default()
-        dw.text((100, 150), "SECURE", fill=(0, 0, 255, 45), font=w_font)
-        dw.text((300, 250), "OFFICIAL", fill=(0, 0, 255, 45), font=w_font)
-        img = Image.alpha_composite(img.convert('RGBA'), watermark).convert('RGB')
-    
-    return img, serial
+# Optional warm-up (CERTIFICATE_WARM_UP=1): once per server process, load the model, registry, stores, fonts
+# and bulk workers in the background so the first upload does not pay for them
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    from certificate_engine import warm_up
+    thread = threading.Thread(target=warm_up, args=(os.cpu_count() or 1,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
 
-# Function to simulate ML analysis with direct decision (no UI confidence threshold)
-def analyze_certificate(uploaded_file, id_check, qr_check, security_check, integrity_check):
-    # For demo purposes, we'll simulate analysis based on file characteristics
-    if hasattr(uploaded_file, 'is_real_sample'):
-        is_real = uploaded_file.is_real_sample
-    else:
-        file_size = getattr(uploaded_file, 'size', 0)
-        file_name = getattr(uploaded_file, 'name', '').lower()
-        
-        # Larger files are more likely to be real (higher quality)
-        size_factor = min(1.0, file_size / 500000)  # Normalize file size factor
-        
-        # Files with certain names might be more suspicious
-        suspicious_keywords = ['copy', 'scan', 'screenshot', 'image', 'photo', 'edited']
-        name_factor = 0.6 if any(x in file_name for x in suspicious_keywords) else 0.9
-        
-        # File type factor
-        type_factor = 0.9 if getattr(uploaded_file, 'type', '') in ['image/png', 'application/pdf', 'image/jpeg'] else 0.7
-        
-        # Random factor for simulation
-        random_factor = random.uniform(0.7, 0.99)
-        
-        # Combined probability (no external threshold; decide with a fixed internal cutoff)
-        authenticity_score = (size_factor * 0.3 + name_factor * 0.3 + type_factor * 0.2 + random_factor * 0.2)
-        
-        # Direct detection: decide real/fake using a fixed internal cutoff (0.55)
-        is_real = authenticity_score >= 0.55
-    
-    # Generate detailed analysis results
-    analysis_details = {
-        "ID Verification": {
-            "status": "Passed" if is_real else "Failed",
-            "details": "Pattern matches official template" if is_real else "Inconsistent formatting detected",
-            "confidence": random.uniform(0.85, 0.99) if is_real else random.uniform(0.4, 0.6)
-        },
-        "QR Code Validation": {
-            "status": "Authentic" if is_real else "Tampered",
-            "details": "Digital signature verified" if is_real else "Invalid or missing digital signature",
-            "confidence": random.uniform(0.8, 0.98) if is_real else random.uniform(0.3, 0.5)
-        },
-        "Security Features": {
-            "status": "Detected" if is_real else "Missing",
-            "details": "All security features present" if is_real else "Missing hologram pattern",
-            "confidence": random.uniform(0.85, 0.97) if is_real else random.uniform(0.35, 0.55)
-        },
-        "Document Integrity": {
-            "status": "Intact" if is_real else "Compromised",
-            "details": "No signs of tampering detected" if is_real else "Signs of digital alteration detected",
-            "confidence": random.uniform(0.9, 0.99) if is_real else random.uniform(0.4, 0.6)
-        }
-    }
-    
-    # Generate issues if fake
-    issues = []
-    if not is_real:
-        possible_issues = [
-            "Inconsistent font styles",
-            "QR code doesn't match database records",
-            "Missing hologram pattern",
-            "ID number format is invalid",
-            "Signature verification failed",
-            "Pixelation suggests digital alteration",
-            "Incorrect color profile for official documents",
-            "Metadata doesn't match expected patterns",
-            "Low image resolution for an official document",
-            "Inconsistent serial number formatting",
-            "Missing security watermark",
-            "Digital signature validation failed"
-        ]
-        issues = random.sample(possible_issues, k=random.randint(3, 5))
-    
-    # Calculate overall confidence score
-    confidence = sum([detail['confidence'] for detail in analysis_details.values()]) / 4
-    
-    return is_real, confidence, analysis_details, issues
+if os.environ.get("CERTIFICATE_WARM_UP", "").lower() in ("1", "true", "yes"):
+    start_warm_up()
+
+# Function to name this browser session for the audit log, so a file is recorded once per session
+def session_id():
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+# Sample certificates are rendered once per (kind, seed); reruns reuse the cached PNG bytes
+@st.cache_data(show_spinner=False)
+def cached_sample_certificate(is_real, seed):
+    from sample_certificates import sample_certificate_png
+    return sample_certificate_png(is_real, seed)
 
 # Main content area
-tab1, tab2, tab3 = st.tabs(["Upload Certificate", "Sample Certificates", "How It Works"])
+tab1, tab_bulk, tab2, tab3 = st.tabs(["Upload Certificate", "Bulk Verification", "Sample Certificates", "How It Works"])
 
 with tab1:
     col1, col2 = st.columns([2, 1])
@@ -270,6 +184,9 @@ with tab1:
         st.markdown('</div>', unsafe_allow_html=True)
         
         if uploaded_file is not None:
+            # The engine loads with the first upload
+            from certificate_engine import STAGE_LABELS, run_pipeline
+            
             # Display file details
             file_details = {
                 "Filename": uploaded_file.name,
@@ -281,55 +198,64 @@ with tab1:
             st.write("*File details:*")
             st.json(file_details)
             
-            # Display the uploaded content
+            # Display the uploaded content (the browser decodes the preview; the analysis decodes its own copy once)
             if uploaded_file.type.startswith('image'):
-                image = Image.open(uploaded_file)
-                st.image(image, caption="Uploaded Certificate", use_column_width=True)
+                st.image(uploaded_file.getvalue(), caption="Uploaded Certificate", use_column_width=True)
             elif uploaded_file.type == 'application/pdf':
-                st.warning("PDF preview is not available in this demo. The analysis would extract images from the PDF for verification.")
-            
-            # Automatic detection message
-            st.markdown('<div class="auto-detection">', unsafe_allow_html=True)
-            st.info("🔍 *Automatic detection in progress...*")
-            st.markdown('</div>', unsafe_allow_html=True)
-            
-            # Progress bar for automatic detection
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+                st.info("📄 PDF uploaded: page images are extracted and analyzed one page at a time.")
             
-            # Simulate automatic analysis process
-            for percent_complete in range(100):
-                time.sleep(0.01)
-                progress_bar.progress(percent_complete + 1)
-                if percent_complete < 25:
-                    status_text.text(f"Loading ML model... {percent_complete}%")
-                elif percent_complete < 50:
-                    status_text.text(f"Extracting features... {percent_complete}%")
-                elif percent_complete < 75:
-                    status_text.text(f"Analyzing security elements... {percent_complete}%")
-                else:
-                    status_text.text(f"Finalizing results... {percent_complete}%")
-            
-            # Clear progress elements
-            progress_bar.empty()
-            status_text.empty()
+            # The report is kept for the session: reruns (any widget interaction) show it again instead of
+            # verifying the same upload with the same options once more
+            upload_key = (getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size),
+                          tuple(sorted(checks.items())), debug_mode)
+            if st.session_state.get("upload_key") != upload_key:
+                # Automatic detection message
+                st.markdown('<div class="auto-detection">', unsafe_allow_html=True)
+                st.info("🔍 *Automatic detection in progress...*")
+                st.markdown('</div>', unsafe_allow_html=True)
+                
+                # Progress bar driven by the real pipeline stages
+                progress_bar = st.progress(0)
+                status_text = st.empty()
+                
+                def show_stage_progress(stage, completed, total, seconds):
+                    progress_bar.progress(completed / total)
+                    status_text.text(f"{STAGE_LABELS[stage]} done in {seconds * 1000:.1f} ms ({completed}/{total})")
+                
+                # Run analysis (direct detection); the audit log records each file once per session
+                st.session_state["upload_report"] = run_pipeline(uploaded_file, checks, on_stage=show_stage_progress,
+                                                                 debug=debug_mode, session=session_id())
+                st.session_state["upload_key"] = upload_key
+                
+                # Clear progress elements
+                progress_bar.empty()
+                status_text.empty()
             
-            # Run analysis (direct detection)
-            is_real, confidence, analysis_details, issues = analyze_certificate(
-                uploaded_file, id_verification, qr_verification, security_features, integrity_check
-            )
+            report = st.session_state["upload_report"]
+            is_real, confidence = report["is_real"], report["confidence"]
+            analysis_details, issues = report["analysis_details"], report["issues"]
             
             # Display results
-            if is_real:
+            if report["verdict"] == "unverifiable":
+                st.warning("⚠️ Certificate is *UNVERIFIABLE*")
+                for issue in issues:
+                    st.write(f"- {issue}")
+                for check, result in analysis_details.items():
+                    st.markdown(f"{check}: {STATUS_ICONS.get(result['status'], '❌')} {result['status']} - {result['details']}")
+            elif is_real:
                 st.markdown('<div class="result-real">', unsafe_allow_html=True)
                 st.success("✅ Certificate is *GENUINE*")
                 st.write(f"*Confidence level:* {confidence:.2%}")
                 st.write("*Verification details:*")
                 
                 for check, result in analysis_details.items():
-                    status_icon = "✅" if result['status'] in ['Passed', 'Authentic', 'Detected', 'Intact'] else "❌"
+                    status_icon = STATUS_ICONS.get(result['status'], "❌")
                     st.markdown(f"{check}: {status_icon} {result['status']} - {result['details']} (Confidence: {result['confidence']:.2%})")
                 
+                # Notes that do not affect the verdict, e.g. PDF pages that had nothing to analyze
+                for issue in issues:
+                    st.info(issue)
+                
                 st.markdown('</div>', unsafe_allow_html=True)
             else:
                 st.markdown('<div class="result-fake">', unsafe_allow_html=True)
@@ -338,7 +264,7 @@ with tab1:
                 st.write("*Verification details:*")
                 
                 for check, result in analysis_details.items():
-                    status_icon = "✅" if result['status'] in ['Passed', 'Authentic', 'Detected', 'Intact'] else "❌"
+                    status_icon = STATUS_ICONS.get(result['status'], "❌")
                     st.markdown(f"{check}: {status_icon} {result['status']} - {result['details']} (Confidence: {result['confidence']:.2%})")
                 
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -347,6 +273,73 @@ with tab1:
                 st.warning("*Potential issues detected:*")
                 for issue in issues:
                     st.write(f"- {issue}")
+            
+            if report["cached"]:
+                st.caption("⚡ Cached result: this file was already verified with the same checks")
+            if report.get("triage") and report["triage"]["skipped_checks"]:
+                st.caption(
+                    f"⏩ Settled by the {report['triage']['tier']} triage tier; skipped: "
+                    + ", ".join(name.replace('_', ' ') for name in report["triage"]["skipped_checks"])
+                )
+            
+            # Per-stage latency breakdown
+            with st.expander("⏱ Stage timings"):
+                timings = make_dataframe({
+                    'Stage': [STAGE_LABELS[stage] for stage in report["timings"]],
+                    'Time (ms)': [seconds * 1000 for seconds in report["timings"].values()]
+                })
+                st.table(timings.set_index('Stage'))
+                st.caption(f"Total: {sum(report['timings'].values()) * 1000:.1f} ms")
+                if report.get("image_stats"):
+                    stats = report["image_stats"]
+                    st.caption(
+                        f"Image decode: {stats['decode_ms']:.1f} ms, "
+                        f"peak pixel memory: {stats['peak_pixel_bytes'] / 2**20:.1f} MiB"
+                    )
+                    if stats.get("levels"):
+                        st.caption(f"Pyramid levels: 1/{', 1/'.join(str(factor) for factor in stats['levels'])}")
+                    if stats.get("spilled_levels"):
+                        st.caption(
+                            f"Analyzed in bands from disk: 1/{', 1/'.join(map(str, stats['spilled_levels']))} "
+                            f"({stats['spill_bytes'] / 2**20:.0f} MiB of spill files)"
+                        )
+                    if "page_count" in stats:
+                        st.caption(
+                            f"Pages analyzed: {stats['pages_analyzed']} of {stats['page_count']}"
+                            + (" (stopped early, verdict already settled)" if stats['stopped_early'] else "")
+                        )
+                    if stats.get("failed_pages"):
+                        st.caption(f"Skipped pages that could not be decoded: {', '.join(map(str, stats['failed_pages']))}")
+                    if stats.get("vector_pages"):
+                        st.caption(f"Skipped pages with no embedded image: {', '.join(map(str, stats['vector_pages']))}")
+                if report.get("qr_stats"):
+                    qr = report["qr_stats"]
+                    st.caption(
+                        f"QR code: read in {qr['read_ms']:.1f} ms, signature checked in {qr['signature_ms']:.2f} ms"
+                        + (" (verified before, served from cache)" if qr['signature_cached'] else "")
+                    )
+                if report.get("duplicates"):
+                    st.caption(f"Submission history searched in {report['duplicates']['search_ms']:.1f} ms")
+            
+            # Span tree and profiler output of a traced request
+            if report.get("trace"):
+                with st.expander("🐞 Trace and profile"):
+                    spans = report["trace"]["spans"]
+                    trace_table = make_dataframe({
+                        'Span': ["· " * span["depth"] + span["name"] for span in spans],
+                        'Time (ms)': [span["ms"] for span in spans]
+                    })
+                    st.table(trace_table.set_index('Span'))
+                    st.caption(f"Trace ID: {report['trace']['trace_id']}")
+                    root = spans[0]["attributes"]
+                    if "profile.cprofile" in root:
+                        st.code(root["profile.cprofile"])
+                    if "memory.peak_bytes" in root:
+                        st.caption(f"Peak traced memory: {root['memory.peak_bytes'] / 2**20:.1f} MiB")
+                    elif root.get("memory.peak_shared"):
+                        st.caption("Peak traced memory: not reported, another request was profiled at the same time")
+                    if "memory.top" in root:
+                        st.code(root["memory.top"])
     
     with col2:
         st.markdown('<div class="info-box">', unsafe_allow_html=True)
@@ -362,14 +355,23 @@ with tab1:
         st.markdown("---")
         
         st.subheader("📊 Statistics")
-        # Sample statistics
-        chart_data = pd.DataFrame({
-            'Month': ['Jan', 'Feb', 'Mar', 'Apr', 'May'],
-            'Real': [45, 52, 48, 58, 62],
-            'Fake': [12, 8, 15, 9, 11]
-        })
-        
-        st.bar_chart(chart_data.set_index('Month'))
+        # Verdicts per month from the audit log rollups (a handful of rows, however long the log)
+        monthly = get_audit_log().totals("month", 6)
+        if monthly:
+            chart_data = make_dataframe(monthly, columns=['Month', 'Genuine', 'Fraudulent', 'Unverifiable'])
+            st.bar_chart(chart_data.set_index('Month'))
+            today = get_audit_log().totals("day", 1)
+            if today and today[0][0] == datetime.now().strftime('%Y-%m-%d'):
+                _, genuine, fraudulent, unverifiable = today[0]
+                st.caption(f"Today: {genuine + fraudulent + unverifiable} verified, {fraudulent} flagged as fraudulent, "
+                           f"{unverifiable} unverifiable")
+            tiers = get_audit_log().tier_counts(30)
+            if tiers:
+                st.caption("Settled by triage tier (30 days): " + ", ".join(
+                    f"{tier} {count / sum(tiers.values()):.0%}" for tier, count in sorted(tiers.items())
+                ))
+        else:
+            st.caption("No verifications recorded yet")
         
         st.markdown("---")
         
@@ -377,7 +379,8 @@ with tab1:
         
         st.markdown('<div class="feature-card">', unsafe_allow_html=True)
         st.write("*QR Code Analysis*")
-        st.caption("Validates digital signatures and checks against database records")
+        st.caption("Validates the signed codes this tool prints on issued certificates against database records; "
+                   "standard QR codes are not read")
         st.markdown('</div>', unsafe_allow_html=True)
         
         st.markdown('<div class="feature-card">', unsafe_allow_html=True)
@@ -395,24 +398,132 @@ with tab1:
         st.caption("Identifies holograms, watermarks, and other security elements")
         st.markdown('</div>', unsafe_allow_html=True)
 
+with tab_bulk:
+    st.header("Bulk Verification")
+    st.write("Upload a ZIP archive or several certificates at once. Files are analyzed in parallel and results appear as they finish.")
+    
+    bulk_files = st.file_uploader(
+        "Choose certificates or ZIP archives",
+        type=['png', 'jpg', 'jpeg', 'pdf', 'zip'],
+        accept_multiple_files=True,
+        key="bulk_uploader",
+        help="ZIP members are read straight from the archive; nothing is extracted to disk."
+    )
+    
+    if bulk_files:
+        # Results are kept in the session so download clicks (which rerun the script) don't re-analyze
+        bulk_key = (tuple((f.name, f.size) for f in bulk_files), tuple(sorted(checks.items())))
+        if st.session_state.get("bulk_key") != bulk_key:
+            from certificate_engine import get_worker_pool, iter_zip_certificates, list_zip_members, verify_batch
+            
+            total = 0
+            for f in bulk_files:
+                if f.name.lower().endswith('.zip'):
+                    with zipfile.ZipFile(f) as archive:
+                        total += len(list_zip_members(archive))
+                else:
+                    total += 1
+            
+            def bulk_certificates():
+                for f in bulk_files:
+                    if f.name.lower().endswith('.zip'):
+                        yield from iter_zip_certificates(f)
+                    else:
+                        yield f
+            
+            workers = os.cpu_count() or 1
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+            table = st.empty()
+            rows = []
+            started = datetime.now()
+            last_refresh = started
+            
+            for report in verify_batch(
+                bulk_certificates(), checks=checks, workers=workers,
+                executor=get_worker_pool(workers) if workers > 1 else None
+            ):
+                row = {"#": report["index"] + 1, "File": report.get("name", "")}
+                if "error" in report:
+                    row.update({"Verdict": "Error", "Confidence": None, "Issues": report["error"]})
+                else:
+                    row.update({
+                        "Verdict": report["verdict"].capitalize(),
+                        "Confidence": round(report["confidence"], 4),
+                        "Issues": "; ".join(report["issues"]),
+                        "Cached": report["cached"],
+                        "Time (ms)": round(sum(report["timings"].values()) * 1000, 1),
+                    })
+                    for check, result in report["analysis_details"].items():
+                        row[check] = result["status"]
+                rows.append(row)
+                
+                progress_bar.progress(len(rows) / max(total, len(rows)))
+                status_text.text(f"Verified {len(rows)} of {total} files")
+                # Redraw the table at most a few times per second
+                now = datetime.now()
+                if (now - last_refresh).total_seconds() > 0.5:
+                    table.dataframe(make_dataframe(rows), use_container_width=True)
+                    last_refresh = now
+            
+            progress_bar.empty()
+            table.empty()
+            status_text.empty()
+            st.session_state["bulk_key"] = bulk_key
+            st.session_state["bulk_summary"] = f"Verified {len(rows)} files in {(datetime.now() - started).total_seconds():.1f} s using {workers} worker(s)"
+            st.session_state["bulk_results"] = make_dataframe(rows).sort_values("#") if rows else make_dataframe()
+        
+        results = st.session_state["bulk_results"]
+        st.caption(st.session_state["bulk_summary"])
+        if results.empty:
+            st.warning("No PNG, JPG or PDF certificates were found in the upload.")
+        else:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Genuine", int((results["Verdict"] == "Genuine").sum()))
+            col2.metric("Fraudulent", int((results["Verdict"] == "Fraudulent").sum()))
+            col3.metric("Unverifiable", int((results["Verdict"] == "Unverifiable").sum()))
+            col4.metric("Errors", int((results["Verdict"] == "Error").sum()))
+            st.dataframe(results.set_index("#"), use_container_width=True)
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    label="Download results (CSV)",
+                    data=results.to_csv(index=False).encode('utf-8'),
+                    file_name="verification_results.csv",
+                    mime="text/csv",
+                    key="download_bulk_csv"
+                )
+            with col2:
+                try:
+                    parquet_bytes = io.BytesIO()
+                    results.to_parquet(parquet_bytes, index=False)
+                    st.download_button(
+                        label="Download results (Parquet)",
+                        data=parquet_bytes.getvalue(),
+                        file_name="verification_results.parquet",
+                        mime="application/vnd.apache.parquet",
+                        key="download_bulk_parquet"
+                    )
+                except ImportError:
+                    st.caption("Install pyarrow to export Parquet.")
+
 with tab2:
     st.header("Sample Certificates")
     st.write("Generate sample certificates to test the automatic verification system:")
     
+    if 'sample_seed' not in st.session_state or st.button("Generate new samples", key="regenerate_samples"):
+        st.session_state.sample_seed = random.randrange(2**32)
+    
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Genuine Certificate")
-        genuine_img, serial = generate_sample_certificate(True)
-        st.image(genuine_img, use_column_width=True)
+        img_bytes, serial = cached_sample_certificate(True, st.session_state.sample_seed)
+        st.image(img_bytes, use_column_width=True)
         
         st.write(f"*Serial Number:* {serial}")
         
-        # Convert PIL image to bytes for download
-        img_bytes = io.BytesIO()
-        genuine_img.save(img_bytes, format='PNG')
-        img_bytes = img_bytes.getvalue()
-        
         st.download_button(
             label="Download Genuine Certificate",
             data=img_bytes,
@@ -430,9 +541,11 @@ with tab2:
                     self.is_real_sample = is_real_sample
             
             fake_file = FakeFile(True)
+            from certificate_engine import analyze_certificate
             
+            # Demo samples carry their label: kept out of the audit log and the Statistics chart
             is_real, confidence, analysis_details, issues = analyze_certificate(
-                fake_file, id_verification, qr_verification, security_features, integrity_check
+                fake_file, id_verification, qr_verification, security_features, integrity_check, persist=False
             )
             
             if is_real:
@@ -442,7 +555,7 @@ with tab2:
                 st.write("*Verification details:*")
                 
                 for check, result in analysis_details.items():
-                    status_icon = "✅" if result['status'] in ['Passed', 'Authentic', 'Detected', 'Intact'] else "❌"
+                    status_icon = STATUS_ICONS.get(result['status'], "❌")
                     st.markdown(f"{check}: {status_icon} {result['status']} - {result['details']} (Confidence: {result['confidence']:.2%})")
                 
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -453,23 +566,18 @@ with tab2:
                 st.write("*Verification details:*")
                 
                 for check, result in analysis_details.items():
-                    status_icon = "✅" if result['status'] in ['Passed', 'Authentic', 'Detected', 'Intact'] else "❌"
+                    status_icon = STATUS_ICONS.get(result['status'], "❌")
                     st.markdown(f"{check}: {status_icon} {result['status']} - {result['details']} (Confidence: {result['confidence']:.2%})")
                 
                 st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         st.subheader("Fake Certificate")
-        fake_img, serial = generate_sample_certificate(False)
-        st.image(fake_img, use_column_width=True)
+        img_bytes, serial = cached_sample_certificate(False, st.session_state.sample_seed + 1)
+        st.image(img_bytes, use_column_width=True)
         
         st.write(f"*Serial Number:* {serial}")
         
-        # Convert PIL image to bytes for download
-        img_bytes = io.BytesIO()
-        fake_img.save(img_bytes, format='PNG')
-        img_bytes = img_bytes.getvalue()
-        
         st.download_button(
             label="Download Fake Certificate",
             data=img_bytes,
@@ -487,9 +595,11 @@ with tab2:
                     self.is_real_sample = is_real_sample
             
             fake_file = FakeFile(False)
+            from certificate_engine import analyze_certificate
             
+            # Demo samples carry their label: kept out of the audit log and the Statistics chart
             is_real, confidence, analysis_details, issues = analyze_certificate(
-                fake_file, id_verification, qr_verification, security_features, integrity_check
+                fake_file, id_verification, qr_verification, security_features, integrity_check, persist=False
             )
             
             if is_real:
@@ -499,7 +609,7 @@ with tab2:
                 st.write("*Verification details:*")
                 
                 for check, result in analysis_details.items():
-                    status_icon = "✅" if result['status'] in ['Passed', 'Authentic', 'Detected', 'Intact'] else "❌"
+                    status_icon = STATUS_ICONS.get(result['status'], "❌")
                     st.markdown(f"{check}: {status_icon} {result['status']} - {result['details']} (Confidence: {result['confidence']:.2%})")
                 
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -510,7 +620,7 @@ with tab2:
                 st.write("*Verification details:*")
                 
                 for check, result in analysis_details.items():
-                    status_icon = "✅" if result['status'] in ['Passed', 'Authentic', 'Detected', 'Intact'] else "❌"
+                    status_icon = STATUS_ICONS.get(result['status'], "❌")
                     st.markdown(f"{check}: {status_icon} {result['status']} - {result['details']} (Confidence: {result['confidence']:.2%})")
                 
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -535,7 +645,7 @@ with tab3:
     with col1:
         st.markdown("### Detection Methods")
         st.markdown("""
-        - *QR Code Analysis*: Validates digital signatures and checks against database records
+        - *QR Code Analysis*: Validates the signed codes printed on certificates issued with this tool against database records (standard QR codes are not read)
         - *Pattern Recognition*: Examines document layout and formatting for consistency
         - *Metadata Examination*: Analyzes file metadata for signs of tampering
         - *Security Feature Detection*: Identifies watermarks, holograms, and other security elements
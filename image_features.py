@@ -0,0 +1,303 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# Order of the values in the feature vector handed to the decision step
+FEATURE_NAMES = (
+    "width",
+    "height",
+    "ela_mean",
+    "ela_p99",
+    "ela_block_cv",
+    "noise_std",
+    "noise_block_cv",
+    "blockiness",
+    "saturation_mean",
+    "colorfulness",
+    "luma_entropy",
+    "blue_tint_fraction",
+    "edge_density",
+)
+
+ELA_QUALITY = 90
+BLOCK = 32
+EDGE_THRESHOLD = 40
+
+# Pyramid level (downscale factor) each group of signals is computed on.
+# Tampering traces live at native resolution; layout and colour survive downscaling.
+INTEGRITY_FACTOR = 1
+LAYOUT_FACTOR = 2
+COLOR_FACTOR = 4
+
+# Features each visual check scores, and the pyramid levels they are computed on.
+# width and height come from the image header and are always present.
+CHECK_FEATURES = {
+    "security_features": ("saturation_mean", "colorfulness", "luma_entropy", "blue_tint_fraction"),
+    "integrity_check": ("width", "height", "ela_mean", "ela_p99", "ela_block_cv", "noise_std", "noise_block_cv",
+                        "blockiness", "edge_density"),
+}
+CHECK_FACTORS = {
+    "security_features": (COLOR_FACTOR,),
+    "integrity_check": (INTEGRITY_FACTOR, LAYOUT_FACTOR),
+}
+
+# Clear-cut integrity failures: scans this small or this blocky are not accepted as official documents
+MIN_RESOLUTION = 200
+MAX_BLOCKINESS = 2.0
+
+
+# Function to split a 2-D array into BLOCK x BLOCK tiles, dropping the ragged edge
+def _blocks(values):
+    h, w = values.shape
+    h, w = h - h % BLOCK, w - w % BLOCK
+    return values[:h, :w].reshape(h // BLOCK, BLOCK, w // BLOCK, BLOCK)
+
+
+def _coefficient_of_variation(values):
+    if values.size == 0:
+        return 0.0
+    mean = float(values.mean())
+    return float(values.std()) / mean if mean > 1e-6 else 0.0
+
+
+# Function to get the 256-bin histogram of a uint8 plane (Pillow's C histogram beats np.bincount)
+def _histogram_u8(values):
+    return np.array(Image.fromarray(np.ascontiguousarray(values)).histogram(), dtype=np.int64)
+
+
+# Function to read the q-th percentile of a uint8 array from its histogram (no sort needed)
+def _percentile_u8(values, q):
+    return _histogram_percentile(_histogram_u8(values), q)
+
+
+def _histogram_percentile(histogram, q):
+    return float(np.searchsorted(np.cumsum(histogram), histogram.sum() * q / 100.0))
+
+
+def _histogram_entropy(histogram):
+    histogram = histogram.astype(np.float64) / histogram.sum()
+    nonzero = histogram[histogram > 0]
+    return abs(float((nonzero * np.log2(nonzero)).sum()))
+
+
+# Function to get the per-block sums of values and squared values of a 2-D integer array
+def _block_sums(values):
+    blocks = _blocks(values)
+    totals = blocks.sum(axis=3, dtype=np.int32).sum(axis=1, dtype=np.int64)
+    squares = np.square(blocks, dtype=np.int32).sum(axis=3).sum(axis=1, dtype=np.int64)
+    return totals, squares
+
+
+def _mean_std(totals, squares, count):
+    mean = totals / count
+    return mean, np.sqrt(np.maximum(squares / count - mean * mean, 0.0))
+
+
+# Error-level analysis: recompress the luminance as JPEG and measure how much each region changes.
+# Pasted or re-saved regions recompress differently from the rest of the page.
+def error_level(gray):
+    difference = _error_level_difference(gray)
+    block_means = _block_sums(difference)[0] / (BLOCK * BLOCK)
+    return float(difference.mean()), _percentile_u8(difference, 99), _coefficient_of_variation(block_means)
+
+
+def _error_level_difference(gray):
+    buffer = io.BytesIO()
+    Image.fromarray(gray).save(buffer, format='JPEG', quality=ELA_QUALITY)
+    buffer.seek(0)
+    with Image.open(buffer) as recompressed:
+        return _absdiff(gray, np.asarray(recompressed))
+
+
+# Function to compute |a - b| for uint8 arrays without widening
+def _absdiff(a, b):
+    return np.maximum(a, b) - np.minimum(a, b)
+
+
+# Noise residual against a 3x3 box blur, and how evenly the noise is spread over the page.
+# The residual is kept in integers as 9 * pixel - (3x3 neighbourhood sum).
+def noise_statistics(gray):
+    return _noise_from_sums(*_block_sums(_noise_residual(gray)))
+
+
+def _noise_residual(gray):
+    wide = gray.astype(np.int16)
+    rows = wide[:, :-2] + wide[:, 1:-1] + wide[:, 2:]
+    neighbourhood = rows[:-2] + rows[1:-1] + rows[2:]
+    return wide[1:-1, 1:-1] * 9 - neighbourhood
+
+
+def _noise_from_sums(totals, squares):
+    _, block_std = _mean_std(totals, squares, BLOCK * BLOCK)
+    if totals.size == 0:
+        return 0.0, 0.0
+    _, residual_std = _mean_std(totals.sum(), squares.sum(), totals.size * BLOCK * BLOCK)
+    return float(residual_std) / 9.0, _coefficient_of_variation(block_std)
+
+
+# Ratio of luminance jumps on the 8x8 JPEG grid to jumps elsewhere (1.0 means no block artefacts)
+def blockiness(gray):
+    if gray.shape[1] < 16:
+        return 1.0
+    return _grid_ratio(_absdiff(gray[:, 1:], gray[:, :-1]).mean(axis=0, dtype=np.float32))
+
+
+def _grid_ratio(column_steps):
+    on_grid = column_steps[7::8].mean()
+    off_grid = np.delete(column_steps, np.s_[7::8]).mean()
+    return float(on_grid / off_grid) if off_grid > 1e-6 else 1.0
+
+
+# Colour profile: saturation, Hasler-Suesstrunk colourfulness, luminance histogram entropy,
+# and the share of pale blue pixels left by the issuer's watermark
+def color_statistics(rgb, gray):
+    saturation, rg, yb, blue_tint = _color_planes(rgb)
+    colorfulness = np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean())
+    entropy = _histogram_entropy(_histogram_u8(gray))
+    return float(saturation.mean()), float(colorfulness), entropy, float(blue_tint.mean())
+
+
+def _color_planes(rgb):
+    channels = rgb.astype(np.float32)
+    r, g, b = channels[..., 0], channels[..., 1], channels[..., 2]
+    high = np.maximum(np.maximum(r, g), b)
+    low = np.minimum(np.minimum(r, g), b)
+    saturation = (high - low) / np.maximum(high, 1.0)
+    blue_tint = (b - np.maximum(r, g) > 8) & (low > 150)
+    return saturation, r - g, 0.5 * (r + g) - b, blue_tint
+
+
+# Share of pixels on a strong luminance edge
+def edge_density(gray):
+    if min(gray.shape) < 2:
+        return 0.0
+    gx = _absdiff(gray[:-1, 1:], gray[:-1, :-1]).astype(np.int16)
+    gy = _absdiff(gray[1:, :-1], gray[:-1, :-1])
+    return float(((gx + gy) > EDGE_THRESHOLD).mean())
+
+
+# Function to compute error level, noise and blockiness of a spilled level band by band. Bands start on BLOCK
+# rows, so the 8x8 JPEG grid and the BLOCK grid are the same as over the whole level; the noise residual of a
+# band reads two rows of the next one. Histograms, block sums and column sums are reduced across bands.
+def _banded_integrity(pyramid, factor):
+    gray = pyramid.gray(factor)
+    height, width = gray.shape
+    histogram = np.zeros(256, dtype=np.int64)
+    column_steps = np.zeros(max(width - 1, 0), dtype=np.int64)
+    ela_blocks, noise_totals, noise_squares = [], [], []
+    for top, bottom in pyramid.bands(factor):
+        difference = _error_level_difference(gray[top:bottom])
+        histogram += _histogram_u8(difference)
+        ela_blocks.append(_block_sums(difference)[0])
+        if min(bottom + 2, height) - top > 2 and width > 2:
+            totals, squares = _block_sums(_noise_residual(gray[top:bottom + 2]))
+            noise_totals.append(totals)
+            noise_squares.append(squares)
+        column_steps += _absdiff(gray[top:bottom, 1:], gray[top:bottom, :-1]).sum(axis=0, dtype=np.int64)
+
+    pixels = height * width
+    ela_mean = float(np.dot(histogram, np.arange(256))) / pixels if pixels else 0.0
+    block_means = np.concatenate(ela_blocks) / (BLOCK * BLOCK)
+    if noise_totals:
+        noise = _noise_from_sums(np.concatenate(noise_totals), np.concatenate(noise_squares))
+    else:
+        noise = (0.0, 0.0)
+    grid = _grid_ratio(column_steps / height) if width >= 16 else 1.0
+    return (ela_mean, _histogram_percentile(histogram, 99), _coefficient_of_variation(block_means), *noise, grid)
+
+
+# Function to count strong edges of a spilled level band by band (each band reads one row of the next)
+def _banded_edge_density(pyramid, factor):
+    gray = pyramid.gray(factor)
+    height, width = gray.shape
+    if min(height, width) < 2:
+        return 0.0
+    edges = 0
+    for top, bottom in pyramid.bands(factor):
+        band = gray[top:bottom + 1]
+        gx = _absdiff(band[:-1, 1:], band[:-1, :-1]).astype(np.int16)
+        gy = _absdiff(band[1:, :-1], band[:-1, :-1])
+        edges += int(np.count_nonzero((gx + gy) > EDGE_THRESHOLD))
+    return edges / ((height - 1) * (width - 1))
+
+
+# Function to compute the colour profile of a spilled level band by band from running sums in float64
+def _banded_color(pyramid, factor):
+    rgb, gray = pyramid.level(factor), pyramid.gray(factor)
+    histogram = np.zeros(256, dtype=np.int64)
+    sums = np.zeros(6)
+    tinted = 0
+    for top, bottom in pyramid.bands(factor):
+        saturation, rg, yb, blue_tint = _color_planes(rgb[top:bottom])
+        sums += [saturation.sum(dtype=np.float64), rg.sum(dtype=np.float64), yb.sum(dtype=np.float64),
+                 np.square(rg, dtype=np.float64).sum(), np.square(yb, dtype=np.float64).sum(), 0.0]
+        tinted += int(np.count_nonzero(blue_tint))
+        histogram += _histogram_u8(gray[top:bottom])
+    pixels = gray.size
+    saturation, rg_mean, yb_mean = sums[:3] / pixels
+    rg_std = np.sqrt(max(sums[3] / pixels - rg_mean * rg_mean, 0.0))
+    yb_std = np.sqrt(max(sums[4] / pixels - yb_mean * yb_mean, 0.0))
+    colorfulness = np.hypot(rg_std, yb_std) + 0.3 * np.hypot(rg_mean, yb_mean)
+    return float(saturation), float(colorfulness), _histogram_entropy(histogram), tinted / pixels
+
+
+# Function to list the pyramid levels the given checks read (all visual checks when checks is None)
+def required_factors(checks=None):
+    checks = CHECK_FACTORS if checks is None else checks
+    return tuple(sorted({factor for name in checks for factor in CHECK_FACTORS.get(name, ())}))
+
+
+# Function to compute the integrity and security signals from an ImagePyramid.
+# Only the groups of the given checks are computed, so disabled checks cost no pixel work.
+# Levels the pyramid spilled to disk are analyzed band by band, within the pixel memory cap.
+def extract_image_features(pyramid, checks=None):
+    checks = CHECK_FACTORS if checks is None else checks
+    features = {
+        "width": float(pyramid.size[0]),
+        "height": float(pyramid.size[1]),
+    }
+
+    if "integrity_check" in checks:
+        if pyramid.is_spilled(INTEGRITY_FACTOR):
+            (features["ela_mean"], features["ela_p99"], features["ela_block_cv"], features["noise_std"],
+             features["noise_block_cv"], features["blockiness"]) = _banded_integrity(pyramid, INTEGRITY_FACTOR)
+        else:
+            gray = pyramid.gray(INTEGRITY_FACTOR)
+            features["ela_mean"], features["ela_p99"], features["ela_block_cv"] = error_level(gray)
+            features["noise_std"], features["noise_block_cv"] = noise_statistics(gray)
+            features["blockiness"] = blockiness(gray)
+        if pyramid.is_spilled(LAYOUT_FACTOR):
+            features["edge_density"] = _banded_edge_density(pyramid, LAYOUT_FACTOR)
+        else:
+            features["edge_density"] = edge_density(pyramid.gray(LAYOUT_FACTOR))
+
+    if "security_features" in checks:
+        if pyramid.is_spilled(COLOR_FACTOR):
+            color = _banded_color(pyramid, COLOR_FACTOR)
+        else:
+            color = color_statistics(pyramid.level(COLOR_FACTOR), pyramid.gray(COLOR_FACTOR))
+        (features["saturation_mean"], features["colorfulness"], features["luma_entropy"],
+         features["blue_tint_fraction"]) = color
+
+    return features
+
+
+# Function to pack the feature dict into the compact vector used by the decision step (NaN where not computed)
+def feature_vector(features):
+    return np.array([features.get(name, np.nan) for name in FEATURE_NAMES], dtype=np.float32)
+
+
+# Function to list the integrity problems the features settle on their own, without a model
+def integrity_flags(features):
+    flags = []
+    if min(features["width"], features["height"]) < MIN_RESOLUTION:
+        flags.append("Low image resolution for an official document")
+    if features.get("blockiness", 0.0) > MAX_BLOCKINESS:
+        flags.append("Pixelation suggests digital alteration")
+    return flags
+
+
+# Function to combine per-page features of a multi-page document into one feature dict
+def combine_page_features(pages):
+    return {name: float(np.mean([page[name] for page in pages])) for name in pages[0]}
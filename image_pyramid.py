@@ -0,0 +1,268 @@
+import io
+import math
+import mmap
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+# Downscale factors a pyramid can hold; each level is the full image reduced by that factor
+PYRAMID_FACTORS = (1, 2, 4, 8)
+
+# Pixel memory one certificate may use (CERTIFICATE_MAX_PIXEL_MB, in MiB). A level whose whole-image analysis
+# would need more than half of it is spilled: decoded into a memory-mapped file and analyzed in bands.
+MAX_PIXEL_BYTES = int(float(os.environ.get("CERTIFICATE_MAX_PIXEL_MB", "512")) * 2**20)
+# Directory of the spill files (default: the system temp directory). It should be on disk: tmpfs pages stay in RAM.
+SPILL_DIR = os.environ.get("CERTIFICATE_SPILL_DIR") or None
+# Peak bytes per pixel of the feature extraction on one level (pixels, luminance and temporaries)
+ANALYSIS_BYTES_PER_PIXEL = 24
+# Peak bytes per pixel of a check that reads a whole luminance page at once (the QR finder scan), page included
+PAGE_BYTES_PER_PIXEL = 6
+# Bands of a spilled level start on multiples of this many rows, so the 8x8 JPEG grid and the 32x32 feature
+# blocks line up with the whole-image analysis. At most a quarter of the cap is spent on one band.
+BAND_ALIGN = 32
+# Modes the decoder writes straight into a spill file (4 bytes per pixel); L and P are expanded band by band
+DIRECT_SPILL_MODES = ("RGB", "RGBA", "RGBX")
+EXPANDED_SPILL_MODES = ("L", "P")
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+# Raised when an image cannot be analyzed within the pixel memory cap, even band by band
+class PixelBudgetError(ValueError):
+    pass
+
+
+# In-memory upload that drops the resident pages of the spill files every time the decoder reads more input,
+# so a level decoded into a spill file never holds more than a few rows in memory
+class _ReleasingReader(io.BytesIO):
+    def __init__(self, data, release):
+        super().__init__(data)
+        self.release = release
+
+    def read(self, size=-1):
+        self.release()
+        return super().read(size)
+
+
+# Decode-once, multi-resolution view of a certificate image.
+# Levels are built on demand: from a finer cached level with Image.reduce, or for JPEG files
+# straight from the decoder at reduced size with Image.draft. Every level is a read-only array.
+# Levels too large for the pixel memory cap are spilled to memory-mapped files, and walked with bands().
+class ImagePyramid:
+    def __init__(self, data=None, array=None, max_bytes=None):
+        self.data = data
+        self.levels = {}
+        self.grays = {}
+        self.decode_seconds = 0.0
+        self.peak_bytes = 0
+        self.max_bytes = MAX_PIXEL_BYTES if max_bytes is None else max_bytes
+        self.spilled = set()
+        self.spills = []
+        if array is not None:
+            self.format, self.size, self.info = None, (array.shape[1], array.shape[0]), {}
+            self._store(1, np.asarray(array, dtype=np.uint8), 0)
+        else:
+            # Header only: Image.open does not decode any pixels
+            with Image.open(io.BytesIO(data)) as image:
+                self.format, self.size, self.info = image.format, image.size, dict(image.info)
+                self.mode = image.mode
+            self._plan_spills()
+
+    @classmethod
+    def from_array(cls, array):
+        return cls(array=array)
+
+    @classmethod
+    def from_image(cls, image):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return cls(array=np.asarray(image))
+
+    def level(self, factor):
+        if factor not in PYRAMID_FACTORS:
+            raise ValueError(f"Unsupported pyramid factor: {factor}")
+        if factor in self.levels:
+            return self.levels[factor]
+
+        if self.spilled and factor > 1 and not self._drafts(factor):
+            # Coarse levels of a spilled image are reduced from the spilled full level, never decoded whole
+            self.level(1)
+
+        start = time.perf_counter()
+        finer = [cached for cached in self.levels if cached < factor and factor % cached == 0]
+        if finer and max(finer) in self.spilled:
+            source = max(finer)
+            array = self._reduce_bands(source, factor)
+            transient = self._band_bytes(source)
+        elif finer:
+            source = max(finer)
+            image = Image.fromarray(self.levels[source]).reduce(factor // source)
+            transient = image.width * image.height * 4
+            array = np.asarray(image)
+        elif factor in self.spilled:
+            array = self._decode_spilled(factor)
+            transient = self._band_bytes(factor)
+        else:
+            image = self._decode(factor)
+            transient = image.width * image.height * 4
+            array = np.asarray(image)
+        self.decode_seconds += time.perf_counter() - start
+        return self._store(factor, array, transient)
+
+    # Function to get the 8-bit luminance of a level (ITU-R 601, same as Pillow's "L" conversion)
+    def gray(self, factor):
+        if factor not in self.grays:
+            level = self.level(factor)
+            if factor in self.spilled:
+                gray = self._spill(level.shape[:2])
+                for top, bottom in self.bands(factor):
+                    band = Image.fromarray(np.ascontiguousarray(level[top:bottom]))
+                    gray[top:bottom] = np.asarray(band.convert('L'))
+            else:
+                gray = np.asarray(Image.fromarray(level).convert('L'))
+            self.grays[factor] = _read_only(gray)
+            self._track(0)
+        return self.grays[factor]
+
+    # Function to tell whether a level lives in a spill file, to be analyzed with bands() rather than as a whole
+    def is_spilled(self, factor):
+        return factor in self.spilled
+
+    # Function to get the finest level at or above factor whose whole luminance page fits in half the cap, for
+    # checks that read the page at once. The page of a spilled level is read from its spill file.
+    def page_factor(self, factor):
+        width, height = self.size
+        return min(level for level in PYRAMID_FACTORS if level >= factor and (
+            level not in self.spilled or
+            math.ceil(width / level) * math.ceil(height / level) * PAGE_BYTES_PER_PIXEL <= self.max_bytes // 2))
+
+    # Function to walk a level in bands of whole BAND_ALIGN row multiples: yields (top, bottom) row ranges and
+    # drops the resident pages of the spill files after each band, so one band at a time stays in memory
+    def bands(self, factor):
+        height = math.ceil(self.size[1] / factor)
+        rows = self._band_rows(factor)
+        for top in range(0, height, rows):
+            yield top, min(top + rows, height)
+            self._release()
+
+    def stats(self):
+        return {
+            "decode_ms": self.decode_seconds * 1000,
+            "peak_pixel_bytes": self.peak_bytes,
+            "levels": sorted(self.levels),
+            "spilled_levels": sorted(self.spilled & set(self.levels)),
+            "spill_bytes": sum(len(spill) for spill in self.spills),
+        }
+
+    # Function to choose the levels to spill from the header alone, and to refuse images that cannot be
+    # analyzed within the cap: the coarsest level must fit in memory and one band must fit in a quarter of it
+    def _plan_spills(self):
+        width, height = self.size
+        for factor in PYRAMID_FACTORS:
+            pixels = math.ceil(width / factor) * math.ceil(height / factor)
+            if pixels * ANALYSIS_BYTES_PER_PIXEL > self.max_bytes // 2:
+                self.spilled.add(factor)
+        if not self.spilled:
+            return
+        limit = f"the {self.max_bytes / 2**20:.0f} MiB pixel memory cap"
+        if max(PYRAMID_FACTORS) in self.spilled or self._band_bytes(1) > self.max_bytes // 4:
+            raise PixelBudgetError(f"A {width}x{height} image cannot be analyzed within {limit}")
+        if self.mode not in DIRECT_SPILL_MODES + EXPANDED_SPILL_MODES:
+            raise PixelBudgetError(f"{self.mode} images of {width}x{height} cannot be analyzed within {limit}")
+        if self.format == 'JPEG' and self.info.get("progressive") and width * height * 6 > self.max_bytes // 2:
+            # libjpeg buffers the coefficients of a whole progressive image before the first row comes out
+            raise PixelBudgetError(f"A {width}x{height} progressive JPEG cannot be analyzed within {limit}")
+
+    def _band_rows(self, factor):
+        width = math.ceil(self.size[0] / factor)
+        rows = self.max_bytes // 4 // (width * ANALYSIS_BYTES_PER_PIXEL)
+        return max(BAND_ALIGN, rows - rows % BAND_ALIGN)
+
+    def _band_bytes(self, factor):
+        return self._band_rows(factor) * math.ceil(self.size[0] / factor) * ANALYSIS_BYTES_PER_PIXEL
+
+    # Function to tell whether the JPEG decoder can produce a level at reduced size without the full image
+    def _drafts(self, factor):
+        return factor > 1 and self.format == 'JPEG'
+
+    # Function to create a zero-filled, memory-mapped array in an unlinked file of the spill directory
+    def _spill(self, shape):
+        size = math.prod(shape)
+        with tempfile.TemporaryFile(dir=SPILL_DIR) as spill:
+            spill.truncate(size)
+            buffer = mmap.mmap(spill.fileno(), size)
+        self.spills.append(buffer)
+        return np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+
+    def _release(self):
+        if hasattr(mmap, "MADV_DONTNEED"):
+            for spill in self.spills:
+                spill.madvise(mmap.MADV_DONTNEED)
+
+    # Function to decode a level straight into a spill file. Pillow stores RGB pixels in 4 bytes, so the decoder
+    # writes into a mapped RGBX buffer and the level is its first three channels; L and P images are decoded
+    # 1 byte per pixel and expanded to RGB band by band.
+    def _decode_spilled(self, factor):
+        with Image.open(_ReleasingReader(self.data, self._release)) as image:
+            if self._drafts(factor):
+                image.draft('RGB', (math.ceil(image.width / factor), math.ceil(image.height / factor)))
+            width, height = image.size
+            if image.mode in DIRECT_SPILL_MODES:
+                pixels = self._spill((height, width, 4))
+                image.im = Image.core.map_buffer(pixels, image.size, "raw", 0, (image.mode, 0, 1))
+                image.load()
+                return pixels[..., :3]
+            if image.mode not in EXPANDED_SPILL_MODES:
+                raise PixelBudgetError(f"{image.mode} images cannot be decoded into a spill file")
+            native = self._spill((height, width))
+            image.im = Image.core.map_buffer(native, image.size, "raw", 0, (image.mode, 0, 1))
+            image.load()
+            pixels = self._spill((height, width, 4))
+            for top, bottom in self.bands(factor):
+                pixels[top:bottom, :, :3] = np.asarray(image.crop((0, top, width, bottom)).convert('RGB'))
+        return pixels[..., :3]
+
+    # Function to reduce a spilled level band by band. Bands are whole multiples of the reduction, so the result
+    # equals Image.reduce over the whole level; it is spilled too unless it fits in memory.
+    def _reduce_bands(self, source, factor):
+        level = self.levels[source]
+        scale = factor // source
+        height, width = math.ceil(level.shape[0] / scale), math.ceil(level.shape[1] / scale)
+        target = self._spill((height, width, 4))[..., :3] if factor in self.spilled else np.empty(
+            (height, width, 3), dtype=np.uint8)
+        for top, bottom in self.bands(source):
+            band = Image.fromarray(np.ascontiguousarray(level[top:bottom])).reduce(scale)
+            target[top // scale:top // scale + band.height] = np.asarray(band)
+        return target
+
+    def _decode(self, factor):
+        with Image.open(io.BytesIO(self.data)) as image:
+            if factor > 1 and image.format == 'JPEG':
+                # DCT-domain downscale: the decoder only produces the reduced image
+                target = (math.ceil(image.width / factor), math.ceil(image.height / factor))
+                image.draft('RGB', target)
+            image.load()
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            width, height = self.size
+            scale = round(width / image.width) if image.width else 1
+            if factor > scale and factor % scale == 0:
+                image = image.reduce(factor // scale)
+            return image
+
+    def _store(self, factor, array, transient):
+        self.levels[factor] = _read_only(array)
+        self._track(transient)
+        return self.levels[factor]
+
+    # Spilled levels are not counted: only the band being worked on is resident
+    def _track(self, transient):
+        live = sum(array.nbytes for factor, array in self.levels.items() if factor not in self.spilled)
+        live += sum(gray.nbytes for factor, gray in self.grays.items() if factor not in self.spilled)
+        self.peak_bytes = max(self.peak_bytes, live + transient)
@@ -0,0 +1,73 @@
+import io
+
+from image_pyramid import ImagePyramid
+
+# Lazily parsed PDF: the cross-reference table is read up front, page objects and their
+# embedded images only when iter_page_images reaches them
+class PdfDocument:
+    def __init__(self, data):
+        # pypdf is only needed for PDF uploads
+        from pypdf import PdfReader
+
+        self.reader = PdfReader(io.BytesIO(data))
+        self.page_count = len(self.reader.pages)
+        metadata = self.reader.metadata or {}
+        self.metadata = {str(key).lstrip('/'): str(value) for key, value in metadata.items()}
+        # Numbers of the pages whose image could not be decoded, and of those with no embedded image
+        # (vector-only text and drawings, nothing to analyze)
+        self.failed_pages = set()
+        self.vector_pages = set()
+
+    # Generator of (page_number, ImagePyramid) for the main image of each page, one page at a time.
+    # A page's pixels are decoded only when the consumer asks for the next item, and the previous
+    # page is released by then, so at most one page is held in memory.
+    # Every page is visited unless max_pages limits the walk to the first ones.
+    # A page whose image cannot be extracted is added to failed_pages, one without an image to
+    # vector_pages, and both are skipped.
+    def iter_page_images(self, max_pages=None):
+        for page_number in range(min(self.page_count, max_pages or self.page_count)):
+            try:
+                pyramid = self._page_pyramid(self.reader.pages[page_number])
+            except Exception:
+                # pypdf and Pillow raise a variety of errors on a corrupt embedded image
+                self.failed_pages.add(page_number + 1)
+                continue
+            if pyramid is None:
+                self.vector_pages.add(page_number + 1)
+            else:
+                yield page_number + 1, pyramid
+
+    def _page_pyramid(self, page):
+        name, image_object = _largest_image(page)
+        if image_object is None:
+            return None
+        if _filters(image_object) == ['/DCTDecode']:
+            # Embedded JPEG: hand the compressed bytes to the pyramid so reduced levels can use draft()
+            return ImagePyramid(image_object.get_data())
+        return ImagePyramid.from_image(page.images[name].image)
+
+
+def _filters(image_object):
+    filters = image_object.get('/Filter')
+    if filters is None:
+        return []
+    if isinstance(filters, list):
+        return [str(f) for f in filters]
+    return [str(filters)]
+
+
+# Function to pick the page's largest image XObject from its dimensions, without decoding any of them
+def _largest_image(page):
+    resources = page.get('/Resources')
+    xobjects = resources.get_object().get('/XObject') if resources is not None else None
+    best_name, best_object, best_area = None, None, 0
+    if xobjects is None:
+        return best_name, best_object
+    for name, reference in xobjects.get_object().items():
+        image_object = reference.get_object()
+        if image_object.get('/Subtype') != '/Image':
+            continue
+        area = int(image_object.get('/Width', 0)) * int(image_object.get('/Height', 0))
+        if area > best_area:
+            best_name, best_object, best_area = name, image_object, area
+    return best_name, best_object
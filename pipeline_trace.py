@@ -0,0 +1,251 @@
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import secrets
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Spans of every request are appended to this file as OTLP/JSON lines when it is set
+DEFAULT_TRACE_PATH = os.environ.get("CERTIFICATE_TRACE") or None
+# Comma-separated profilers to run around every request: cprofile, tracemalloc
+PROFILERS = ("cprofile", "tracemalloc")
+DEFAULT_PROFILE = tuple(name for name in PROFILERS
+                        if name in os.environ.get("CERTIFICATE_PROFILE", "").lower().replace(" ", "").split(","))
+
+SERVICE_NAME = "certificate-verifier"
+SCOPE_NAME = "certificate_engine"
+# Functions (by cumulative time) and allocation sites (by size) kept from a profile
+PROFILE_LINES = 25
+ALLOCATION_LINES = 10
+
+_current = contextvars.ContextVar("certificate_trace", default=None)
+# Shared no-op context handed out when no request is being traced
+_NO_SPAN = nullcontext()
+
+# Both profilers are process-wide and share this lock. tracemalloc is shared by requests profiling memory
+# at the same time: the first one starts it (unless something else already had), the last one to finish
+# stops it, and a request that overlapped another reports no peak of its own since the shared peak mixes
+# both. Only one cProfile can be active at a time (Python 3.12+ raises otherwise), so a request that
+# overlaps the one holding it is not CPU-profiled and gets profile.cprofile_skipped instead.
+_profiler_lock = threading.Lock()
+_tracemalloc_traces = set()
+_tracemalloc_owned = False
+_cprofile_trace = None
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name, parent_id, attributes):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# Spans of one verification request; the first span is the request itself
+class Trace:
+    def __init__(self, name, attributes):
+        self.trace_id = secrets.token_hex(16)
+        self.root = Span(name, None, attributes)
+        self.spans = [self.root]
+        self.stack = [self.root]
+
+    @contextmanager
+    def span(self, name, attributes):
+        current = Span(name, self.stack[-1].span_id, attributes)
+        self.spans.append(current)
+        self.stack.append(current)
+        try:
+            yield current
+        finally:
+            current.end_ns = time.time_ns()
+            self.stack.pop()
+
+    # Function to encode the trace as an OTLP/JSON ExportTraceServiceRequest, the format of the
+    # OpenTelemetry collector's file exporter
+    def to_otlp(self):
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": SCOPE_NAME},
+                "spans": [{
+                    "traceId": self.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                    "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+                } for span in self.spans],
+            }],
+        }]}
+
+    # Function to list the spans for display: name, nesting depth, duration and attributes
+    def summary(self):
+        depths = {None: -1}
+        rows = []
+        for span in self.spans:
+            depths[span.span_id] = depths[span.parent_id] + 1
+            rows.append({"name": span.name, "depth": depths[span.span_id],
+                         "ms": ((span.end_ns or span.start_ns) - span.start_ns) / 1e6,
+                         "attributes": span.attributes})
+        return {"trace_id": self.trace_id, "spans": rows}
+
+
+# Function to time a block as a child span of the current request; a shared no-op when nothing is traced
+def span(name, **attributes):
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return trace.span(name, attributes)
+
+
+# Decorator form of span(), named after the function unless a name is given
+def traced(name=None):
+    def decorate(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return function(*args, **kwargs)
+            with trace.span(label, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Function to add attributes to the innermost open span of the current request
+def annotate(**attributes):
+    trace = _current.get()
+    if trace is not None:
+        trace.stack[-1].attributes.update(attributes)
+
+
+def _export(path, trace):
+    line = (json.dumps(trace.to_otlp(), separators=(",", ":")) + "\n").encode("utf-8")
+    # One write on an O_APPEND descriptor, so lines from concurrent workers do not interleave
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _profile_text(profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return out.getvalue()
+
+
+# Function to register a request as a tracemalloc user, starting tracemalloc for the first one
+def _start_tracemalloc(trace):
+    global _tracemalloc_owned
+    with _profiler_lock:
+        if not _tracemalloc_traces:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _tracemalloc_owned = True
+            tracemalloc.reset_peak()
+        else:
+            for other in _tracemalloc_traces:
+                other.root.attributes["memory.peak_shared"] = True
+            trace.root.attributes["memory.peak_shared"] = True
+        _tracemalloc_traces.add(trace)
+
+
+# Function to record the memory profile of a request on its root span and drop it as a tracemalloc user;
+# the last user stops tracemalloc if a request started it
+def _stop_tracemalloc(trace):
+    global _tracemalloc_owned
+    with _profiler_lock:
+        attributes = trace.root.attributes
+        if not attributes.get("memory.peak_shared"):
+            attributes["memory.peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        top = tracemalloc.take_snapshot().statistics("lineno")[:ALLOCATION_LINES]
+        attributes["memory.top"] = "\n".join(str(stat) for stat in top)
+        _tracemalloc_traces.discard(trace)
+        if not _tracemalloc_traces and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+# Function to hand the process's cProfile to a request and start it. None, with the request marked as
+# skipped, while another request holds it or another profiling tool is active.
+def _start_cprofile(trace):
+    global _cprofile_trace
+    with _profiler_lock:
+        if _cprofile_trace is None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                pass
+            else:
+                _cprofile_trace = trace
+                return profiler
+    trace.root.attributes["profile.cprofile_skipped"] = True
+    return None
+
+
+# Function to stop a request's cProfile, record it on the root span and release it for the next request
+def _stop_cprofile(trace, profiler):
+    global _cprofile_trace
+    with _profiler_lock:
+        profiler.disable()
+        _cprofile_trace = None
+    trace.root.attributes["profile.cprofile"] = _profile_text(profiler)
+
+
+# Function to trace one request. Yields the Trace, or None when nothing asked for it: no export file,
+# no profiler and no capture, in which case span() and traced() stay no-ops for the whole request.
+# profile lists the profilers to run (default: CERTIFICATE_PROFILE); their results become root attributes.
+# A request whose tracemalloc profile overlapped another's gets memory.peak_shared instead of a peak, and one
+# that asked for cprofile while another request held it gets profile.cprofile_skipped.
+@contextmanager
+def request_trace(name, profile=None, export_path=None, capture=False, **attributes):
+    profile = DEFAULT_PROFILE if profile is None else tuple(profile)
+    export_path = export_path or DEFAULT_TRACE_PATH
+    if not (profile or export_path or capture) or _current.get() is not None:
+        yield None
+        return
+
+    trace = Trace(name, attributes)
+    token = _current.set(trace)
+    if "tracemalloc" in profile:
+        _start_tracemalloc(trace)
+    profiler = _start_cprofile(trace) if "cprofile" in profile else None
+    try:
+        try:
+            yield trace
+        finally:
+            if profiler is not None:
+                _stop_cprofile(trace, profiler)
+    finally:
+        trace.root.end_ns = time.time_ns()
+        _current.reset(token)
+        if "tracemalloc" in profile:
+            _stop_tracemalloc(trace)
+        if export_path:
+            _export(export_path, trace)
@@ -0,0 +1,242 @@
+import struct
+import zlib
+
+import numpy as np
+
+# The 2-D code printed on issued certificates: a square grid of modules with QR-style finder
+# patterns in three corners. The remaining modules carry a fixed-size signed payload, row by row,
+# XOR-ed with a checkerboard so no run of modules mimics a finder pattern.
+QR_MODULES = 33
+QR_MODULE_PX = 2
+FINDER_SIZE = 7
+# Finder plus its light separator
+FINDER_ZONE = FINDER_SIZE + 1
+
+PAYLOAD_VERSION = 1
+SERIAL_BYTES = 16
+SIGNATURE_BYTES = 64
+# version, issuer key id, zero-padded serial, Ed25519 signature; followed by a CRC-32 of those fields
+PAYLOAD_FORMAT = f">B4s{SERIAL_BYTES}s{SIGNATURE_BYTES}s"
+PAYLOAD_SIZE = struct.calcsize(PAYLOAD_FORMAT) + 4
+
+# Pixels darker than this are read as dark modules
+DARK_THRESHOLD = 128
+# Finder candidates kept when looking for the three corners of one code
+MAX_FINDERS = 8
+# Share of the blank modules past the payload that may be dark in a certificate code (a tampered one
+# included). A standard QR code, or another grid size sampled as 33x33, has about half of them dark.
+MAX_TAIL_DARK = 0.25
+
+
+def _finder_corners(size=QR_MODULES):
+    return ((0, 0), (0, size - FINDER_SIZE), (size - FINDER_SIZE, 0))
+
+
+def _data_mask(size=QR_MODULES):
+    mask = np.ones((size, size), dtype=bool)
+    mask[:FINDER_ZONE, :FINDER_ZONE] = False
+    mask[:FINDER_ZONE, size - FINDER_ZONE:] = False
+    mask[size - FINDER_ZONE:, :FINDER_ZONE] = False
+    return mask
+
+
+def _finder_pattern():
+    finder = np.ones((FINDER_SIZE, FINDER_SIZE), dtype=bool)
+    finder[1:6, 1:6] = False
+    finder[2:5, 2:5] = True
+    return finder
+
+
+DATA_MASK = _data_mask()
+CHECKERBOARD = (np.add.outer(np.arange(QR_MODULES), np.arange(QR_MODULES)) % 2 == 0)[DATA_MASK]
+FINDER = _finder_pattern()
+
+
+# Decoded QR payload: which issuer signed which serial
+class QrPayload:
+    def __init__(self, serial, key_id, signature):
+        self.serial = serial
+        self.key_id = key_id
+        self.signature = signature
+
+    def to_bytes(self):
+        serial = self.serial.encode("ascii")
+        if len(serial) > SERIAL_BYTES:
+            raise ValueError(f"Serial longer than {SERIAL_BYTES} characters: {self.serial!r}")
+        body = struct.pack(PAYLOAD_FORMAT, PAYLOAD_VERSION, self.key_id, serial, self.signature)
+        return body + struct.pack(">I", zlib.crc32(body))
+
+    @classmethod
+    def from_bytes(cls, data):
+        body, (checksum,) = data[:-4], struct.unpack(">I", data[-4:])
+        if zlib.crc32(body) != checksum:
+            return None
+        version, key_id, serial, signature = struct.unpack(PAYLOAD_FORMAT, body)
+        if version != PAYLOAD_VERSION:
+            return None
+        try:
+            serial = serial.rstrip(b"\0").decode("ascii")
+        except UnicodeDecodeError:
+            return None
+        return cls(serial, key_id, signature)
+
+
+# Function to lay out a payload as the module grid (True = dark module)
+def encode_modules(payload):
+    bits = np.zeros(int(DATA_MASK.sum()), dtype=bool)
+    payload_bits = np.unpackbits(np.frombuffer(payload.to_bytes(), dtype=np.uint8)).astype(bool)
+    bits[:payload_bits.size] = payload_bits
+    grid = np.zeros((QR_MODULES, QR_MODULES), dtype=bool)
+    grid[DATA_MASK] = bits ^ CHECKERBOARD
+    for row, col in _finder_corners():
+        grid[row:row + FINDER_SIZE, col:col + FINDER_SIZE] = FINDER
+    return grid
+
+
+# Function to tell whether a sampled module grid is laid out as a certificate code, whether or not its
+# payload decodes: finders in place and the modules past the payload (nearly) blank
+def is_certificate_code(grid):
+    for row, col in _finder_corners():
+        if not np.array_equal(grid[row:row + FINDER_SIZE, col:col + FINDER_SIZE], FINDER):
+            return False
+    tail = (grid[DATA_MASK] ^ CHECKERBOARD)[PAYLOAD_SIZE * 8:]
+    return tail.mean() <= MAX_TAIL_DARK
+
+
+# Function to read the payload back from a sampled module grid; None when any module is off
+def decode_modules(grid):
+    for row, col in _finder_corners():
+        if not np.array_equal(grid[row:row + FINDER_SIZE, col:col + FINDER_SIZE], FINDER):
+            return None
+    bits = grid[DATA_MASK] ^ CHECKERBOARD
+    # Modules past the payload are blank: a set bit there means the code was altered
+    if bits[PAYLOAD_SIZE * 8:].any():
+        return None
+    return QrPayload.from_bytes(np.packbits(bits[:PAYLOAD_SIZE * 8]).tobytes())
+
+
+# Function to run-length encode every row of a boolean image.
+# Returns the row, start column, length and value of each run.
+def _runs(dark):
+    height, width = dark.shape
+    change = np.ones((height, width), dtype=bool)
+    change[:, 1:] = dark[:, 1:] != dark[:, :-1]
+    starts = np.flatnonzero(change)
+    rows = starts // width
+    ends = np.minimum(np.append(starts[1:], height * width), (rows + 1) * width)
+    return rows, starts % width, ends - starts, dark.ravel()[starts]
+
+
+# Function to find finder pattern crossings along rows: dark-light-dark-light-dark runs in 1:1:3:1:1 ratio.
+# Returns (centre along the row, row, module size) for every crossing.
+def _finder_crossings(dark):
+    rows, cols, lengths, values = _runs(dark)
+    if rows.size < 5:
+        return np.empty((0, 3))
+    window = np.lib.stride_tricks.sliding_window_view(lengths, 5).astype(np.float64)
+    first = np.arange(window.shape[0])
+    module = window.sum(axis=1) / 7.0
+    tolerance = module / 2
+    expected = np.outer(module, [1, 1, 3, 1, 1])
+    ok = (values[first] & (rows[first] == rows[first + 4])
+          & (np.abs(window - expected) < tolerance[:, None] * np.array([1, 1, 3, 1, 1])).all(axis=1))
+    hits = first[ok]
+    centres = cols[hits + 2] + lengths[hits + 2] / 2.0
+    return np.column_stack([centres, rows[hits] + 0.5, module[ok]])
+
+
+# Function to merge crossings that belong to the same finder; returns (x, y, module, count) per cluster
+def _cluster(points, along_columns=False):
+    clusters = []
+    for x, y, module in (points[:, [1, 0, 2]] if along_columns else points):
+        for cluster in clusters:
+            if abs(cluster[0] - x) < 2 * module and abs(cluster[1] - y) < 2 * module:
+                count = cluster[3]
+                cluster[0] = (cluster[0] * count + x) / (count + 1)
+                cluster[1] = (cluster[1] * count + y) / (count + 1)
+                cluster[2] = (cluster[2] * count + module) / (count + 1)
+                cluster[3] = count + 1
+                break
+        else:
+            clusters.append([x, y, module, 1])
+    return clusters
+
+
+# Function to locate finder patterns: crossings found both along rows and along columns
+def find_finders(gray):
+    dark = np.asarray(gray) < DARK_THRESHOLD
+    horizontal = _cluster(_finder_crossings(dark))
+    vertical = _cluster(_finder_crossings(np.ascontiguousarray(dark.T)), along_columns=True)
+    finders = []
+    for x, y, module, count in horizontal:
+        for vx, vy, vmodule, vcount in vertical:
+            if abs(vx - x) < module and abs(vy - y) < module:
+                finders.append(((x + vx) / 2, (y + vy) / 2, (module + vmodule) / 2, count + vcount))
+                break
+    finders.sort(key=lambda finder: -finder[3])
+    return finders[:MAX_FINDERS]
+
+
+# Function to pick the three finders of one code and order them top-left, top-right, bottom-left.
+# The top-left finder is the corner of the (nearly) right isosceles triangle they form.
+def _corners(finders):
+    best, best_error = None, np.inf
+    for i, a in enumerate(finders):
+        for j, b in enumerate(finders):
+            for k, c in enumerate(finders):
+                if len({i, j, k}) < 3 or j > k:
+                    continue
+                u = np.array(b[:2]) - a[:2]
+                v = np.array(c[:2]) - a[:2]
+                length = (np.hypot(*u) + np.hypot(*v)) / 2
+                if length < FINDER_SIZE * a[2]:
+                    continue
+                error = abs(np.hypot(*u) - np.hypot(*v)) / length + abs(u @ v) / length ** 2
+                if error < best_error:
+                    best, best_error = (a, b, c), error
+    if best is None or best_error > 0.2:
+        return None
+    top_left, top_right, bottom_left = best
+    u = np.array(top_right[:2]) - top_left[:2]
+    v = np.array(bottom_left[:2]) - top_left[:2]
+    # Image y grows downwards: a clockwise turn from top-right to bottom-left has a positive cross product
+    if u[0] * v[1] - u[1] * v[0] < 0:
+        top_right, bottom_left = bottom_left, top_right
+    return top_left, top_right, bottom_left
+
+
+# Function to sample the module grid of the code spanned by three finder centres (affine, so a
+# scaled, rotated or sheared print is read the same way)
+def sample_modules(gray, top_left, top_right, bottom_left, size=QR_MODULES):
+    origin = np.array(top_left[:2])
+    u = (np.array(top_right[:2]) - origin) / (size - FINDER_SIZE)
+    v = (np.array(bottom_left[:2]) - origin) / (size - FINDER_SIZE)
+    index = np.arange(size) - (FINDER_SIZE // 2)
+    xs = origin[0] + index[None, :] * u[0] + index[:, None] * v[0]
+    ys = origin[1] + index[None, :] * u[1] + index[:, None] * v[1]
+    height, width = gray.shape
+    xs = np.clip(np.floor(xs).astype(int), 0, width - 1)
+    ys = np.clip(np.floor(ys).astype(int), 0, height - 1)
+    return np.asarray(gray)[ys, xs] < DARK_THRESHOLD
+
+
+# Function to find and decode the certificate QR code in an 8-bit grayscale page.
+# Returns (payload or None, whether a certificate code was found). Other codes with finder patterns,
+# such as a standard QR code or a grid of another size, are not found: they are not ours to judge.
+def read_qr(gray):
+    finders = find_finders(gray)
+    if len(finders) < 3:
+        return None, False
+    corners = _corners(finders)
+    if corners is None:
+        return None, False
+    top_left, top_right, _ = corners
+    # The finder centres are QR_MODULES - 7 modules apart; another grid size is not our code
+    span = np.hypot(top_right[0] - top_left[0], top_right[1] - top_left[1]) / top_left[2]
+    if abs(span - (QR_MODULES - FINDER_SIZE)) > 2:
+        return None, False
+    grid = sample_modules(gray, *corners)
+    payload = decode_modules(grid)
+    if payload is None and not is_certificate_code(grid):
+        return None, False
+    return payload, True
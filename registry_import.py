@@ -0,0 +1,215 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from certificate_registry import DEFAULT_REGISTRY_PATH, GENERATION_TABLE, RECORD_FIELDS, clear_lookup_cache
+from certificate_signatures import key_id
+
+DEFAULT_BATCH_SIZE = 100000
+# Set whenever the registry is written: the engine's read-only connections keep reading during an import.
+# The shipped file stays in rollback-journal mode until something is imported into it.
+JOURNAL_MODE = "WAL"
+
+UPSERT_SQL = (
+    "INSERT INTO certificates (id, name, course, date, signature) VALUES (?, ?, ?, ?, ?)"
+    " ON CONFLICT(id) DO UPDATE SET name = excluded.name, course = excluded.course,"
+    " date = excluded.date, signature = excluded.signature"
+)
+
+# Writes counted in the registry generation; the bulk load drops the certificates triggers and counts
+# each batch once instead of every row
+GENERATION_TRIGGERS = tuple((table, event) for table in ("certificates", "issuers")
+                            for event in ("INSERT", "UPDATE", "DELETE"))
+
+# Bulk-load settings: big page cache, no fsync per transaction, temp b-trees in memory
+BULK_LOAD_PRAGMAS = (
+    f"PRAGMA journal_mode={JOURNAL_MODE}",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+# Function to stream registry rows from a CSV file with a header line
+def read_csv_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = [column.strip().lower() for column in next(reader, [])]
+        if "id" not in header:
+            raise ValueError(f"{path}: CSV header has no 'id' column")
+        positions = [header.index(field) if field in header else None for field in RECORD_FIELDS]
+        if positions == list(range(len(RECORD_FIELDS))):
+            # Same column order as the table: hand the parsed rows straight to executemany
+            for row in reader:
+                if not row or not row[0]:
+                    raise ValueError(f"{path}:{reader.line_num}: registry record without an id")
+                yield tuple(row[:len(RECORD_FIELDS)])
+        else:
+            for row in reader:
+                row = tuple(row[i] if i is not None and i < len(row) else None for i in positions)
+                if not row[0]:
+                    raise ValueError(f"{path}:{reader.line_num}: registry record without an id")
+                yield row
+
+
+# Function to stream registry rows from a JSON-lines file
+def read_jsonl_rows(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield _to_row(json.loads(line))
+
+
+def _to_row(record):
+    serial = record.get("id")
+    if serial is None or not str(serial).strip():
+        raise ValueError(f"Registry record without an id: {record!r}")
+    row = [str(serial).strip()]
+    for field in RECORD_FIELDS[1:]:
+        value = record.get(field)
+        row.append(None if value is None else str(value))
+    return tuple(row)
+
+
+# Function to pick the reader for a file from its extension
+def read_rows(path, file_format=None):
+    file_format = file_format or ('jsonl' if path.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv')
+    if file_format == 'jsonl':
+        return read_jsonl_rows(path)
+    if file_format == 'csv':
+        return read_csv_rows(path)
+    raise ValueError(f"Unsupported registry export format: {file_format!r}")
+
+
+# Function to create the registry tables if they are missing.
+# Serials are looked up by id and issuers by key id, which the primary keys already index.
+# signature holds the issuer's hex Ed25519 signature of the record; public_key the issuer's hex key.
+# Triggers count every insert, update and delete (revocations included, whatever tool runs them) in
+# registry_generation, which cached verdicts are keyed by.
+def ensure_schema(connection):
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS certificates"
+        " (id TEXT PRIMARY KEY, name TEXT, course TEXT, date TEXT, signature TEXT)"
+    )
+    connection.execute("CREATE TABLE IF NOT EXISTS issuers (key_id TEXT PRIMARY KEY, name TEXT, public_key TEXT)")
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {GENERATION_TABLE} (generation INTEGER NOT NULL)")
+    connection.execute(f"INSERT INTO {GENERATION_TABLE} SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM {GENERATION_TABLE})")
+    for table, event in GENERATION_TRIGGERS:
+        connection.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_generation AFTER {event} ON {table}"
+            f" BEGIN UPDATE {GENERATION_TABLE} SET generation = generation + 1; END"
+        )
+    connection.commit()
+
+
+def _bump_generation(connection):
+    connection.execute(f"UPDATE {GENERATION_TABLE} SET generation = generation + 1")
+
+
+def _secondary_indexes(connection):
+    return connection.execute(
+        "SELECT name, sql FROM sqlite_master"
+        " WHERE type = 'index' AND tbl_name = 'certificates' AND sql IS NOT NULL"
+    ).fetchall()
+
+
+# Function to add or replace an issuer's public key (32 raw bytes) in the registry
+def register_issuer(public_key, name, path=None):
+    connection = sqlite3.connect(path or DEFAULT_REGISTRY_PATH)
+    try:
+        connection.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+        ensure_schema(connection)
+        connection.execute(
+            "INSERT OR REPLACE INTO issuers (key_id, name, public_key) VALUES (?, ?, ?)",
+            (key_id(public_key).hex(), name, public_key.hex()),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+    clear_lookup_cache()
+
+
+# Function to upsert rows into the registry in large transactions.
+# Secondary indexes and the per-row generation triggers are dropped during the load and restored at the end;
+# every committed batch bumps the registry generation once.
+# on_progress(rows, seconds) is called after every committed batch.
+def import_rows(rows, path=None, batch_size=DEFAULT_BATCH_SIZE, on_progress=None):
+    connection = sqlite3.connect(path or DEFAULT_REGISTRY_PATH, isolation_level=None)
+    try:
+        for pragma in BULK_LOAD_PRAGMAS:
+            connection.execute(pragma)
+        ensure_schema(connection)
+
+        indexes = _secondary_indexes(connection)
+        for name, _ in indexes:
+            connection.execute(f'DROP INDEX "{name}"')
+        for table, event in GENERATION_TRIGGERS:
+            if table == "certificates":
+                connection.execute(f"DROP TRIGGER {table}_{event.lower()}_generation")
+
+        start = time.perf_counter()
+        total = 0
+        try:
+            rows = iter(rows)
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                connection.execute("BEGIN")
+                connection.executemany(UPSERT_SQL, batch)
+                _bump_generation(connection)
+                connection.execute("COMMIT")
+                total += len(batch)
+                if on_progress is not None:
+                    on_progress(total, time.perf_counter() - start)
+        finally:
+            ensure_schema(connection)
+
+        for _, sql in indexes:
+            connection.execute(sql)
+        connection.execute("ANALYZE certificates")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        connection.close()
+
+    clear_lookup_cache()
+    return total, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import issued certificates into the registry.")
+    parser.add_argument("files", nargs="*", help="CSV (with header) or JSONL registry exports")
+    parser.add_argument("--db", default=DEFAULT_REGISTRY_PATH, help="Registry database (default: certificates.db)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default=None,
+                        help="Input format (default: from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per transaction")
+    parser.add_argument("--issuer", action="append", default=[], metavar="NAME=PUBLIC_KEY",
+                        help="Register an issuer's hex Ed25519 public key (repeatable)")
+    args = parser.parse_args(argv)
+
+    for issuer in args.issuer:
+        name, _, public_key = issuer.rpartition("=")
+        register_issuer(bytes.fromhex(public_key), name, args.db)
+        print(f"Registered issuer {name!r} with key id {key_id(bytes.fromhex(public_key)).hex()}")
+    if not args.files:
+        return
+
+    def report_progress(rows, seconds):
+        sys.stderr.write(f"\r{rows:,} rows ({rows / max(seconds, 1e-9):,.0f} rows/s)")
+        sys.stderr.flush()
+
+    rows = itertools.chain.from_iterable(read_rows(path, args.format) for path in args.files)
+    total, seconds = import_rows(rows, args.db, args.batch_size, on_progress=report_progress)
+    sys.stderr.write("\n")
+    print(f"Imported {total:,} rows into {os.path.basename(args.db)} in {seconds:.1f} s "
+          f"({total / max(seconds, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from certificate_registry import DEFAULT_REGISTRY_PATH
+
+# On-disk tier lives next to the registry database
+DEFAULT_CACHE_PATH = os.environ.get(
+    "CERTIFICATE_RESULT_CACHE",
+    os.path.join(os.path.dirname(DEFAULT_REGISTRY_PATH), "verification_cache.db"),
+)
+
+DEFAULT_MEMORY_ENTRIES = 1024
+DEFAULT_MAX_ENTRIES = 1000000
+DEFAULT_TTL = 7 * 24 * 3600
+
+# Expired and surplus rows are pruned once every this many writes
+PRUNE_INTERVAL = 1000
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+# Function to hash the certificate bytes
+def content_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Function to build the cache key from the content hash, the enabled checks and the analysis version
+def cache_key(digest, checks, version):
+    enabled = ",".join(sorted(name for name, on in checks.items() if on))
+    return f"{digest}:{enabled}:{version}"
+
+
+# Two-tier cache of verification reports: an in-process LRU in front of a SQLite table
+class ResultCache:
+    def __init__(self, path=None, memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.path = os.path.abspath(path or DEFAULT_CACHE_PATH)
+        self.pid = os.getpid()
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, report TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_results_created ON results (created)")
+        self.connection.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                created, report = entry
+                if now - created <= self.ttl:
+                    self.memory.move_to_end(key)
+                    return dict(report)
+                del self.memory[key]
+
+            row = self.connection.execute(
+                "SELECT report, created FROM results WHERE key = ? AND created >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            report = json.loads(row[0])
+            self._remember(key, row[1], report)
+            return dict(report)
+
+    def put(self, key, report):
+        now = time.time()
+        with self.lock:
+            self._remember(key, now, report)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results (key, report, created) VALUES (?, ?, ?)",
+                (key, json.dumps(report), now),
+            )
+            self.writes += 1
+            if self.writes % PRUNE_INTERVAL == 0:
+                self._prune(now)
+            self.connection.commit()
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.connection.execute("DELETE FROM results")
+            self.connection.commit()
+
+    def _remember(self, key, created, report):
+        self.memory[key] = (created, report)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    # Drop expired rows, then the oldest rows beyond max_entries
+    def _prune(self, now):
+        self.connection.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+        surplus = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+        if surplus > 0:
+            self.connection.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY created LIMIT ?)", (surplus,)
+            )
+
+
+# Function to return this process's result cache, reopening it after a fork
+def get_result_cache(path=None):
+    path = os.path.abspath(path or DEFAULT_CACHE_PATH)
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None or cache.pid != os.getpid():
+            cache = ResultCache(path)
+            _caches[path] = cache
+        return cache
@@ -0,0 +1,73 @@
+import io
+import random
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+SAMPLE_SIZE = (600, 400)
+
+
+# Function to load a font once per process; arial.ttf is missing on most Linux hosts,
+# so the failed lookup and the fallback are paid only on the first call
+@lru_cache(maxsize=None)
+def load_font(size):
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+# Function to generate a sample certificate (for demo purposes).
+# The same seed always gives the same serial number, so results can be memoized.
+def generate_sample_certificate(is_real=True, seed=None):
+    img = Image.new('RGB', SAMPLE_SIZE, color='white')
+    d = ImageDraw.Draw(img)
+    font = load_font(30)
+
+    # Add border
+    d.rectangle([10, 10, 590, 390], outline='gold', width=3)
+
+    # Add title
+    d.text((150, 50), "CERTIFICATE OF AUTHENTICITY", fill='black', font=font)
+
+    # Add content
+    d.text((150, 120), "This is to certify that", fill='black', font=font)
+    d.text((200, 160), "SAMPLE DOCUMENT", fill='blue', font=font)
+    d.text((150, 200), "has been verified as", fill='black', font=font)
+
+    if is_real:
+        status = "GENUINE"
+        color = "green"
+    else:
+        status = "FRAUDULENT"
+        color = "red"
+
+    d.text((230, 240), status, fill=color, font=font)
+
+    # Add serial number
+    serial = f"Serial: {random.Random(seed).randint(10000, 99999)}"
+    d.text((350, 300), serial, fill='black', font=font)
+
+    # Add a fake QR code area
+    d.rectangle([450, 300, 550, 350], outline='black', fill='lightgray')
+    d.text((460, 320), "QR CODE", fill='black', font=font)
+
+    # Add security features for genuine certificates
+    if is_real:
+        # Add a simple watermark
+        watermark = Image.new('RGBA', img.size, (0, 0, 0, 0))
+        dw = ImageDraw.Draw(watermark)
+        w_font = load_font(40)
+        dw.text((100, 150), "SECURE", fill=(0, 0, 255, 45), font=w_font)
+        dw.text((300, 250), "OFFICIAL", fill=(0, 0, 255, 45), font=w_font)
+        img = Image.alpha_composite(img.convert('RGBA'), watermark).convert('RGB')
+
+    return img, serial
+
+
+# Function to render a sample certificate straight to PNG bytes (what the UI displays and downloads)
+def sample_certificate_png(is_real=True, seed=None):
+    img, serial = generate_sample_certificate(is_real, seed)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue(), serial
@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from certificate_registry import DEFAULT_REGISTRY_PATH
+from image_features import FEATURE_NAMES
+from template_index import hamming
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Every verified certificate is appended here; the store lives next to the registry database
+DEFAULT_HISTORY_PATH = os.environ.get(
+    "CERTIFICATE_HISTORY",
+    os.path.join(os.path.dirname(DEFAULT_REGISTRY_PATH), "verification_history.bin"),
+)
+HISTORY_MAGIC = b"CHISTRY2"
+
+# One record per submission: perceptual hash, first 8 bytes of the content digest and of the serial's
+# SHA-256 (0 when the certificate carries no serial), unix time and the image feature vector
+# (NaN where a check was off)
+HISTORY_DTYPE = np.dtype([
+    ("hash", "<u8"),
+    ("digest", "<u8"),
+    ("serial", "<u8"),
+    ("time", "<u4"),
+    ("features", "<f2", (len(FEATURE_NAMES),)),
+])
+# LSH over the 64-bit hash: 4 bands of 16 bits. A query probes each band's value and its 16 one-bit
+# neighbours, so any stored hash within 7 bits shares a probed bucket with the query.
+BANDS = 4
+BAND_BITS = 16
+# Hashes this close, with feature vectors this close, come from the same base image. Genuine certificates
+# printed from one template are that close too, so only a match of the same certificate proves reuse.
+HASH_RADIUS = 6
+FEATURE_TOLERANCE = 0.05
+# Band files hold sorted segments of this many entries (band key << 32 | row); newer rows are scanned linearly
+SEGMENT_ROWS = 2**18
+# Newest entries read from one bucket; a template shared by many genuine certificates fills its buckets
+MAX_BUCKET_ROWS = 4096
+
+ROW_MASK = np.uint64(0xFFFFFFFF)
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def _band_keys(hashes, band):
+    return (np.asarray(hashes, dtype=np.uint64) >> np.uint64(band * BAND_BITS)) & np.uint64(2**BAND_BITS - 1)
+
+
+# Function to get the probed keys of one band: the query's own value and every value one bit away
+def _probes(value, band):
+    key = int(_band_keys(np.uint64(value), band))
+    return np.array([key] + [key ^ (1 << bit) for bit in range(BAND_BITS)], dtype=np.uint64)
+
+
+def _digest_id(digest):
+    return int(digest[:16], 16) if digest else 0
+
+
+def _serial_id(serial):
+    return int(hashlib.sha256(serial.encode()).hexdigest()[:16], 16) if serial else 0
+
+
+# Append-only store of submissions with an on-disk LSH index, both memory-mapped.
+# Memory use is bounded by what a query touches, not by the number of stored submissions.
+class SubmissionHistory:
+    def __init__(self, path=None):
+        self.path = os.path.abspath(path or DEFAULT_HISTORY_PATH)
+        self.band_paths = [f"{self.path}.band{band}" for band in range(BANDS)]
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.records = np.empty(0, dtype=HISTORY_DTYPE)
+        self.bands = [np.empty(0, dtype=np.uint64) for _ in range(BANDS)]
+        if not os.path.exists(self.path):
+            try:
+                with open(self.path, "xb") as f:
+                    f.write(HISTORY_MAGIC)
+            except FileExistsError:
+                pass
+        for band_path in self.band_paths:
+            open(band_path, "ab").close()
+        with open(self.path, "rb") as f:
+            magic = f.read(len(HISTORY_MAGIC))
+        if magic != HISTORY_MAGIC:
+            raise ValueError(f"{self.path}: not a submission history")
+
+    def _refresh(self):
+        # Plain ndarray views of the maps: slicing a np.memmap subclass costs more than the searches
+        count = (os.path.getsize(self.path) - len(HISTORY_MAGIC)) // HISTORY_DTYPE.itemsize
+        if count != len(self.records):
+            self.records = (np.memmap(self.path, dtype=HISTORY_DTYPE, mode="r", offset=len(HISTORY_MAGIC),
+                                      shape=(count,)).view(np.ndarray) if count else np.empty(0, dtype=HISTORY_DTYPE))
+        # Only whole segments present in every band file count as indexed
+        segments = min(os.path.getsize(path) // 8 for path in self.band_paths) // SEGMENT_ROWS
+        if segments * SEGMENT_ROWS != len(self.bands[0]):
+            self.bands = [np.memmap(path, dtype=np.uint64, mode="r", shape=(segments * SEGMENT_ROWS,)).view(np.ndarray)
+                          if segments else np.empty(0, dtype=np.uint64) for path in self.band_paths]
+
+    def __len__(self):
+        with self.lock:
+            self._refresh()
+            return len(self.records)
+
+    # Function to append one submission. Once a full segment of rows is unindexed, it is sorted
+    # into the band files; the whole step holds a file lock so concurrent workers do not interleave.
+    def append(self, image_hash, vector, digest=None, serial=None):
+        record = np.zeros(1, dtype=HISTORY_DTYPE)
+        record["hash"] = image_hash
+        record["digest"] = _digest_id(digest)
+        record["serial"] = _serial_id(serial)
+        record["time"] = int(time.time())
+        record["features"] = np.asarray(vector, dtype=np.float16)
+        self._append_records(record)
+
+    # Function to append a block of records under the file lock and index every full segment it completes
+    def _append_records(self, records):
+        with self.lock, open(self.path, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(records.tobytes())
+            f.flush()
+            self._refresh()
+            while len(self.records) - len(self.bands[0]) >= SEGMENT_ROWS:
+                self._index_segment(len(self.bands[0]))
+
+    def _index_segment(self, start):
+        rows = np.arange(start, start + SEGMENT_ROWS, dtype=np.uint64)
+        hashes = np.asarray(self.records["hash"][start:start + SEGMENT_ROWS])
+        for band, path in enumerate(self.band_paths):
+            entries = np.sort((_band_keys(hashes, band) << np.uint64(32)) | rows)
+            with open(path, "r+b") as f:
+                f.seek(start * 8)
+                f.write(entries.tobytes())
+        self._refresh()
+
+    # Function to list stored rows whose hash is within HASH_RADIUS bits of the query
+    def _near_rows(self, image_hash):
+        candidates = []
+        indexed = len(self.bands[0])
+        for band, entries in enumerate(self.bands):
+            low = _probes(image_hash, band) << np.uint64(32)
+            for start in range(0, indexed, SEGMENT_ROWS):
+                segment = entries[start:start + SEGMENT_ROWS]
+                begins = np.searchsorted(segment, low, side="left")
+                ends = np.searchsorted(segment, low | ROW_MASK, side="right")
+                hit = ends > begins
+                for begin, end in zip(np.maximum(begins[hit], ends[hit] - MAX_BUCKET_ROWS), ends[hit]):
+                    candidates.append(segment[begin:end] & ROW_MASK)
+        rows = np.unique(np.concatenate(candidates)).astype(np.int64) if candidates else np.empty(0, np.int64)
+        if len(rows):
+            rows = rows[hamming(self.records["hash"][rows], image_hash) <= HASH_RADIUS]
+        tail = np.flatnonzero(hamming(np.asarray(self.records["hash"][indexed:]), image_hash) <= HASH_RADIUS)
+        return np.concatenate([rows, tail + indexed])
+
+    # Function to find earlier submissions of the same base image. Returns the number of distinct prior files
+    # that reuse it, the number that only look alike, and the unix time of the latest match.
+    # Reuse is an edited file of the same certificate (same serial, other content), or the same file submitted
+    # with another serial. Look-alikes carry another or no serial: certificates printed from one template.
+    # Re-uploads of the same file with the same serial count as neither.
+    def find_duplicates(self, image_hash, vector, digest=None, serial=None):
+        with self.lock:
+            self._refresh()
+            if not len(self.records):
+                return 0, 0, None
+            rows = self._near_rows(image_hash)
+            if not len(rows):
+                return 0, 0, None
+            stored = self.records[rows]
+        query = np.asarray(vector, dtype=np.float32)
+        features = stored["features"].astype(np.float32)
+        difference = np.abs(features - query) / (np.abs(features) + np.abs(query) + 1e-6)
+        comparable = np.isfinite(difference)
+        close = np.where(comparable, difference <= FEATURE_TOLERANCE, True).all(axis=1) & comparable.any(axis=1)
+        near = stored[close]
+        digest_id, serial_id = np.uint64(_digest_id(digest)), np.uint64(_serial_id(serial))
+        same_file = near["digest"] == digest_id
+        same_serial = near["serial"] == serial_id
+        known = (near["serial"] != 0) & (serial_id != 0)
+        reused = known & (same_serial != same_file)
+        similar = ~same_file & ~(known & same_serial)
+        matches = near[reused | similar]
+        if not len(matches):
+            return 0, 0, None
+        return (len(np.unique(near[reused]["digest"])), len(np.unique(near[similar]["digest"])),
+                int(matches["time"].max()))
+
+
+# Function to return this process's submission history, reopening it after a fork
+def get_submission_history(path=None):
+    path = os.path.abspath(path or DEFAULT_HISTORY_PATH)
+    with _histories_lock:
+        history = _histories.get(path)
+        if history is None or history.pid != os.getpid():
+            history = SubmissionHistory(path)
+            _histories[path] = history
+        return history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the history of verified certificates.")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH, help="History file")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Append this many random submissions (for sizing and latency tests)")
+    args = parser.parse_args(argv)
+
+    history = SubmissionHistory(args.history)
+    if args.synthetic:
+        rng = np.random.default_rng()
+        records = np.zeros(args.synthetic, dtype=HISTORY_DTYPE)
+        records["hash"] = rng.integers(0, 2**63, args.synthetic, dtype=np.uint64)
+        records["digest"] = rng.integers(1, 2**63, args.synthetic, dtype=np.uint64)
+        records["time"] = int(time.time())
+        records["features"] = rng.random((args.synthetic, len(FEATURE_NAMES)))
+        history._append_records(records)
+
+    start = time.perf_counter()
+    probe = int(history.records["hash"][-1]) if len(history) else 0
+    history.find_duplicates(probe, np.zeros(len(FEATURE_NAMES)))
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(history):,} submissions, {len(history.bands[0]):,} indexed; lookup {elapsed:.2f} ms",
+          file=sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from certificate_registry import DEFAULT_REGISTRY_PATH
+from image_pyramid import ImagePyramid
+
+# Template index lives next to the registry database; names and issuers go to a JSON-lines sidecar
+DEFAULT_INDEX_PATH = os.environ.get(
+    "CERTIFICATE_TEMPLATES",
+    os.path.join(os.path.dirname(DEFAULT_REGISTRY_PATH), "templates.idx"),
+)
+INDEX_MAGIC = b"CTPLIDX1"
+
+# Templates are described on the 1/4 pyramid level: layout survives downscaling, noise does not
+TEMPLATE_FACTOR = 4
+DCT_SIZE = 32
+HASH_SIZE = 8
+LAYOUT_GRID = 8
+# Hashes at most this many bits apart (of 64) are the same template; unrelated pages differ in about 32
+MATCH_DISTANCE = 12
+# Nearest hashes whose layout descriptors are compared to pick the best match
+CANDIDATES = 8
+
+# One fixed-size record per template: 64-bit DCT hash, issuer key id (0 = any issuer),
+# live flag (cleared on removal) and the mean luminance of an 8x8 grid of cells
+TEMPLATE_DTYPE = np.dtype([
+    ("hash", "<u8"),
+    ("issuer", "<u4"),
+    ("alive", "u1"),
+    ("layout", "u1", (LAYOUT_GRID * LAYOUT_GRID,)),
+])
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _dct_matrix(size):
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+DCT = _dct_matrix(DCT_SIZE)
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+# Perceptual hash: signs of the lowest 8x8 DCT frequencies of a 32x32 thumbnail against their median
+def perceptual_hash(gray):
+    thumbnail = np.asarray(Image.fromarray(gray).resize((DCT_SIZE, DCT_SIZE), Image.BOX), dtype=np.float64)
+    low = (DCT @ thumbnail @ DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The median of the 63 AC terms is their middle element; np.median would import numpy.ma on first use
+    ac = low[1:]
+    bits = low > np.partition(ac, ac.size // 2)[ac.size // 2]
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+# Layout descriptor: mean luminance of each cell of an 8x8 grid over the page
+def layout_descriptor(gray):
+    return np.asarray(Image.fromarray(gray).resize((LAYOUT_GRID, LAYOUT_GRID), Image.BOX), dtype=np.uint8).ravel()
+
+
+# Function to count differing bits between every stored hash and one query hash
+def hamming(hashes, value):
+    difference = np.bitwise_xor(hashes, np.uint64(value))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(difference)
+    return POPCOUNT[difference.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _issuer_id(issuer):
+    return int.from_bytes(issuer, "big") if issuer else 0
+
+
+# Reference templates in an append-only file of fixed-size records, memory-mapped for search.
+# Adding appends one record, removing clears its live flag in place, so neither rewrites the index.
+# Other processes see the changes on their next search.
+class TemplateIndex:
+    def __init__(self, path=None):
+        self.path = os.path.abspath(path or DEFAULT_INDEX_PATH)
+        self.names_path = self.path + ".jsonl"
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.records = np.empty(0, dtype=TEMPLATE_DTYPE)
+        self.names = []
+        self.names_offset = 0
+        if not os.path.exists(self.path):
+            with open(self.path, "xb") as f:
+                f.write(INDEX_MAGIC)
+        with open(self.path, "rb") as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"{self.path}: not a template index")
+
+    # Map records appended since the last call and read their names
+    def _refresh(self):
+        count = (os.path.getsize(self.path) - len(INDEX_MAGIC)) // TEMPLATE_DTYPE.itemsize
+        if count != len(self.records):
+            self.records = (np.memmap(self.path, dtype=TEMPLATE_DTYPE, mode="r", offset=len(INDEX_MAGIC),
+                                      shape=(count,)) if count else np.empty(0, dtype=TEMPLATE_DTYPE))
+        if os.path.exists(self.names_path) and os.path.getsize(self.names_path) > self.names_offset:
+            with open(self.names_path, encoding="utf-8") as f:
+                f.seek(self.names_offset)
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    entry = json.loads(line)
+                    self.names.extend([None] * (entry["id"] + 1 - len(self.names)))
+                    self.names[entry["id"]] = entry
+                    self.names_offset += len(line.encode("utf-8"))
+
+    def __len__(self):
+        with self.lock:
+            self._refresh()
+            return int(self.records["alive"].sum()) if len(self.records) else 0
+
+    # Function to add a reference template from its grayscale page; returns the template id
+    def add(self, gray, name, issuer=b""):
+        record = np.zeros(1, dtype=TEMPLATE_DTYPE)
+        record["hash"] = perceptual_hash(gray)
+        record["issuer"] = _issuer_id(issuer)
+        record["alive"] = 1
+        record["layout"] = layout_descriptor(gray)
+        with self.lock:
+            with open(self.path, "ab") as f:
+                template_id = (f.tell() - len(INDEX_MAGIC)) // TEMPLATE_DTYPE.itemsize
+                f.write(record.tobytes())
+            with open(self.names_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"id": int(template_id), "name": name, "issuer": issuer.hex()}) + "\n")
+        return int(template_id)
+
+    def remove(self, template_id):
+        with self.lock:
+            self._refresh()
+            if not 0 <= template_id < len(self.records):
+                raise KeyError(template_id)
+            writable = np.memmap(self.path, dtype=TEMPLATE_DTYPE, mode="r+", offset=len(INDEX_MAGIC),
+                                 shape=(len(self.records),))
+            writable["alive"][template_id] = 0
+            writable.flush()
+            del writable
+
+    # Function to find the nearest live template to a grayscale page, optionally among one issuer's templates.
+    # Returns None when the index holds no candidate, else the template with its hash and layout distances.
+    def search(self, gray, issuer=None):
+        query_hash = perceptual_hash(gray)
+        query_layout = layout_descriptor(gray).astype(np.int16)
+        with self.lock:
+            self._refresh()
+            records = self.records
+            if not len(records):
+                return None
+            distances = hamming(records["hash"], query_hash).astype(np.int32)
+            excluded = records["alive"] == 0
+            if issuer:
+                excluded |= (records["issuer"] != _issuer_id(issuer)) & (records["issuer"] != 0)
+            distances[excluded] = np.iinfo(np.int32).max
+            count = min(CANDIDATES, len(distances))
+            candidates = np.argpartition(distances, count - 1)[:count]
+            candidates = candidates[distances[candidates] != np.iinfo(np.int32).max]
+            if not len(candidates):
+                return None
+            layouts = np.abs(records["layout"][candidates].astype(np.int16) - query_layout).mean(axis=1)
+            best = min(range(len(candidates)), key=lambda i: (distances[candidates[i]], layouts[i]))
+            template_id = int(candidates[best])
+            entry = self.names[template_id] if template_id < len(self.names) and self.names[template_id] else {}
+        return {
+            "id": template_id,
+            "name": entry.get("name", f"template {template_id}"),
+            "issuer": entry.get("issuer", ""),
+            "distance": int(distances[template_id]),
+            "layout_distance": float(layouts[best]),
+            "matched": bool(distances[template_id] <= MATCH_DISTANCE),
+        }
+
+
+# Function to return this process's template index, reopening it after a fork; None when no index exists
+def get_template_index(path=None):
+    path = os.path.abspath(path or DEFAULT_INDEX_PATH)
+    if not os.path.exists(path):
+        return None
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.pid != os.getpid():
+            index = TemplateIndex(path)
+            _indexes[path] = index
+        return index
+
+
+# Function to read a template image file at the level templates are described on
+def template_gray(path):
+    with open(path, "rb") as f:
+        return ImagePyramid(f.read()).gray(TEMPLATE_FACTOR)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the index of official certificate templates.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index file (default: templates.idx)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Add reference templates")
+    add.add_argument("images", nargs="+", help="Blank or sample certificates of the template")
+    add.add_argument("--name", default=None, help="Template name (default: the file name)")
+    add.add_argument("--issuer", default="", help="Hex key id of the issuer (as printed in QR payloads)")
+    remove = commands.add_parser("remove", help="Remove templates by id")
+    remove.add_argument("ids", nargs="+", type=int)
+    search = commands.add_parser("search", help="Find the nearest template of certificate images")
+    search.add_argument("images", nargs="+")
+    search.add_argument("--issuer", default="", help="Only consider this issuer's templates")
+    args = parser.parse_args(argv)
+
+    index = TemplateIndex(args.index)
+    if args.command == "add":
+        for path in args.images:
+            name = args.name or os.path.splitext(os.path.basename(path))[0]
+            template_id = index.add(template_gray(path), name, bytes.fromhex(args.issuer))
+            print(f"Added {path} as template {template_id} ({name})")
+    elif args.command == "remove":
+        for template_id in args.ids:
+            index.remove(template_id)
+        print(f"Removed {len(args.ids)} template(s); {len(index):,} left")
+    else:
+        for path in args.images:
+            start = time.perf_counter()
+            match = index.search(template_gray(path), bytes.fromhex(args.issuer))
+            match = dict(match or {}, path=path, search_ms=round((time.perf_counter() - start) * 1000, 3))
+            sys.stdout.write(json.dumps(match) + "\n")
+
+
+if __name__ == "__main__":
+    main()
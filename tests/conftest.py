@@ -0,0 +1,34 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The engine modules read their state paths from the environment when imported, so every test session points
+# the registry, cache, history, audit log and template index at a scratch directory before importing them
+STATE_DIR = tempfile.mkdtemp(prefix="certificate-tests-")
+STATE_FILES = {
+    "CERTIFICATE_REGISTRY": "certificates.db",
+    "CERTIFICATE_RESULT_CACHE": "verification_cache.db",
+    "CERTIFICATE_HISTORY": "verification_history.bin",
+    "CERTIFICATE_AUDIT_LOG": "verification_audit.db",
+    "CERTIFICATE_TEMPLATES": "templates.idx",
+}
+for variable, name in STATE_FILES.items():
+    os.environ[variable] = os.path.join(STATE_DIR, name)
+os.environ.pop("CERTIFICATE_TRIAGE", None)
+os.environ.pop("CERTIFICATE_TRACE", None)
+os.environ.pop("CERTIFICATE_PROFILE", None)
+
+from registry_import import import_rows  # noqa: E402
+
+# The scratch registry starts empty, with its tables in place
+import_rows([], os.environ["CERTIFICATE_REGISTRY"])
+
+
+@pytest.fixture
+def registry_path():
+    return os.environ["CERTIFICATE_REGISTRY"]
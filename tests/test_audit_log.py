@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+from audit_log import AuditLog, rebuild_rollups, resolving_tier
+
+
+def _report(verdict, tier="coarse"):
+    return {"verdict": verdict, "is_real": verdict == "genuine", "confidence": 0.5, "check_scores": {},
+            "timings": {}, "cached": False, "triage": {"tier": tier} if tier else None}
+
+
+@pytest.fixture
+def audit_path(tmp_path):
+    return str(tmp_path / "audit.db")
+
+
+def test_rollups_count_each_verdict(audit_path):
+    log = AuditLog(audit_path)
+    for verdict in ("genuine", "genuine", "fraudulent", "unverifiable", "unverifiable", "unverifiable"):
+        log.record(_report(verdict))
+    log.close()
+    (_, genuine, fraudulent, unverifiable), = AuditLog(audit_path).totals("day", 1)
+    assert (genuine, fraudulent, unverifiable) == (2, 1, 3)
+    assert AuditLog(audit_path).totals("month", 1)[0][1:] == (2, 1, 3)
+
+
+def test_rebuild_matches_incremental_rollups(audit_path):
+    log = AuditLog(audit_path)
+    for verdict in ("genuine", "fraudulent", "unverifiable", "fraudulent"):
+        log.record(_report(verdict))
+    log.close()
+    before = AuditLog(audit_path).totals("day", 1)
+    connection = sqlite3.connect(audit_path)
+    connection.execute("UPDATE audit_daily SET genuine = 0, fraudulent = 0, unverifiable = 0")
+    connection.commit()
+    connection.close()
+    rebuild_rollups(audit_path)
+    assert AuditLog(audit_path).totals("day", 1) == before
+
+
+def test_session_records_a_file_once(audit_path):
+    log = AuditLog(audit_path)
+    log.record(_report("genuine"), digest="d1", session="s1")
+    log.record(_report("genuine"), digest="d1", session="s1")
+    log.record(_report("genuine"), digest="d1", session="s2")
+    log.record(_report("genuine"), digest="d1")
+    log.close()
+    assert AuditLog(audit_path).totals("day", 1)[0][1] == 3
+
+
+def test_tier_counts(audit_path):
+    log = AuditLog(audit_path)
+    for tier in ("header", "coarse", "coarse", None):
+        log.record(_report("fraudulent", tier))
+    log.close()
+    assert AuditLog(audit_path).tier_counts(1) == {"header": 1, "coarse": 2}
+    assert resolving_tier(_report("genuine", None)) is None
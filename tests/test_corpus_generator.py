@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from certificate_registry import DEFAULT_REGISTRY_PATH
+from corpus_generator import generate_corpus, new_issuer_key, render_sample
+
+SHIPPED_REGISTRY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "certificates.db")
+
+
+@pytest.mark.parametrize("path", [SHIPPED_REGISTRY, DEFAULT_REGISTRY_PATH])
+def test_the_app_registry_is_refused(tmp_path, path):
+    with pytest.raises(ValueError, match="app's registry"):
+        generate_corpus(str(tmp_path / "corpus"), 1, registry_path=path)
+    assert not (tmp_path / "corpus").exists()
+
+
+def test_issuer_keys_are_random():
+    assert new_issuer_key() != new_issuer_key()
+    first = render_sample(0, seed=0)[1]["record"][4]
+    second = render_sample(0, seed=0)[1]["record"][4]
+    assert first != second
+
+
+def test_pasted_serial_differs_from_the_issued_one():
+    key = new_issuer_key()
+    for index in range(200):
+        _, info = render_sample(index, seed=0, issuer_key=key)
+        if info["forgery"] == "pasted_serial":
+            issued = info["record"][0]
+            assert info["serial"] != issued and len(info["serial"]) == len(issued)
+            return
+    pytest.fail("no pasted_serial sample in the first 200")
@@ -0,0 +1,42 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_features import CHECK_FACTORS, FEATURE_NAMES, extract_image_features
+from image_pyramid import ImagePyramid
+
+# Tall page whose full, 1/2 and 1/4 levels exceed this cap and are analyzed in many bands, while the 1/8 level
+# still fits. Neither side is a multiple of the band or block size, so the last band and the block grid are ragged.
+SIZE = (600, 2210)
+SPILL_CAP = 2_000_000
+
+
+def _page(mode, file_format):
+    rng = np.random.default_rng(7)
+    width, height = SIZE
+    rows, columns = np.mgrid[0:height, 0:width]
+    pixels = np.stack([(columns * 255 // width), (rows * 255 // height), ((rows // 40 + columns // 40) % 2) * 200], -1)
+    pixels = np.clip(pixels + rng.integers(-20, 21, pixels.shape), 0, 255).astype(np.uint8)
+    pixels[900:1300, 150:450] = rng.integers(0, 256, (400, 300, 3))
+    image = Image.fromarray(pixels).convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format=file_format, **({"quality": 85} if file_format == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("mode, file_format", [("RGB", "PNG"), ("L", "PNG"), ("RGB", "JPEG")])
+def test_banded_features_equal_whole_image_features(mode, file_format):
+    data = _page(mode, file_format)
+    whole = ImagePyramid(data)
+    banded = ImagePyramid(data, max_bytes=SPILL_CAP)
+    assert not whole.spilled
+    assert all(banded.is_spilled(factor) for factor in (1, 2, 4)) and not banded.is_spilled(8)
+
+    expected = extract_image_features(whole, CHECK_FACTORS)
+    actual = extract_image_features(banded, CHECK_FACTORS)
+    assert len(list(banded.bands(1))) > 1
+    assert sorted(actual) == sorted(expected) == sorted(FEATURE_NAMES)
+    for name in FEATURE_NAMES:
+        assert actual[name] == pytest.approx(expected[name], rel=1e-5, abs=1e-9), name
@@ -0,0 +1,51 @@
+import io
+
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+
+import certificate_engine
+from certificate_engine import VECTOR_PAGES_REASON, CertificateFile, run_pipeline
+from pdf_pages import PdfDocument
+from sample_certificates import generate_sample_certificate
+
+
+# Function to build a PDF whose pages are the given images, with None standing for a page without any image
+def _pdf(pages):
+    writer = PdfWriter()
+    for image in pages:
+        if image is None:
+            writer.add_blank_page(width=612, height=792)
+            continue
+        buffer = io.BytesIO()
+        image.save(buffer, format="PDF", resolution=150)
+        writer.add_page(PdfReader(buffer).pages[0])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def test_every_page_is_analyzed():
+    pages = [Image.new("RGB", (96, 64), (shade, shade, shade)) for shade in range(0, 240, 4)]
+    document = PdfDocument(_pdf(pages))
+    assert document.page_count == 60
+    assert [number for number, _ in document.iter_page_images()] == list(range(1, 61))
+    _, _, summary = certificate_engine._analyze_pdf_pages(PdfDocument(_pdf(pages)), None, ["security_features"])
+    assert summary["pages_analyzed"] == 60 and summary["vector_pages"] == []
+
+
+def test_vector_only_pages_are_listed():
+    img, _ = generate_sample_certificate(True, 3)
+    document = PdfDocument(_pdf([None, img, None]))
+    assert [number for number, _ in document.iter_page_images()] == [2]
+    assert document.vector_pages == {1, 3}
+
+    report = run_pipeline(CertificateFile(_pdf([img, None]), name="mixed.pdf"), use_cache=False, persist=False)
+    assert report["image_stats"]["pages_analyzed"] == 1 and report["image_stats"]["vector_pages"] == [2]
+    assert any("vector-only" in issue and issue.endswith(": 2") for issue in report["issues"])
+
+
+def test_pdf_with_only_vector_pages_is_unverifiable():
+    report = run_pipeline(CertificateFile(_pdf([None, None]), name="vector.pdf"), use_cache=False, persist=False)
+    assert report["verdict"] == "unverifiable" and not report["is_real"]
+    assert report["issues"] == [VECTOR_PAGES_REASON]
+    assert report["image_stats"]["vector_pages"] == [1, 2]
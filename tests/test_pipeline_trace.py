@@ -0,0 +1,48 @@
+import cProfile
+import threading
+
+import pipeline_trace
+
+
+def _trace_in_thread(entered, release, results):
+    with pipeline_trace.request_trace("verify", profile=("cprofile",)) as trace:
+        entered.set()
+        release.wait(5)
+    results.append(trace.root.attributes)
+
+
+def test_overlapping_traces_share_one_cprofile():
+    first_in, second_in, release = threading.Event(), threading.Event(), threading.Event()
+    first, second = [], []
+    threads = [threading.Thread(target=_trace_in_thread, args=(first_in, release, first))]
+    threads[0].start()
+    assert first_in.wait(5)
+    threads.append(threading.Thread(target=_trace_in_thread, args=(second_in, release, second)))
+    threads[1].start()
+    assert second_in.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert "profile.cprofile" in first[0]
+    assert second[0].get("profile.cprofile_skipped") is True
+    assert "profile.cprofile" not in second[0]
+
+    # Released once the holder finishes, so the next request profiles again
+    with pipeline_trace.request_trace("verify", profile=("cprofile",)) as trace:
+        pass
+    assert "profile.cprofile" in trace.root.attributes
+    assert not trace.root.attributes.get("profile.cprofile_skipped")
+
+
+def test_cprofile_skipped_when_another_profiler_is_active():
+    outside = cProfile.Profile()
+    outside.enable()
+    try:
+        with pipeline_trace.request_trace("verify", profile=("cprofile",)) as trace:
+            pass
+    finally:
+        outside.disable()
+    # Python 3.12+ refuses a second profiler; earlier versions let the request take over its thread
+    attributes = trace.root.attributes
+    assert ("profile.cprofile" in attributes) != bool(attributes.get("profile.cprofile_skipped"))
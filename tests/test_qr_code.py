@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from qr_code import QR_MODULES, QrPayload, decode_modules, encode_modules, read_qr
+
+PAYLOAD = QrPayload("CERT-2024-001234", bytes.fromhex("0a1b2c3d"), bytes(range(64)))
+MODULE_PX = 4
+QUIET = 4
+
+
+# Function to render a module grid as an 8-bit page with a quiet zone around it
+def _page(grid, module_px=MODULE_PX):
+    image = np.where(np.kron(grid, np.ones((module_px, module_px), dtype=bool)), 0, 255).astype(np.uint8)
+    return np.pad(image, QUIET * module_px, constant_values=255)
+
+
+def test_payload_round_trip():
+    decoded = decode_modules(encode_modules(PAYLOAD))
+    assert (decoded.serial, decoded.key_id, decoded.signature) == (PAYLOAD.serial, PAYLOAD.key_id, PAYLOAD.signature)
+
+
+@pytest.mark.parametrize("module_px", [2, 3, 5])
+def test_read_qr_from_page(module_px):
+    payload, found = read_qr(_page(encode_modules(PAYLOAD), module_px))
+    assert found
+    assert payload.serial == PAYLOAD.serial and payload.signature == PAYLOAD.signature
+
+
+def test_tampered_module_is_found_but_not_decoded():
+    grid = encode_modules(PAYLOAD)
+    grid[QR_MODULES // 2, QR_MODULES // 2] ^= True
+    assert decode_modules(grid) is None
+    assert read_qr(_page(grid)) == (None, True)
+
+
+def test_other_codes_are_not_read():
+    # Same finders, but the data area about half dark, as in a standard QR code
+    grid = encode_modules(PAYLOAD)
+    data = np.ones_like(grid)
+    for row, col in [(0, 0), (0, QR_MODULES - 8), (QR_MODULES - 8, 0)]:
+        data[row:row + 8, col:col + 8] = False
+    grid[data] = np.random.default_rng(0).random(int(data.sum())) < 0.5
+    assert read_qr(_page(grid)) == (None, False)
+    assert read_qr(np.full((200, 200), 255, dtype=np.uint8)) == (None, False)
@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import pytest
+
+from certificate_registry import get_registry, lookup_certificate, lookup_issuer, normalize_serial
+from certificate_signatures import key_id
+from registry_import import import_rows, read_csv_rows, read_jsonl_rows, register_issuer
+
+SHIPPED_REGISTRY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "certificates.db")
+
+
+def test_lookup_finds_imported_record(registry_path):
+    import_rows([("REG-1", "Priya Patel", "Data Science", "2024-05-01", "ab" * 64)], registry_path)
+    record = lookup_certificate("Serial: REG-1")
+    assert record == {"id": "REG-1", "name": "Priya Patel", "course": "Data Science", "date": "2024-05-01",
+                      "signature": "ab" * 64}
+    assert normalize_serial(" Serial:  REG-1 ") == "REG-1"
+
+
+def test_miss_is_not_cached(registry_path):
+    assert lookup_certificate("REG-2") is None
+    import_rows([("REG-2", "Arjun Nair", "Web Development", "2023-01-10", None)], registry_path)
+    assert lookup_certificate("REG-2")["name"] == "Arjun Nair"
+
+
+def test_cached_record_is_dropped_when_the_registry_changes(registry_path):
+    import_rows([("REG-3", "Isha Das", "Cloud Computing", "2022-09-09", None)], registry_path)
+    assert lookup_certificate("REG-3")["course"] == "Cloud Computing"
+    import_rows([("REG-3", "Isha Das", "Cyber Security", "2022-09-09", None)], registry_path)
+    assert lookup_certificate("REG-3")["course"] == "Cyber Security"
+
+
+def test_register_issuer(registry_path):
+    public_key = bytes(range(32))
+    register_issuer(public_key, "Example University", registry_path)
+    issuer = lookup_issuer(key_id(public_key).hex())
+    assert issuer["name"] == "Example University"
+    assert issuer["public_key"] == public_key.hex()
+
+
+def test_lookups_leave_the_registry_file_unchanged(tmp_path):
+    path = str(tmp_path / "certificates.db")
+    shutil.copyfile(SHIPPED_REGISTRY, path)
+    with open(path, "rb") as f:
+        before = f.read()
+    assert lookup_certificate("UNKNOWN", path) is None
+    # The shipped registry has no issuers table yet: an unknown issuer, not an error
+    assert lookup_issuer("00000000", path) is None
+    get_registry(path).close()
+    with open(path, "rb") as f:
+        assert f.read() == before
+    assert sorted(os.listdir(tmp_path)) == ["certificates.db"]
+
+
+def test_csv_columns_are_mapped_by_header(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_text("course,id,name\nData Science,C-1,Meera Iyer\n", encoding="utf-8")
+    assert list(read_csv_rows(str(path))) == [("C-1", "Meera Iyer", "Data Science", None, None)]
+
+
+def test_csv_row_without_id_is_rejected(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_text("id,name\n,Nobody\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="without an id"):
+        list(read_csv_rows(str(path)))
+
+
+def test_jsonl_rows(tmp_path):
+    path = tmp_path / "export.jsonl"
+    path.write_text('{"id": 42, "name": "Kabir Joshi", "date": "2021-03-03"}\n\n', encoding="utf-8")
+    assert list(read_jsonl_rows(str(path))) == [("42", "Kabir Joshi", None, "2021-03-03", None)]
@@ -0,0 +1,65 @@
+import io
+import sqlite3
+
+from PIL.PngImagePlugin import PngInfo
+
+from certificate_engine import CertificateFile, run_pipeline
+from registry_import import import_rows
+from result_cache import ResultCache, cache_key
+from sample_certificates import generate_sample_certificate
+
+REGISTRY_MISS = "Serial number not found in the certificate registry"
+
+
+def _certificate(serial, seed=1):
+    img, _ = generate_sample_certificate(True, seed)
+    metadata = PngInfo()
+    metadata.add_text("Serial", serial)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", pnginfo=metadata)
+    return CertificateFile(buffer.getvalue(), name=f"{serial}.png")
+
+
+def test_cache_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.db"))
+    key = cache_key("digest", {"id_verification": True, "qr_verification": False}, "v1")
+    assert cache.get(key) is None
+    cache.put(key, {"is_real": True})
+    assert cache.get(key) == {"is_real": True}
+    # A fresh process reads it back from disk
+    assert ResultCache(str(tmp_path / "cache.db")).get(key) == {"is_real": True}
+
+
+def test_cache_key_depends_on_enabled_checks():
+    assert cache_key("d", {"a": True, "b": False}, "v") != cache_key("d", {"a": True, "b": True}, "v")
+    assert cache_key("d", {"b": False, "a": True}, "v") == cache_key("d", {"a": True}, "v")
+
+
+def test_import_after_a_registry_miss_changes_the_cached_verdict(registry_path):
+    certificate = _certificate("CACHE-1")
+    first = run_pipeline(certificate, persist=False)
+    assert first["verdict"] == "fraudulent" and REGISTRY_MISS in first["issues"]
+    again = run_pipeline(certificate, persist=False)
+    assert again["cached"] and again["verdict"] == "fraudulent"
+
+    import_rows([("CACHE-1", "Sample Document", "Authenticity", "2024-01-01", None)], registry_path)
+    after = run_pipeline(certificate, persist=False)
+    assert not after["cached"]
+    assert REGISTRY_MISS not in after["issues"]
+    assert after["verdict"] == "genuine"
+    assert run_pipeline(certificate, persist=False, use_cache=False)["verdict"] == "genuine"
+
+
+def test_revocation_with_another_tool_invalidates_cached_verdicts(registry_path):
+    import_rows([("CACHE-2", "Sample Document", "Authenticity", "2024-01-01", None)], registry_path)
+    certificate = _certificate("CACHE-2", seed=2)
+    assert run_pipeline(certificate, persist=False)["verdict"] == "genuine"
+    assert run_pipeline(certificate, persist=False)["cached"]
+
+    connection = sqlite3.connect(registry_path)
+    connection.execute("DELETE FROM certificates WHERE id = 'CACHE-2'")
+    connection.commit()
+    connection.close()
+    revoked = run_pipeline(certificate, persist=False)
+    assert not revoked["cached"]
+    assert revoked["verdict"] == "fraudulent" and REGISTRY_MISS in revoked["issues"]
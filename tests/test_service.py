@@ -0,0 +1,73 @@
+import asyncio
+import io
+
+import pytest
+from aiohttp import FormData
+from aiohttp.test_utils import TestClient, TestServer
+
+import verification_service
+from sample_certificates import generate_sample_certificate
+from verification_service import create_app
+
+
+@pytest.fixture(scope="module")
+def png():
+    img, _ = generate_sample_certificate(True, 1)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# Function to send one request to a fresh app; returns the status, the JSON body and the app
+def _post(path, app=None, **kwargs):
+    app = app or create_app(workers=1, queue_size=2)
+
+    async def send():
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(path, **kwargs)
+            return response.status, await response.json()
+
+    status, body = asyncio.run(send())
+    return status, body, app
+
+
+def _batch(png, count):
+    form = FormData()
+    for index in range(count):
+        form.add_field("file", png, filename=f"certificate_{index}.png", content_type="image/png")
+    return form
+
+
+def test_verify_returns_the_report_and_frees_the_slot(png):
+    status, body, app = _post("/verify?name=cert.png", data=png, headers={"Content-Type": "image/png"})
+    assert status == 200 and body["verdict"] in ("genuine", "fraudulent", "unverifiable")
+    assert app["queue"].in_flight == 0
+
+
+def test_full_queue_is_rejected_before_the_body_is_read(png):
+    app = create_app(workers=1, queue_size=2)
+    app["queue"].in_flight = 2
+    status, body, _ = _post("/verify", app, data=png, headers={"Content-Type": "image/png"})
+    assert status == 429 and "full" in body["error"]
+    assert app["queue"].in_flight == 2 and app["metrics"].rejected == 1
+
+
+def test_batch_stops_reading_when_the_queue_runs_out(png):
+    app = create_app(workers=1, queue_size=2)
+    app["queue"].in_flight = 1
+    status, _, _ = _post("/verify/batch", app, data=_batch(png, 2))
+    assert status == 429
+    assert app["queue"].in_flight == 1
+
+
+def test_batch_larger_than_the_queue_is_too_large(png):
+    status, body, app = _post("/verify/batch", data=_batch(png, 3))
+    assert status == 413 and "capacity" in body["error"]
+    assert app["queue"].in_flight == 0
+
+
+def test_oversized_upload_is_rejected_on_its_content_length(monkeypatch, png):
+    monkeypatch.setattr(verification_service, "MAX_UPLOAD_BYTES", len(png) - 1)
+    status, body, app = _post("/verify", data=png, headers={"Content-Type": "image/png"})
+    assert status == 413 and "exceeds" in body["error"]
+    assert app["queue"].in_flight == 0
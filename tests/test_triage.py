@@ -0,0 +1,49 @@
+import io
+
+import pytest
+from PIL.PngImagePlugin import PngInfo
+
+from certificate_engine import CertificateFile, run_pipeline
+from registry_import import import_rows
+from sample_certificates import generate_sample_certificate
+
+ID_ONLY = {"id_verification": True, "qr_verification": False, "security_features": False, "integrity_check": False}
+# Cutoffs no score crosses: every certificate goes through every tier unless a check finds a hard failure
+NEVER_SETTLE = {"header": (-1.0, 2.0), "coarse": (-1.0, 2.0)}
+
+
+def _png(serial, seed=1):
+    img, _ = generate_sample_certificate(True, seed)
+    metadata = PngInfo()
+    metadata.add_text("Serial", serial)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", pnginfo=metadata)
+    return CertificateFile(buffer.getvalue(), name=f"{serial}.png")
+
+
+def test_header_accepts_only_when_the_registry_answers_every_check(registry_path):
+    import_rows([("TRIAGE-1", "Sample Document", "Authenticity", "2024-01-01", None)], registry_path)
+    certificate = _png("TRIAGE-1")
+    id_only = run_pipeline(certificate, ID_ONLY, use_cache=False, triage=True, persist=False)
+    assert id_only["triage"]["tier"] == "header" and id_only["verdict"] == "genuine"
+    # With pixel checks enabled a registered serial alone settles nothing
+    everything = run_pipeline(certificate, use_cache=False, triage=True, persist=False)
+    assert everything["triage"]["tier"] != "header"
+
+
+def test_unissued_serial_is_rejected_by_the_header():
+    report = run_pipeline(_png("TRIAGE-UNISSUED"), use_cache=False, triage=True, persist=False)
+    assert report["triage"]["tier"] == "header" and report["verdict"] == "fraudulent"
+
+
+@pytest.mark.parametrize("is_real", [True, False])
+def test_pdf_cascade_scores_match_the_full_analysis(is_real):
+    img, _ = generate_sample_certificate(is_real, 5)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PDF", resolution=150)
+    certificate = CertificateFile(buffer.getvalue(), name="certificate.pdf")
+    full = run_pipeline(certificate, use_cache=False, triage=False, persist=False)
+    cascade = run_pipeline(certificate, use_cache=False, triage=NEVER_SETTLE, persist=False)
+    assert cascade["triage"]["tier"] == "full"
+    assert cascade["check_scores"] == pytest.approx(full["check_scores"])
+    assert cascade["verdict"] == full["verdict"]
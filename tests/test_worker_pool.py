@@ -0,0 +1,45 @@
+import io
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from certificate_engine import CertificateFile, discard_worker_pool, get_worker_pool, verify_batch
+from sample_certificates import generate_sample_certificate
+
+
+def _break(pool):
+    # A worker that exits mid-task breaks the whole pool, as one killed for running out of memory does
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+
+
+def _certificates(count):
+    certificates = []
+    for seed in range(count):
+        img, _ = generate_sample_certificate(True, seed)
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        certificates.append(CertificateFile(buffer.getvalue(), name=f"certificate_{seed}.png"))
+    return certificates
+
+
+def test_a_broken_pool_is_replaced():
+    pool = get_worker_pool(2)
+    assert get_worker_pool(2) is pool
+    _break(pool)
+    assert discard_worker_pool(pool) == 2
+    fresh = get_worker_pool(2)
+    assert fresh is not pool
+    assert fresh.submit(abs, -3).result() == 3
+    # Only shared pools are discarded
+    assert discard_worker_pool(pool) is None
+
+
+def test_verify_batch_runs_on_fresh_workers_after_a_crash():
+    pool = get_worker_pool(2)
+    _break(pool)
+    reports = list(verify_batch(_certificates(3), workers=2, use_cache=False, executor=pool, triage=False))
+    assert sorted(report["index"] for report in reports) == [0, 1, 2]
+    assert not any("error" in report for report in reports)
+    assert get_worker_pool(2) is not pool
@@ -0,0 +1,330 @@
+import argparse
+import asyncio
+import functools
+import os
+import time
+from collections import Counter
+from concurrent.futures.process import BrokenProcessPool
+
+from aiohttp import web
+
+from audit_log import resolving_tier
+from certificate_engine import (
+    DEFAULT_CHECKS,
+    CertificateFile,
+    discard_worker_pool,
+    get_worker_pool,
+    resolve_checks,
+    verify_certificate,
+    warm_up,
+)
+
+DEFAULT_TIMEOUT = 30.0
+# Certificates admitted per worker before new requests are turned away with 429
+DEFAULT_QUEUE_PER_WORKER = 8
+MAX_UPLOAD_BYTES = 64 * 2**20
+
+
+# Bounded admission queue: a request takes one slot per certificate or is rejected outright
+class AdmissionQueue:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.in_flight = 0
+
+    def try_acquire(self, slots):
+        if self.in_flight + slots > self.capacity:
+            return False
+        self.in_flight += slots
+        return True
+
+    def release(self, slots):
+        self.in_flight -= slots
+
+
+# Counters exported on /metrics in the Prometheus text format
+class Metrics:
+    def __init__(self):
+        self.requests = Counter()
+        self.verdicts = Counter()
+        self.tiers = Counter()
+        self.rejected = 0
+        self.timeouts = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def render(self, queue):
+        lines = [
+            "# TYPE verification_requests_total counter",
+            *(f'verification_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+              for (endpoint, status), count in sorted(self.requests.items())),
+            "# TYPE verification_certificates_total counter",
+            *(f'verification_certificates_total{{verdict="{verdict}"}} {count}'
+              for verdict, count in sorted(self.verdicts.items())),
+            "# TYPE verification_triage_tier_total counter",
+            *(f'verification_triage_tier_total{{tier="{tier}"}} {count}'
+              for tier, count in sorted(self.tiers.items())),
+            "# TYPE verification_rejected_total counter",
+            f"verification_rejected_total {self.rejected}",
+            "# TYPE verification_timeouts_total counter",
+            f"verification_timeouts_total {self.timeouts}",
+            "# TYPE verification_latency_seconds summary",
+            f"verification_latency_seconds_sum {self.latency_sum:.6f}",
+            f"verification_latency_seconds_count {self.latency_count}",
+            "# TYPE verification_queue_in_flight gauge",
+            f"verification_queue_in_flight {queue.in_flight}",
+            "# TYPE verification_queue_capacity gauge",
+            f"verification_queue_capacity {queue.capacity}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+# Function to read enabled checks from the query string, e.g. ?disable=qr_verification,security_features
+def _checks_from_query(request):
+    disabled = [name for name in request.query.get("disable", "").split(",") if name]
+    return resolve_checks({name: False for name in disabled})
+
+
+def _verdict(report):
+    if "error" in report:
+        return "error"
+    return report["verdict"]
+
+
+# Raised while reading a request that is turned away before its body is read in full
+class Rejected(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def _read_part(part, budget):
+    chunks = []
+    while True:
+        chunk = await part.read_chunk()
+        if not chunk:
+            break
+        budget -= len(chunk)
+        if budget < 0:
+            raise Rejected(413, f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks), budget
+
+
+# Function to read the certificates of a request. admit(count) is called before each multipart upload
+# is read, so a batch stops being read as soon as the queue has no slot for its next certificate.
+async def _read_certificates(request, admit):
+    if request.content_type.startswith("multipart/"):
+        certificates = []
+        budget = MAX_UPLOAD_BYTES
+        reader = await request.multipart()
+        async for part in reader:
+            if part.filename is None:
+                continue
+            admit(len(certificates) + 1)
+            data, budget = await _read_part(part, budget)
+            content_type = part.headers.get("Content-Type")
+            if content_type == "application/octet-stream":
+                content_type = None
+            certificates.append(CertificateFile(data, name=part.filename, type=content_type))
+        return certificates
+    try:
+        data = await request.read()
+    except web.HTTPRequestEntityTooLarge:
+        raise Rejected(413, f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+    content_type = request.content_type if request.content_type != "application/octet-stream" else None
+    return [CertificateFile(data, name=request.query.get("name", ""), type=content_type)] if data else []
+
+
+# Function to report a certificate whose verification raised instead of failing the whole batch
+def _error_report(certificate, exc):
+    return {"name": certificate.name, "size": certificate.size, "type": certificate.type,
+            "error": f"{type(exc).__name__}: {exc}"}
+
+
+# Function to replace the app's pool after a worker died and broke it (BrokenProcessPool). Requests still
+# holding the broken pool find it already replaced.
+def _replace_pool(app, broken):
+    if app["pool"] is broken:
+        discard_worker_pool(broken)
+        app["pool"] = get_worker_pool(app["workers"])
+    return app["pool"]
+
+
+# Function to submit one certificate to the pool. Its queue slot is released when the worker is done with it,
+# not when the request returns: after a timeout the slot stays taken until the work really stops.
+# A pool broken by an earlier request is replaced before submitting; one that breaks under this certificate
+# fails it and is replaced for the next requests.
+def _submit(app, loop, certificate, checks):
+    release = functools.partial(app["queue"].release, 1)
+    task = functools.partial(verify_certificate, certificate, checks, app["use_cache"], persist=app["persist"])
+    pool = app["pool"]
+    try:
+        try:
+            future = pool.submit(task)
+        except BrokenProcessPool:
+            pool = _replace_pool(app, pool)
+            future = pool.submit(task)
+    except Exception as exc:
+        # A broken or shut down pool: nothing runs, so the slot is free again
+        release()
+        failed = loop.create_future()
+        failed.set_exception(exc)
+        return failed
+
+    def done(future):
+        release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            _replace_pool(app, pool)
+
+    future.add_done_callback(lambda future: loop.is_closed() or loop.call_soon_threadsafe(done, future))
+    return asyncio.wrap_future(future, loop=loop)
+
+
+# Function to verify the certificates of one request. On timeout the pending ones are cancelled (queued
+# work never starts); a certificate that raised gets an error report of its own.
+async def _verify_all(request, certificates):
+    app = request.app
+    loop = asyncio.get_running_loop()
+    checks = _checks_from_query(request)
+    tasks = [_submit(app, loop, certificate, checks) for certificate in certificates]
+    start = time.perf_counter()
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=app["timeout"])
+    finally:
+        app["metrics"].latency_sum += time.perf_counter() - start
+        app["metrics"].latency_count += 1
+    reports = [_error_report(certificate, result) if isinstance(result, BaseException) else result
+               for certificate, result in zip(certificates, results)]
+    for report in reports:
+        app["metrics"].verdicts[_verdict(report)] += 1
+        # Cache hits (with --result-cache) replay a verdict some tier settled earlier
+        if "error" not in report and not report["cached"] and resolving_tier(report) is not None:
+            app["metrics"].tiers[resolving_tier(report)] += 1
+    return reports
+
+
+# Shared request flow: take a queue slot (429 when full) before reading anything, read the uploads with one
+# slot per certificate, then run them on the pool with a timeout (504). An upload larger than the limit is
+# turned away on its Content-Length (413). The slots are given back one by one as the workers finish
+# (see _submit), or all at once when the request is turned away.
+async def _handle(request, endpoint, single):
+    app = request.app
+    queue = app["queue"]
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        return _respond(app, endpoint, web.json_response(
+            {"error": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"}, status=413
+        ))
+    if not queue.try_acquire(1):
+        app["metrics"].rejected += 1
+        return _respond(app, endpoint, _queue_full())
+    held = 1
+
+    def admit(count):
+        nonlocal held
+        if count <= held:
+            return
+        if count > queue.capacity:
+            raise Rejected(413, f"Batch larger than the queue capacity ({queue.capacity} certificates)")
+        if not queue.try_acquire(1):
+            app["metrics"].rejected += 1
+            raise Rejected(429, "Verification queue is full, retry later")
+        held += 1
+
+    try:
+        try:
+            certificates = await _read_certificates(request, admit)
+        except Rejected as exc:
+            response = _queue_full() if exc.status == 429 else web.json_response({"error": str(exc)}, status=exc.status)
+            return _respond(app, endpoint, response)
+        except ValueError as exc:
+            return _respond(app, endpoint, web.json_response({"error": str(exc)}, status=400))
+        if not certificates or (single and len(certificates) != 1):
+            message = "Send exactly one certificate" if single else "Send at least one certificate"
+            return _respond(app, endpoint, web.json_response({"error": message}, status=400))
+        # From here each certificate's slot is released when its worker is done with it
+        held = 0
+        try:
+            reports = await _verify_all(request, certificates)
+        except asyncio.TimeoutError:
+            app["metrics"].timeouts += 1
+            return _respond(app, endpoint, web.json_response({"error": "Verification timed out"}, status=504))
+    finally:
+        queue.release(held)
+
+    body = reports[0] if single else {"results": reports}
+    return _respond(app, endpoint, web.json_response(body))
+
+
+def _queue_full():
+    return web.json_response({"error": "Verification queue is full, retry later"}, status=429,
+                             headers={"Retry-After": "1"})
+
+
+def _respond(app, endpoint, response):
+    app["metrics"].requests[(endpoint, response.status)] += 1
+    return response
+
+
+async def verify(request):
+    return await _handle(request, "/verify", single=True)
+
+
+async def verify_batch(request):
+    return await _handle(request, "/verify/batch", single=False)
+
+
+async def metrics(request):
+    return web.Response(text=request.app["metrics"].render(request.app["queue"]), content_type="text/plain")
+
+
+async def health(request):
+    return web.json_response({"status": "ok", "checks": list(DEFAULT_CHECKS)})
+
+
+# Function to build the aiohttp application around a process pool of verification workers.
+# With prewarm=True the workers are started and warmed up before the first request is accepted.
+# With persist=True verdicts are also written to the audit log and the submission history.
+def create_app(workers=None, timeout=DEFAULT_TIMEOUT, queue_size=None, use_cache=False, prewarm=False,
+               persist=False):
+    workers = workers or os.cpu_count() or 1
+    app = web.Application(client_max_size=MAX_UPLOAD_BYTES)
+    app["workers"] = workers
+    app["pool"] = get_worker_pool(workers)
+    if prewarm:
+        for future in [app["pool"].submit(warm_up) for _ in range(workers)]:
+            future.result()
+    app["queue"] = AdmissionQueue(queue_size or workers * DEFAULT_QUEUE_PER_WORKER)
+    app["metrics"] = Metrics()
+    app["timeout"] = timeout
+    # Off by default so the registry is the service's only backing store
+    app["use_cache"] = use_cache
+    app["persist"] = persist
+    app.router.add_post("/verify", verify)
+    app.router.add_post("/verify/batch", verify_batch)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/healthz", health)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP API for certificate verification.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per-request timeout in seconds")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help=f"Certificates admitted at once (default: {DEFAULT_QUEUE_PER_WORKER} per worker)")
+    parser.add_argument("--result-cache", action="store_true",
+                        help="Reuse reports from the on-disk result cache (verification_cache.db)")
+    parser.add_argument("--persist", action="store_true",
+                        help="Record verdicts in the audit log and submissions in the history (duplicate search)")
+    parser.add_argument("--warm-up", action="store_true",
+                        help="Start and warm up every worker before accepting requests")
+    args = parser.parse_args(argv)
+
+    app = create_app(args.workers, args.timeout, args.queue_size, args.result_cache, args.warm_up, args.persist)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()